@@ -1,6 +1,11 @@
 from contact import Contact
 import sqlite3
 import re
+from migrations import assurer_schema
+from versions import CompteursModifications
+from normalisation import normaliser_telephone, normaliser_debut_telephone, normaliser_texte
+from doublons import DetecteurDoublons, rapport
+from index_prefixes import IndexPrefixes
 
 class AddressBook:
     """Classe gérant un carnet d'adresses avec base de données SQLite et validation stricte"""
@@ -14,117 +19,19 @@ class AddressBook:
         """
         self.db_name = db_name
         self.contacts = []
-        self.creer_table_contacts()
-        self.migrer_schema_si_necessaire()
+        self.contacts_par_id = {}
+        self.contacts_par_telephone = {}
+        self.contacts_par_categorie = []
+        self._doublons = None
+        self._index_prefixes = None
+        self.version_chargee = None
+        assurer_schema(self.db_name)
         self.charger_contacts()
     
-    def migrer_schema_si_necessaire(self):
-        """
-        Migre le schéma de la base de données si nécessaire.
-        Convertit l'ancien schéma (avec contrainte UNIQUE sur nom+prenom)
-        vers le nouveau schéma (avec contraintes UNIQUE sur email et téléphone).
-        """
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        try:
-            # Vérifier si la table contacts existe
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='contacts'")
-            if not cursor.fetchone():
-                conn.close()
-                return
-            
-            # Vérifier le schéma actuel en regardant la définition complète de la table
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='contacts'")
-            table_sql = cursor.fetchone()[0]
-            
-            # Vérifier si c'est l'ancien schéma avec UNIQUE(nom, prenom)
-            if 'UNIQUE(nom, prenom)' in table_sql or 'UNIQUE (nom, prenom)' in table_sql:
-                print("🔄 Migration du schéma de base de données détectée (ancien schéma avec UNIQUE sur nom+prenom)")
-                self._recreate_table_with_new_schema(conn, cursor)
-            elif 'email TEXT NOT NULL UNIQUE' not in table_sql:
-                # Le nouveau schéma doit avoir email UNIQUE
-                print("🔄 Migration du schéma de base de données nécessaire (ajout des contraintes UNIQUE)")
-                self._recreate_table_with_new_schema(conn, cursor)
-                    
-        except Exception as e:
-            print(f"⚠️ Avertissement lors de la migration: {e}")
-        finally:
-            conn.close()
-    
-    def _recreate_table_with_new_schema(self, conn, cursor):
-        """Recrée la table avec le nouveau schéma"""
-        try:
-            # Sauvegarder les données existantes
-            cursor.execute("SELECT nom, prenom, email, telephone, adresse, fonction, entreprise, categorie FROM contacts")
-            existing_contacts = cursor.fetchall()
-            
-            # Supprimer l'ancienne table
-            cursor.execute("DROP TABLE contacts")
-            
-            # Créer la nouvelle table avec le schéma correct
-            cursor.execute('''
-                CREATE TABLE contacts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nom TEXT NOT NULL,
-                    prenom TEXT NOT NULL,
-                    email TEXT NOT NULL UNIQUE,
-                    telephone TEXT NOT NULL UNIQUE,
-                    adresse TEXT DEFAULT '',
-                    fonction TEXT DEFAULT '',
-                    entreprise TEXT DEFAULT '',
-                    categorie TEXT DEFAULT 'Personnel',
-                    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Restaurer les données
-            for contact in existing_contacts:
-                try:
-                    cursor.execute('''
-                        INSERT INTO contacts (nom, prenom, email, telephone, adresse, fonction, entreprise, categorie)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', contact)
-                except sqlite3.IntegrityError:
-                    # Ignorer les doublons
-                    pass
-            
-            conn.commit()
-            print(f"✓ Schéma de la base de données migré avec succès ({len(existing_contacts)} contacts)")
-        except Exception as e:
-            conn.rollback()
-            print(f"✗ Erreur lors de la migration: {e}")
-    
     def creer_connexion(self):
         """Crée une connexion à la base de données"""
         return sqlite3.connect(self.db_name)
     
-    def creer_table_contacts(self):
-        """Crée la table contacts si elle n'existe pas"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT NOT NULL,
-                prenom TEXT NOT NULL,
-                email TEXT NOT NULL UNIQUE,
-                telephone TEXT NOT NULL UNIQUE,
-                adresse TEXT DEFAULT '',
-                fonction TEXT DEFAULT '',
-                entreprise TEXT DEFAULT '',
-                categorie TEXT DEFAULT 'Personnel',
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✓ Table contacts initialisée")
-    
     def valider_email(self, email):
         """
         MODIFICATION PROF : Validation stricte de l'email
@@ -223,6 +130,11 @@ class AddressBook:
             print(message_tel)
             return False, message_tel
         
+        # Doublons probables (variante du nom, autre email...) : signalés, l'ajout n'est pas bloqué
+        doublons = self.doublons.verifier(
+            Contact(nom, prenom, email, telephone, adresse, fonction, entreprise, categorie)
+        )
+        
         # Les noms seront automatiquement convertis en majuscules par la classe Contact
         conn = self.creer_connexion()
         cursor = conn.cursor()
@@ -234,12 +146,17 @@ class AddressBook:
             
             cursor.execute(
                 """INSERT INTO contacts 
-                   (nom, prenom, email, telephone, adresse, fonction, entreprise, categorie) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (nom_maj, prenom_maj, email, telephone, adresse, fonction, entreprise, categorie)
+                   (nom, prenom, email, telephone, adresse, fonction, entreprise, categorie, telephone_canonique,
+                    nom_normalise, prenom_normalise) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (nom_maj, prenom_maj, email, telephone, adresse, fonction, entreprise, categorie,
+                 normaliser_telephone(telephone), normaliser_texte(nom_maj), normaliser_texte(prenom_maj))
             )
             conn.commit()
             message = f"✓ Contact '{nom_maj} {prenom_maj}' ajouté avec succès!"
+            if doublons:
+                proches = ', '.join(d['conserver'].get_nom_complet() for d in doublons[:3])
+                message += f" ⚠ Doublon possible avec : {proches}"
             print(message)
             
             # Recharger les contacts
@@ -297,42 +214,138 @@ class AddressBook:
                     return contact
         return None
     
-    def supprimer_contact(self, nom, prenom=None):
-        """Supprime un contact du carnet"""
-        nom_upper = nom.upper()
-        prenom_upper = prenom.upper() if prenom else None
+    def obtenir_contact(self, contact_id):
+        """
+        Retourne un contact par son identifiant
+        
+        Returns:
+            Contact: Le contact, None si aucun
+        """
+        return self.contacts_par_id.get(contact_id)
+    
+    def rechercher_par_telephone(self, telephone):
+        """
+        Recherche un contact par son numéro, quelle que soit la façon dont il est saisi
+        ("06 12 34 56 78", "0612345678", "+212 612...")
+        
+        Returns:
+            Contact: Le contact, None si aucun
+        """
+        return self.contacts_par_telephone.get(normaliser_telephone(telephone))
+    
+    def rechercher_telephones(self, saisie, limite=50):
+        """
+        Recherche les contacts dont le numéro contient les chiffres saisis :
+        d'abord les numéros qui commencent par la saisie (lecture de l'index unique du téléphone
+        canonique), puis ceux qui contiennent la suite de chiffres ailleurs ("5678"), y compris
+        les numéros en double en base, sans téléphone canonique
+        
+        Args:
+            saisie (str): Numéro ou partie de numéro ("0612", "+21261", "212 6 12", "5678")
+            limite (int): Nombre maximal de contacts retournés
+        
+        Returns:
+            list: Contacts commençant par la saisie (triés par numéro), puis les autres
+        """
+        chiffres = ''.join(c for c in saisie if c.isdigit())
+        if not chiffres:
+            return []
+        
+        trouves = []
+        prefixe = normaliser_debut_telephone(saisie)
+        if len(chiffres) >= 3:
+            # Intervalle [prefixe, prefixe suivant[ : parcours de l'index, sans LIKE
+            borne = prefixe[:-1] + chr(ord(prefixe[-1]) + 1)
+            
+            conn = self.creer_connexion()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT telephone_canonique FROM contacts
+                WHERE telephone_canonique >= ? AND telephone_canonique < ?
+                ORDER BY telephone_canonique
+                LIMIT ?
+            """, (prefixe, borne, limite))
+            canoniques = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            
+            trouves = [self.contacts_par_telephone[c] for c in canoniques if c in self.contacts_par_telephone]
+        
+        if len(trouves) >= limite:
+            return trouves
+        
+        # Suite de chiffres n'importe où dans le numéro (saisi ou international), en mémoire
+        deja = set(trouves)
+        for contact in self.contacts:
+            if chiffres in contact.chiffres_telephone and contact not in deja:
+                trouves.append(contact)
+                if len(trouves) >= limite:
+                    break
+        return trouves
+    
+    @property
+    def index_prefixes(self):
+        """Index de la saisie semi-automatique, construit à la première utilisation puis tenu à jour à chaque chargement"""
+        if self._index_prefixes is None:
+            self._index_prefixes = IndexPrefixes(self.contacts)
+        return self._index_prefixes
+    
+    def suggerer(self, texte, limite=10):
+        """
+        Contacts dont le nom, le prénom, l'email ou le numéro commence par le texte saisi
+        (saisie semi-automatique : recherche dichotomique dans l'index de préfixes)
+        
+        Args:
+            texte (str): Début saisi ("ala", "alaoui moh", "0612", "m.alaoui@")
+            limite (int): Nombre maximal de contacts retournés
+        
+        Returns:
+            list: Contacts trouvés
+        """
+        return self.index_prefixes.rechercher(texte, limite)
+    
+    @property
+    def doublons(self):
+        """Index de détection des doublons, construit à la première utilisation puis tenu à jour à chaque chargement"""
+        if self._doublons is None:
+            self._doublons = DetecteurDoublons(self.contacts)
+        return self._doublons
+    
+    def rapport_doublons(self, seuil=None):
+        """
+        Détecte les doublons probables de tout le carnet
+        
+        Returns:
+            tuple: (suggestions de fusion, rapport texte)
+        """
+        suggestions = self.doublons.detecter(seuil)
+        return suggestions, rapport(suggestions)
+    
+    def supprimer_contact(self, contact_id):
+        """Supprime un contact du carnet (par son identifiant : un seul contact est concerné)"""
+        contact = self.obtenir_contact(contact_id)
+        libelle = contact.get_nom_complet() if contact else f"#{contact_id}"
         
         conn = self.creer_connexion()
         cursor = conn.cursor()
-        
-        if prenom_upper:
-            cursor.execute(
-                "DELETE FROM contacts WHERE nom = ? AND prenom = ?",
-                (nom_upper, prenom_upper)
-            )
-        else:
-            cursor.execute(
-                "DELETE FROM contacts WHERE nom = ?",
-                (nom_upper,)
-            )
+        cursor.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
         
         if cursor.rowcount > 0:
             conn.commit()
             conn.close()
-            message = f"✓ Contact '{nom_upper} {prenom_upper or ''}' supprimé avec succès!"
+            message = f"✓ Contact '{libelle}' supprimé avec succès!"
             print(message)
             self.charger_contacts()
             return True, message
         else:
             conn.close()
-            message = f"✗ Contact '{nom_upper} {prenom_upper or ''}' introuvable."
+            message = f"✗ Contact '{libelle}' introuvable."
             print(message)
             return False, message
     
-    def modifier_contact(self, nom, prenom=None, nouveau_nom=None, nouveau_prenom=None, 
+    def modifier_contact(self, contact_id, nouveau_nom=None, nouveau_prenom=None, 
                         nouveau_email=None, nouveau_telephone=None, nouvelle_adresse=None,
                         nouvelle_fonction=None, nouvelle_entreprise=None, nouvelle_categorie=None):
-        """Modifie les informations d'un contact avec validation"""
+        """Modifie les informations d'un contact (désigné par son identifiant) avec validation"""
         
         # Valider le nouvel email si fourni (même si vide, pour permettre la validation)
         if nouveau_email is not None and nouveau_email != "":
@@ -348,28 +361,30 @@ class AddressBook:
                 print(message)
                 return False, message
         
-        nom_upper = nom.upper()
-        prenom_upper = prenom.upper() if prenom else None
-        
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
         updates = []
         params = []
         
-        # Permettre la modification du nom/prénom uniquement si différent
-        if nouveau_nom is not None and nouveau_nom.upper() != nom_upper:
+        if nouveau_nom is not None:
             updates.append("nom = ?")
             params.append(nouveau_nom.upper())
-        if nouveau_prenom is not None and prenom_upper and nouveau_prenom.upper() != prenom_upper:
+            updates.append("nom_normalise = ?")
+            params.append(normaliser_texte(nouveau_nom))
+        if nouveau_prenom is not None:
             updates.append("prenom = ?")
             params.append(nouveau_prenom.upper())
+            updates.append("prenom_normalise = ?")
+            params.append(normaliser_texte(nouveau_prenom))
         if nouveau_email is not None:
             updates.append("email = ?")
             params.append(nouveau_email)
         if nouveau_telephone is not None:
             updates.append("telephone = ?")
             params.append(nouveau_telephone)
+            updates.append("telephone_canonique = ?")
+            params.append(normaliser_telephone(nouveau_telephone) or None)
         if nouvelle_adresse is not None:
             updates.append("adresse = ?")
             params.append(nouvelle_adresse)
@@ -391,14 +406,9 @@ class AddressBook:
         
         updates.append("date_modification = CURRENT_TIMESTAMP")
         
-        params.append(nom_upper)
-        if prenom_upper:
-            params.append(prenom_upper)
-            where_clause = "WHERE nom = ? AND prenom = ?"
-        else:
-            where_clause = "WHERE nom = ?"
+        params.append(contact_id)
         
-        query = f"UPDATE contacts SET {', '.join(updates)} {where_clause}"
+        query = f"UPDATE contacts SET {', '.join(updates)} WHERE id = ?"
         
         try:
             cursor.execute(query, params)
@@ -436,18 +446,100 @@ class AddressBook:
         return len([c for c in self.contacts if c.categorie == categorie])
     
     def filtrer_par_categorie(self, categorie):
-        """Retourne tous les contacts d'une catégorie"""
+        """Retourne tous les contacts d'une catégorie (triés par nom et prénom)"""
         return [c for c in self.contacts if c.categorie == categorie]
     
+    def rechercher_texte(self, texte):
+        """
+        Recherche les contacts dont le nom, le prénom ou l'email contient le texte saisi,
+        sans tenir compte des accents ni de la casse ("eloise" trouve "ÉLOÏSE")
+        
+        Returns:
+            list: Contacts triés par catégorie, nom et prénom
+        """
+        cle = normaliser_texte(texte)
+        return [c for c in self.contacts_par_categorie if cle in c.cle_recherche]
+    
+    def trier_par_categorie(self, contacts):
+        """
+        Remet une sélection de contacts du carnet dans l'ordre (catégorie, nom, prénom),
+        en parcourant la liste déjà triée plutôt qu'en triant à chaque requête
+        """
+        selection = set(contacts)
+        return [c for c in self.contacts_par_categorie if c in selection]
+    
+    def iterer_segment(self, categorie=None, entreprise=None, service_id=None, taille_lot=500):
+        """
+        Parcourt les contacts d'un segment directement en base, par lots de taille_lot lignes :
+        la mémoire utilisée ne dépend pas de la taille du segment (campagnes, exports).
+        
+        Args:
+            categorie (str, optional): Catégorie des contacts
+            entreprise (str, optional): Entreprise (sans tenir compte de la casse)
+            service_id (int, optional): Ne garder que les contacts ayant un rendez-vous dans ce service
+            taille_lot (int): Nombre de lignes lues à la fois
+        
+        Yields:
+            dict: Contact (id, nom, prenom, email, telephone, fonction, entreprise, categorie, telephone_canonique)
+        """
+        conditions = []
+        parametres = []
+        if categorie:
+            conditions.append("c.categorie = ?")
+            parametres.append(categorie)
+        if entreprise:
+            conditions.append("c.entreprise = ? COLLATE NOCASE")
+            parametres.append(entreprise.strip())
+        if service_id:
+            # Rendez-vous rattaché au contact, ou pris avec son email avant sa création dans le carnet
+            conditions.append("""EXISTS (
+                SELECT 1 FROM rendez_vous r
+                WHERE r.service_id = ?
+                  AND (r.contact_id = c.id OR r.patient_cle_email = lower(trim(c.email)))
+            )""")
+            parametres.append(int(service_id))
+        
+        conn = self.creer_connexion()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT c.id, c.nom, c.prenom, c.email, c.telephone, c.fonction, c.entreprise, c.categorie,
+                       c.telephone_canonique
+                FROM contacts c
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                ORDER BY c.id
+            """, parametres)
+            
+            while True:
+                rows = cursor.fetchmany(taille_lot)
+                if not rows:
+                    break
+                for row in rows:
+                    yield {
+                        'id': row[0],
+                        'nom': row[1],
+                        'prenom': row[2],
+                        'email': row[3],
+                        'telephone': row[4],
+                        'fonction': row[5] or '',
+                        'entreprise': row[6] or '',
+                        'categorie': row[7],
+                        'telephone_canonique': row[8] or ''
+                    }
+        finally:
+            conn.close()
+    
     def charger_contacts(self):
         """Charge les contacts depuis la base de données"""
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
+        # Version lue avant les lignes : une écriture concurrente provoquera un nouveau chargement
+        version = CompteursModifications.lire_version(cursor, CompteursModifications.CLE_CONTACTS)
         cursor.execute("""
-            SELECT nom, prenom, email, telephone, adresse, fonction, entreprise, categorie 
+            SELECT nom, prenom, email, telephone, adresse, fonction, entreprise, categorie, telephone_canonique, id 
             FROM contacts 
-            ORDER BY nom, prenom
+            ORDER BY nom_normalise, prenom_normalise
         """)
         rows = cursor.fetchall()
         
@@ -455,13 +547,47 @@ class AddressBook:
         for row in rows:
             contact = Contact(
                 row[0], row[1], row[2], row[3],  # nom, prenom, email, tel
-                row[4], row[5], row[6], row[7]   # adresse, fonction, entreprise, categorie
+                row[4], row[5], row[6], row[7],  # adresse, fonction, entreprise, categorie
+                id=row[9]
             )
+            # Valeur stockée : vide pour un numéro déjà porté par un autre contact
+            contact.telephone_canonique = row[8] or ''
             self.contacts.append(contact)
         
+        self.contacts_par_id = {c.id: c for c in self.contacts}
+        self.contacts_par_telephone = {c.telephone_canonique: c for c in self.contacts if c.telephone_canonique}
+        # Ordre d'affichage de la liste des contacts, calculé une fois par chargement
+        # (tri stable : l'ordre par nom et prénom de la requête est conservé dans chaque catégorie)
+        self.contacts_par_categorie = sorted(self.contacts, key=lambda c: c.categorie)
+        if self._doublons is not None:
+            self._doublons.synchroniser(self.contacts)
+        if self._index_prefixes is not None:
+            self._index_prefixes.synchroniser(self.contacts)
+        self.version_chargee = version
         conn.close()
         print(f"✓ {len(self.contacts)} contact(s) chargé(s) depuis la base de données")
     
+    def rafraichir_si_modifie(self, version=None):
+        """
+        Recharge les contacts si la base a été modifiée depuis le dernier chargement
+        (par ce processus, un autre worker ou l'agenda Tkinter)
+        
+        Args:
+            version (int, optional): Version courante déjà lue ; lue en base sinon
+        
+        Returns:
+            bool: True si les contacts ont été rechargés
+        """
+        if version is None:
+            conn = self.creer_connexion()
+            version = CompteursModifications.lire_version(conn.cursor(), CompteursModifications.CLE_CONTACTS)
+            conn.close()
+        
+        if version == self.version_chargee:
+            return False
+        self.charger_contacts()
+        return True
+    
     def exporter_vers_csv(self, fichier_csv="contacts_export.csv"):
         """Exporte tous les contacts vers un fichier CSV"""
         try:
@@ -202,6 +202,9 @@ class AgendaPolyclinique:
     
     def charger_services(self):
         """Charge les services dans le combobox"""
+        # Les services ont pu être modifiés depuis l'application web
+        self.services.rafraichir_si_modifie()
+        
         if self.auth.est_super_admin(self.admin_info):
             # Super-admin voit tous les services
             services = self.services.obtenir_services_actifs()
@@ -238,6 +241,12 @@ class AgendaPolyclinique:
     
     def actualiser_creneaux(self):
         """Actualise l'affichage des créneaux"""
+        # Horaires et fermetures à jour s'ils ont été modifiés depuis l'application web
+        self.rdv.horaires.rafraichir_si_modifie()
+        if self.services.rafraichir_si_modifie() and self.service_selectionne:
+            self.service_selectionne = (self.services.obtenir_service_par_id(self.service_selectionne['id'])
+                                        or self.service_selectionne)
+        
         # Nettoyer les créneaux existants
         for widget in self.frame_creneaux.winfo_children():
             widget.destroy()
@@ -255,17 +264,28 @@ class AgendaPolyclinique:
         # Obtenir les créneaux
         creneaux = self.rdv.obtenir_creneaux_disponibles(
             self.service_selectionne['id'],
-            self.date_selectionnee.strftime('%Y-%m-%d'),
-            self.service_selectionne['horaire_debut'],
-            self.service_selectionne['horaire_fin']
+            self.date_selectionnee.strftime('%Y-%m-%d')
         )
         
+        if not creneaux:
+            tk.Label(
+                self.frame_creneaux,
+                text="🚫 Service fermé ce jour",
+                font=("Arial", 12),
+                bg="#ecf0f1",
+                fg="#e74c3c"
+            ).pack(pady=50)
+            return
+        
         # Afficher les créneaux
         row = 0
         col = 0
-        for heure_debut, heure_fin, disponible in creneaux:
+        multi_places = self.service_selectionne.get('capacite', 1) > 1 or self.service_selectionne.get('plages_capacite')
+        for heure_debut, heure_fin, disponible, places_restantes in creneaux:
             couleur = "#27ae60" if disponible else "#95a5a6"
             texte = f"{heure_debut} - {heure_fin}"
+            if multi_places:
+                texte += f"\n{places_restantes} place(s)"
             etat = "normal" if disponible else "disabled"
             
             btn = tk.Button(
@@ -284,7 +304,9 @@ class AgendaPolyclinique:
             
             # Tooltip
             if not disponible:
-                self.creer_tooltip(btn, "❌ Créneau déjà réservé")
+                self.creer_tooltip(btn, "❌ Créneau complet")
+            elif multi_places:
+                self.creer_tooltip(btn, f"✅ {places_restantes} place(s) restante(s) - Cliquez pour réserver")
             else:
                 self.creer_tooltip(btn, "✅ Créneau disponible - Cliquez pour réserver")
             
@@ -379,7 +401,7 @@ class AgendaPolyclinique:
                 messagebox.showerror("Erreur", f"Le téléphone doit contenir 10 chiffres (Trouvé: {len(chiffres)})")
                 return
             
-            success, message, rdv_id = self.rdv.prendre_rendez_vous(
+            success, message, rdv_id, _ = self.rdv.prendre_rendez_vous(
                 self.service_selectionne['id'],
                 nom, prenom, tel,
                 self.date_selectionnee.strftime('%Y-%m-%d'),
@@ -1,55 +1,212 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, current_app
+from werkzeug.local import LocalProxy
 from address_book import AddressBook
 from authentification import Authentification
 from communication import Communication
 from services import ServicesPolyclinique
 from rendez_vous import RendezVous
-from functools import wraps
-from datetime import datetime, timedelta, date
+from rappels import PlanificateurRappels
+from notifications import FileNotifications, DistributeurNotifications
+from campagnes import CampagneEmail
+from evenements import BusEvenements
+from rapports import RapportsActivite
+from versions import CompteursModifications
+from configuration import ConfigurationPolyclinique
+from normalisation import normaliser_telephone, normaliser_texte
+from calendrier import CalendrierICS
+from cache_fragments import CacheFragments
+from tableau_de_bord import TableauDeBord
+from migrations import migrer
+from markupsafe import Markup
+from functools import wraps, cached_property
+from datetime import datetime, timedelta, date, timezone
 import sqlite3
+import hashlib
 import json
-
-app = Flask(__name__)
-app.secret_key = 'polyclinique_secret_key_super_securisee_2026'
-
-# Initialiser les modules
-carnet = AddressBook(db_name="polyclinique.db")
-auth = Authentification("polyclinique.db")
-services = ServicesPolyclinique("polyclinique.db")
-rdv_manager = RendezVous("polyclinique.db")
-
-# Configuration Email - Chargée depuis la base de données
-def get_email_config():
-    """Récupère la configuration email depuis la base de données"""
-    conn = sqlite3.connect("polyclinique.db")
-    cursor = conn.cursor()
-    cursor.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
-    cursor.execute("SELECT value FROM config WHERE key = 'email_expediteur'")
-    email_row = cursor.fetchone()
-    cursor.execute("SELECT value FROM config WHERE key = 'email_password'")
-    pass_row = conn.cursor().execute("SELECT value FROM config WHERE key = 'email_password'")
-    pass_row = pass_row.fetchone()
-    conn.close()
-    
-    email = email_row[0] if email_row else None
-    password = pass_row[0] if pass_row else None
-    return email, password
+import re
+import csv
+import io
+import os
+import queue
+import click
+
+# Configuration par défaut, surchargée par create_app(config)
+CONFIG_PAR_DEFAUT = {
+    'DATABASE': "polyclinique.db",
+    'SECRET_KEY': 'polyclinique_secret_key_super_securisee_2026',
+    # Envoi des notifications et rappels dans chaque processus servant (sinon : flask --app app taches)
+    'TACHES_ARRIERE_PLAN': False,
+}
+
+
+class ServicesApplication:
+    """
+    Modules métier d'un processus, construits au premier usage.
+    Importer l'application ou créer un worker ne touche pas la base :
+    chaque module est créé à la première requête qui en a besoin.
+    """
+    
+    def __init__(self, db_name, cle_secrete):
+        """
+        Args:
+            db_name (str): Nom de la base de données
+            cle_secrete (str): Clé de signature des liens d'abonnement aux calendriers
+        """
+        self.db_name = db_name
+        self.cle_secrete = cle_secrete
+        self.pid = os.getpid()
+        self.campagnes = {}  # id -> CampagneEmail lancée par ce processus
+    
+    @cached_property
+    def carnet(self):
+        return AddressBook(db_name=self.db_name)
+    
+    @cached_property
+    def auth(self):
+        return Authentification(self.db_name)
+    
+    @cached_property
+    def services(self):
+        return ServicesPolyclinique(self.db_name)
+    
+    @cached_property
+    def bus_evenements(self):
+        return BusEvenements()
+    
+    @cached_property
+    def rdv_manager(self):
+        return RendezVous(self.db_name, bus=self.bus_evenements)
+    
+    @cached_property
+    def rapports(self):
+        return RapportsActivite(self.rdv_manager, self.db_name)
+    
+    @cached_property
+    def compteurs(self):
+        return CompteursModifications(self.db_name)
+    
+    @cached_property
+    def calendrier(self):
+        return CalendrierICS(self.db_name, self.cle_secrete)
+    
+    @cached_property
+    def configuration(self):
+        return ConfigurationPolyclinique(self.db_name)
+    
+    @cached_property
+    def cache_fragments(self):
+        return CacheFragments()
+    
+    @cached_property
+    def tableau_de_bord(self):
+        return TableauDeBord(self.rdv_manager, self.compteurs, self.db_name)
+    
+    @cached_property
+    def comm(self):
+        return self.recharger_communication()
+    
+    @cached_property
+    def file_notifications(self):
+        return FileNotifications(self.db_name)
+    
+    @cached_property
+    def distributeur_notifications(self):
+        return DistributeurNotifications(self.comm, self.file_notifications)
+    
+    @cached_property
+    def planificateur_rappels(self):
+        return PlanificateurRappels(self.distributeur_notifications, self.db_name)
+    
+    def demarrer_taches(self, intervalle_rappels=3600):
+        """
+        Lance les threads d'envoi des notifications (promotions de la liste d'attente, emails)
+        et de mise en file des rappels ; sans effet s'ils tournent déjà dans ce processus
+        """
+        self.distributeur_notifications.demarrer()
+        self.planificateur_rappels.demarrer(intervalle_rappels)
+    
+    def arreter_taches(self):
+        """Arrête les threads d'arrière-plan démarrés par ce processus"""
+        if 'planificateur_rappels' in self.__dict__:
+            self.planificateur_rappels.arreter()
+        if 'distributeur_notifications' in self.__dict__:
+            self.distributeur_notifications.arreter()
+    
+    def rafraichir_caches(self):
+        """
+        Recharge les caches en mémoire (contacts, services, calendrier des horaires)
+        modifiés par un autre processus. Une seule lecture des compteurs par requête ;
+        seuls les modules déjà construits sont vérifiés.
+        """
+        caches = [(cache(), cle) for module, cache, cle in (
+            ('carnet', lambda: self.carnet, CompteursModifications.CLE_CONTACTS),
+            ('services', lambda: self.services, CompteursModifications.CLE_SERVICES),
+            ('rdv_manager', lambda: self.rdv_manager.horaires, CompteursModifications.CLE_HORAIRES),
+            ('configuration', lambda: self.configuration, CompteursModifications.CLE_CONFIG),
+        ) if module in self.__dict__]
+        if not caches:
+            return
+        
+        versions = self.compteurs.obtenir_versions([cle for _, cle in caches])
+        for cache, cle in caches:
+            cache.rafraichir_si_modifie(versions[cle])
+    
+    def recharger_communication(self):
+        """
+        Recrée le module de communication si la configuration (cache rafraîchi à chaque requête)
+        a changé. Sinon le module (et ses sessions SMTP déjà ouvertes) est conservé.
+        L'ancien module n'est fermé qu'une fois ses envois en cours terminés (lot de notifications,
+        campagnes lancées avec lui).
+        """
+        parametres = self.configuration.parametres_communication()
+        if 'comm' in self.__dict__:
+            if parametres == self._parametres_comm:
+                return self.comm
+            self.comm.fermer_apres_usage()
+        self.comm = Communication(*parametres)
+        self._parametres_comm = parametres
+        if 'distributeur_notifications' in self.__dict__:
+            self.distributeur_notifications.communication = self.comm
+        return self.comm
+
+
+def _services():
+    """Modules métier du processus courant (recréés si le processus a été forké après create_app)"""
+    registre = current_app.extensions['polyclinique']
+    if registre.pid != os.getpid():
+        registre = ServicesApplication(registre.db_name, registre.cle_secrete)
+        current_app.extensions['polyclinique'] = registre
+    return registre
+
+
+# Accès aux modules depuis les vues, résolus à chaque usage dans le contexte de l'application
+carnet = LocalProxy(lambda: _services().carnet)
+auth = LocalProxy(lambda: _services().auth)
+services = LocalProxy(lambda: _services().services)
+bus_evenements = LocalProxy(lambda: _services().bus_evenements)
+rdv_manager = LocalProxy(lambda: _services().rdv_manager)
+rapports = LocalProxy(lambda: _services().rapports)
+compteurs = LocalProxy(lambda: _services().compteurs)
+calendrier = LocalProxy(lambda: _services().calendrier)
+tableau_de_bord = LocalProxy(lambda: _services().tableau_de_bord)
+comm = LocalProxy(lambda: _services().comm)
+
+_ROUTES = []
+
+def route(rule, **options):
+    """Enregistre une vue ; les routes sont ajoutées à chaque application créée par create_app"""
+    def decorateur(f):
+        _ROUTES.append((rule, options, f))
+        return f
+    return decorateur
+
+def connexion_base():
+    """Crée une connexion à la base de données de l'application"""
+    return sqlite3.connect(current_app.config['DATABASE'])
 
 def save_email_config(email, password):
-    """Sauvegarde la configuration email dans la base de données"""
-    conn = sqlite3.connect("polyclinique.db")
-    cursor = conn.cursor()
-    cursor.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
-    cursor.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", 
-                   ("email_expediteur", email))
-    cursor.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", 
-                   ("email_password", password))
-    conn.commit()
-    conn.close()
-
-# Initialiser la communication avec la config stockée
-EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL = get_email_config()
-comm = Communication(EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL)
+    """Sauvegarde la configuration email (les caches de tous les workers sont invalidés)"""
+    _services().configuration.definir({'email_expediteur': email, 'email_password': password})
 
 # Décorateur pour protéger les routes
 def login_required(f):
@@ -94,7 +251,7 @@ def admin_required(f):
 
 # ==================== AUTHENTIFICATION ====================
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -112,7 +269,7 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     """Inscription pour les patients (vérification par email dans contacts)"""
     if request.method == 'POST':
@@ -146,7 +303,7 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     username = session.get('admin_info', {}).get('nom_utilisateur', 'Utilisateur')
     session.pop('admin_info', None)
@@ -155,7 +312,7 @@ def logout():
 
 # ==================== GESTION DES COMPTES UTILISATEURS ====================
 
-@app.route('/gestion_utilisateurs')
+@route('/gestion_utilisateurs')
 @admin_required
 def gestion_utilisateurs():
     """Gestion des utilisateurs - accessible par Admin et Super-Admin"""
@@ -180,7 +337,7 @@ def gestion_utilisateurs():
                          peut_creer_admin=peut_creer_admin,
                          auth=auth)
 
-@app.route('/ajouter_utilisateur', methods=['POST'])
+@route('/ajouter_utilisateur', methods=['POST'])
 @admin_required
 def ajouter_utilisateur():
     """Ajouter un utilisateur - Admin peut créer User, Super-Admin peut créer Admin et User"""
@@ -208,7 +365,7 @@ def ajouter_utilisateur():
     
     return redirect(url_for('gestion_utilisateurs'))
 
-@app.route('/modifier_utilisateur/<int:id>', methods=['POST'])
+@route('/modifier_utilisateur/<int:id>', methods=['POST'])
 @admin_required
 def modifier_utilisateur(id):
     """Modifier un utilisateur"""
@@ -244,7 +401,7 @@ def modifier_utilisateur(id):
     
     return redirect(url_for('gestion_utilisateurs'))
 
-@app.route('/supprimer_utilisateur/<int:id>')
+@route('/supprimer_utilisateur/<int:id>')
 @admin_required
 def supprimer_utilisateur(id):
     """Supprimer un utilisateur"""
@@ -276,7 +433,7 @@ def supprimer_utilisateur(id):
 
 # ==================== GESTION DES ADMINS (Super-Admin uniquement) ====================
 
-@app.route('/gestion_admins')
+@route('/gestion_admins')
 @super_admin_required
 def gestion_admins():
     """Gestion des administrateurs - Super-admin uniquement"""
@@ -297,7 +454,7 @@ def gestion_admins():
                          stats=stats,
                          auth=auth)
 
-@app.route('/ajouter_admin', methods=['POST'])
+@route('/ajouter_admin', methods=['POST'])
 @super_admin_required
 def ajouter_admin():
     """Ajouter un administrateur - Super-admin uniquement"""
@@ -323,7 +480,7 @@ def ajouter_admin():
 
     return redirect(url_for('gestion_admins'))
 
-@app.route('/modifier_admin/<int:id>', methods=['POST'])
+@route('/modifier_admin/<int:id>', methods=['POST'])
 @super_admin_required
 def modifier_admin(id):
     """Modifier un administrateur"""
@@ -340,7 +497,7 @@ def modifier_admin(id):
     
     return redirect(url_for('gestion_admins'))
 
-@app.route('/supprimer_admin/<int:id>')
+@route('/supprimer_admin/<int:id>')
 @super_admin_required
 def supprimer_admin(id):
     """Supprimer un administrateur"""
@@ -358,8 +515,8 @@ def supprimer_admin(id):
 
 # ==================== DASHBOARD ====================
 
-@app.route('/')
-@app.route('/dashboard')
+@route('/')
+@route('/dashboard')
 @login_required
 def dashboard():
     """Dashboard principal selon le rôle"""
@@ -367,126 +524,151 @@ def dashboard():
     
     if auth.est_super_admin(admin_info):
         # Super-admin voit tout
+        donnees = tableau_de_bord.donnees_super_admin()
         services_list = services.obtenir_services_actifs()
-        total_rdv = sum([rdv_manager.obtenir_statistiques_service(s['id'])['total'] for s in services_list])
-        # RDV en attente pour tous les services
-        rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente()
-        today = date.today().strftime('%Y-%m-%d')
-        rdv_aujourd_hui = rdv_manager.obtenir_rendez_vous_par_date(today)
-        
-        return render_template('dashboard.html', 
-                             admin_info=admin_info,
-                             services=services_list,
-                             total_rdv=total_rdv,
-                             rdv_aujourd_hui=rdv_aujourd_hui,
-                             rdv_en_attente=rdv_en_attente,
-                             auth=auth)
-        
     elif auth.est_admin(admin_info):
         # Admin voit son service
         service_id = admin_info.get('service_id')
-        if service_id:
-            service = services.obtenir_service_par_id(service_id)
-            services_list = [service] if service else []
-            stats = rdv_manager.obtenir_statistiques_service(service_id) if service else {'total': 0, 'en_attente': 0, 'confirmes': 0}
-            total_rdv = stats['total']
-            # RDV en attente pour ce service
-            rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente(service_id)
-        else:
-            services_list = []
-            total_rdv = 0
-            rdv_en_attente = []
-        today = date.today().strftime('%Y-%m-%d')
-        rdv_aujourd_hui = rdv_manager.obtenir_rendez_vous_par_date(today)
-        
-        return render_template('dashboard.html', 
-                             admin_info=admin_info,
-                             services=services_list,
-                             total_rdv=total_rdv,
-                             rdv_aujourd_hui=rdv_aujourd_hui,
-                             rdv_en_attente=rdv_en_attente,
-                             auth=auth)
+        service = services.obtenir_service_par_id(service_id) if service_id else None
+        services_list = [service] if service else []
+        donnees = tableau_de_bord.donnees_admin(service_id if service else None)
     else:
         # Patient (user) - Dashboard spécifique
-        user_email = admin_info.get('email')
-        
-        # Récupérer les rendez-vous du patient
-        if user_email:
-            rdv_list = rdv_manager.obtenir_rendez_vous_par_patient(user_email)
-            rdv_prochains = rdv_manager.obtenir_prochains_rendez_vous(user_email, 5)
-        else:
-            rdv_list = []
-            rdv_prochains = []
-        
-        # Statistiques
-        stats = {
-            'total': len(rdv_list),
-            'en_attente': len([r for r in rdv_list if r.get('statut') == 'en_attente']),
-            'confirmes': len([r for r in rdv_list if r.get('statut') == 'confirmé']),
-            'rejetes': len([r for r in rdv_list if r.get('statut') == 'rejeté'])
-        }
-        
-        # Récupérer les infos du contact
-        contact_info = None
-        if admin_info.get('contact_id'):
-            conn = sqlite3.connect("polyclinique.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT nom, prenom, email, telephone, adresse, fonction, entreprise FROM contacts WHERE id = ?", 
-                          (admin_info['contact_id'],))
-            row = cursor.fetchone()
-            conn.close()
-            if row:
-                contact_info = {
-                    'nom': row[0], 'prenom': row[1], 'email': row[2],
-                    'telephone': row[3], 'adresse': row[4], 'fonction': row[5], 'entreprise': row[6]
-                }
+        donnees = tableau_de_bord.donnees_patient(admin_info.get('email'), admin_info.get('contact_id'))
         
         return render_template('dashboard_user.html',
                              admin_info=admin_info,
-                             contact_info=contact_info,
-                             total_rdv=stats['total'],
-                             rdv_prochains=rdv_prochains,
-                             stats=stats,
+                             contact_info=donnees['contact_info'],
+                             total_rdv=donnees['stats']['total'],
+                             rdv_prochains=donnees['rdv_prochains'],
+                             stats=donnees['stats'],
                              auth=auth)
+    
+    return render_template('dashboard.html', 
+                         admin_info=admin_info,
+                         services=services_list,
+                         total_rdv=donnees['total_rdv'],
+                         rdv_aujourd_hui=donnees['rdv_aujourd_hui'],
+                         rdv_en_attente=donnees['rdv_en_attente'],
+                         auth=auth)
+
+# ==================== PAGES CONDITIONNELLES ====================
+
+def _rendre_blocs(nom_template, contexte):
+    """Rend les blocs propres à une page (titre, contenu, scripts), sans le gabarit commun"""
+    template = current_app.jinja_env.get_template(nom_template)
+    current_app.update_template_context(contexte)
+    ctx = template.new_context(contexte)
+    return {nom: Markup(''.join(bloc(ctx))) for nom, bloc in template.blocks.items()}
+
+def _page_conditionnelle(nom_template, cles_compteurs, filtres, charger_contexte):
+    """
+    Page HTML avec GET conditionnel et cache des fragments rendus :
+    - l'ETag vient des versions des compteurs de modifications (une requête) ; un navigateur
+      dont la copie est à jour reçoit un 304 avant toute requête du carnet ou des rendez-vous
+    - sinon les blocs de la page sont lus dans le cache, clé (versions, rôle, filtres) ;
+      charger_contexte() (requêtes et rendu) n'est appelé qu'en leur absence
+    - le gabarit commun (navigation de l'utilisateur, messages) est rendu à chaque fois
+
+    Args:
+        nom_template (str): Gabarit de la page (hérite de base.html)
+        cles_compteurs (list): Compteurs dont dépendent les données affichées
+        filtres (tuple): Autres paramètres de la page (service, patient, date...)
+        charger_contexte (callable): Retourne les variables du gabarit
+    """
+    admin_info = session['admin_info']
+    # Un message à afficher rend la page unique : ni 304 ni ETag
+    avec_messages = bool(session.get('_flashes'))
+
+    versions = compteurs.obtenir_versions(cles_compteurs)
+    # Le jour fait partie de la clé : "à venir", créneaux passés... changent à minuit
+    cle = (nom_template, tuple(versions[c] for c in cles_compteurs), admin_info.get('role'),
+           filtres, date.today().isoformat())
+    etag = hashlib.sha1(repr((cle, admin_info.get('id'), admin_info.get('nom_utilisateur'))).encode()).hexdigest()
+
+    if not avec_messages and request.if_none_match and request.if_none_match.contains(etag):
+        reponse = Response(status=304)
+    else:
+        # Le fragment ne voit que le rôle : il est partagé par les utilisateurs de même rôle et mêmes filtres
+        blocs = _services().cache_fragments.obtenir(cle, lambda: _rendre_blocs(nom_template, {
+            **charger_contexte(), 'admin_info': {'role': admin_info.get('role')}, 'auth': auth
+        }))
+        reponse = Response(render_template('page_fragments.html', blocs=blocs, admin_info=admin_info, auth=auth))
+
+    if not avec_messages:
+        reponse.set_etag(etag)
+    reponse.headers['Cache-Control'] = 'private, no-cache'
+    return reponse
 
 # ==================== GESTION DES CONTACTS ====================
 
-@app.route('/contacts')
+@route('/contacts')
 @login_required
 def index():
-    contacts_tries = sorted(carnet.contacts, key=lambda c: (c.categorie, c.nom.lower(), c.prenom.lower()))
-    return render_template('index.html', contacts=contacts_tries, admin_info=session['admin_info'], auth=auth)
+    return _page_conditionnelle('index.html', [CompteursModifications.CLE_CONTACTS], (),
+                                lambda: {'contacts': carnet.contacts_par_categorie})
+
+# Saisie d'un numéro ou d'une partie de numéro : chiffres, avec espaces, tirets, points, parenthèses ou +
+RE_SAISIE_TELEPHONE = re.compile(r'[+(]?(?:\d[\s.()-]*)+')
 
-@app.route('/rechercher')
+@route('/rechercher')
 @login_required
 def rechercher():
     """Rechercher des contacts"""
     query = request.args.get('q', '').strip().lower()
 
-    if query:
-        # Rechercher dans nom, prénom, email, téléphone
-        resultats = [c for c in carnet.contacts if
-                     query in c.nom.lower() or
-                     query in c.prenom.lower() or
-                     query in c.email.lower() or
-                     query in c.telephone.lower()]
+    if query and RE_SAISIE_TELEPHONE.fullmatch(query):
+        # Numéro ou partie de numéro, quelle que soit sa saisie : index du téléphone canonique
+        # pour un début de numéro, puis suite de chiffres n'importe où dans le numéro
+        contacts_tries = carnet.trier_par_categorie(carnet.rechercher_telephones(query, limite=len(carnet.contacts)))
+    elif query:
+        # Rechercher dans nom, prénom, email (sans accents ni casse)
+        contacts_tries = carnet.rechercher_texte(query)
     else:
-        resultats = carnet.contacts
+        contacts_tries = carnet.contacts_par_categorie
 
-    contacts_tries = sorted(resultats, key=lambda c: (c.categorie, c.nom.lower(), c.prenom.lower()))
     return render_template('index.html', contacts=contacts_tries, admin_info=session['admin_info'], 
                           recherche=query, auth=auth)
 
-@app.route('/filtrer/<categorie>')
+@route('/api/contacts/suggest')
+@admin_required
+def api_suggestions_contacts():
+    """
+    Saisie semi-automatique des contacts (formulaire de rendez-vous, recherche).
+    Réponse cachée par le navigateur quelques secondes (frappes répétées, retour arrière),
+    puis revalidée par ETag : version du carnet, un 304 tant qu'il n'a pas changé.
+    """
+    texte = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+    
+    etag = f"contacts-{carnet.version_chargee}"
+    if request.if_none_match and request.if_none_match.contains(etag):
+        reponse = Response(status=304)
+    else:
+        suggestions = carnet.suggerer(texte, limite) if len(texte) >= 2 else []
+        reponse = jsonify([{
+            'id': c.id,
+            'nom': c.nom,
+            'prenom': c.prenom,
+            'email': c.email,
+            'telephone': c.telephone,
+            'libelle': f"{c.get_nom_complet()} — {c.telephone}"
+        } for c in suggestions])
+    
+    reponse.set_etag(etag)
+    reponse.headers['Cache-Control'] = 'private, max-age=30'
+    reponse.headers['Vary'] = 'Cookie'
+    return reponse
+
+@route('/filtrer/<categorie>')
 @login_required
 def filtrer_categorie(categorie):
     """Filtrer les contacts par catégorie"""
-    contacts_filtres = [c for c in carnet.contacts if c.categorie == categorie]
-    contacts_tries = sorted(contacts_filtres, key=lambda c: (c.nom.lower(), c.prenom.lower()))
+    contacts_tries = carnet.filtrer_par_categorie(categorie)
     return render_template('index.html', contacts=contacts_tries, admin_info=session['admin_info'], 
                           categorie_filtree=categorie, auth=auth)
 
-@app.route('/ajouter', methods=['GET', 'POST'])
+@route('/ajouter', methods=['GET', 'POST'])
 @admin_required
 def ajouter():
     if request.method == 'POST':
@@ -518,10 +700,10 @@ def ajouter():
     
     return render_template('ajouter.html', admin_info=session['admin_info'], auth=auth)
 
-@app.route('/modifier/<nom>/<prenom>', methods=['GET', 'POST'])
+@route('/modifier/<int:contact_id>', methods=['GET', 'POST'])
 @admin_required
-def modifier(nom, prenom):
-    contact = carnet.rechercher_contact(nom, prenom)
+def modifier(contact_id):
+    contact = carnet.obtenir_contact(contact_id)
     
     if not contact:
         flash('Contact introuvable !', 'danger')
@@ -538,7 +720,7 @@ def modifier(nom, prenom):
         nouvelle_categorie = request.form.get('categorie', '').strip()
         
         result = carnet.modifier_contact(
-            nom, prenom,
+            contact_id,
             nouveau_nom if nouveau_nom != contact.nom else None,
             nouveau_prenom if nouveau_prenom != contact.prenom else None,
             nouveau_email if nouveau_email != contact.email else None,
@@ -563,10 +745,10 @@ def modifier(nom, prenom):
     
     return render_template('modifier.html', contact=contact, admin_info=session['admin_info'], auth=auth)
 
-@app.route('/supprimer/<nom>/<prenom>')
+@route('/supprimer/<int:contact_id>')
 @admin_required
-def supprimer(nom, prenom):
-    result = carnet.supprimer_contact(nom, prenom)
+def supprimer(contact_id):
+    result = carnet.supprimer_contact(contact_id)
     if isinstance(result, tuple):
         success, message = result
     else:
@@ -576,60 +758,108 @@ def supprimer(nom, prenom):
     flash(message, 'success' if success else 'danger')
     return redirect(url_for('index'))
 
-@app.route('/whatsapp/<nom>/<prenom>')
+@route('/whatsapp/<int:contact_id>')
 @login_required
-def whatsapp(nom, prenom):
+def whatsapp(contact_id):
     """Ouvrir WhatsApp avec le contact"""
-    contact = carnet.rechercher_contact(nom, prenom)
+    contact = carnet.obtenir_contact(contact_id)
 
     if not contact:
         flash('Contact introuvable !', 'danger')
         return redirect(url_for('index'))
 
-    # Formater le numéro de téléphone pour WhatsApp (supprimer espaces et caractères spéciaux)
-    telephone = contact.telephone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+    # Numéro canonique E.164 (indicatif ajouté aux numéros nationaux)
+    if not contact.telephone_canonique:
+        flash('Numéro de téléphone invalide pour WhatsApp.', 'danger')
+        return redirect(url_for('index'))
+    return redirect(Communication._lien_wa_me(contact.telephone_canonique))
 
-    # Rediriger vers WhatsApp Web
-    whatsapp_url = f'https://wa.me/{telephone}'
-    return redirect(whatsapp_url)
+@route('/api/whatsapp/liens')
+@admin_required
+def liens_whatsapp():
+    """
+    Liens wa.me personnalisés d'un segment de contacts (catégorie, entreprise, service),
+    diffusés au fil de l'eau en CSV (par défaut) ou en JSON. Le message accepte
+    $prenom, $nom, $nom_complet, $entreprise, $fonction et $categorie.
+    """
+    modele = request.args.get('message', '').strip()
+    if not modele:
+        return jsonify({'error': "Le message est obligatoire."}), 400
+    format_export = request.args.get('format', 'csv')
+    if format_export not in ('csv', 'json'):
+        return jsonify({'error': "Format inconnu (csv ou json)."}), 400
+    service_id = request.args.get('service_id', type=int)
+    
+    liens = Communication.generer_liens_whatsapp(
+        carnet.iterer_segment(request.args.get('categorie') or None,
+                              request.args.get('entreprise') or None, service_id),
+        modele
+    )
+    colonnes = ['nom', 'prenom', 'telephone', 'telephone_e164', 'message', 'lien']
+    
+    def flux_csv():
+        tampon = io.StringIO()
+        ecrivain = csv.DictWriter(tampon, fieldnames=colonnes)
+        ecrivain.writeheader()
+        for ligne in liens:
+            ecrivain.writerow(ligne)
+            if tampon.tell() > 8192:
+                yield tampon.getvalue()
+                tampon.seek(0)
+                tampon.truncate()
+        yield tampon.getvalue()
+    
+    def flux_json():
+        yield '['
+        separateur = ''
+        for ligne in liens:
+            yield separateur + json.dumps(ligne, ensure_ascii=False)
+            separateur = ','
+        yield ']'
+    
+    if format_export == 'json':
+        reponse = Response(stream_with_context(flux_json()), mimetype='application/json')
+    else:
+        reponse = Response(stream_with_context(flux_csv()), mimetype='text/csv')
+    reponse.headers['Content-Disposition'] = f'attachment; filename="liens_whatsapp.{format_export}"'
+    return reponse
 
 # ==================== AGENDA & RENDEZ-VOUS ====================
 
-@app.route('/agenda')
+@route('/agenda')
 @login_required
 def agenda():
     """Page principale de l'agenda"""
-    admin_info = session['admin_info']
-    
-    # Tous les utilisateurs (y compris patients) peuvent voir l'agenda
-    services_list = services.obtenir_services_actifs()
-    
     # Date sélectionnée (par défaut aujourd'hui)
     date_str = request.args.get('date', date.today().strftime('%Y-%m-%d'))
     service_id = request.args.get('service_id')
     
-    creneaux = []
-    service_selectionne = None
-    
+    cles = [CompteursModifications.CLE_SERVICES, CompteursModifications.CLE_HORAIRES]
     if service_id:
-        service_selectionne = services.obtenir_service_par_id(int(service_id))
-        if service_selectionne:
-            creneaux = rdv_manager.obtenir_creneaux_disponibles(
-                int(service_id),
-                date_str,
-                service_selectionne['horaire_debut'],
-                service_selectionne['horaire_fin']
-            )
+        cles.append(CompteursModifications.cle_service(service_id))
     
-    return render_template('agenda.html',
-                         admin_info=admin_info,
-                         services=services_list,
-                         service_selectionne=service_selectionne,
-                         date_selectionnee=date_str,
-                         creneaux=creneaux,
-                         auth=auth)
+    def charger():
+        # Tous les utilisateurs (y compris patients) peuvent voir l'agenda
+        services_list = services.obtenir_services_actifs()
+        
+        creneaux = []
+        service_selectionne = None
+        
+        if service_id:
+            service_selectionne = services.obtenir_service_par_id(int(service_id))
+            if service_selectionne:
+                creneaux = rdv_manager.obtenir_creneaux_disponibles(int(service_id), date_str)
+        
+        return {
+            'services': services_list,
+            'service_selectionne': service_selectionne,
+            'date_selectionnee': date_str,
+            'creneaux': creneaux
+        }
+    
+    return _page_conditionnelle('agenda.html', cles, (date_str, service_id), charger)
 
-@app.route('/prendre_rdv', methods=['GET', 'POST'])
+@route('/prendre_rdv', methods=['GET', 'POST'])
 @login_required
 def prendre_rdv():
     """Prendre un rendez-vous - Accessible aux utilisateurs et admins"""
@@ -661,7 +891,25 @@ def prendre_rdv():
         if auth.est_user(admin_info) and not patient_email:
             patient_email = admin_info.get('email', '')
         
-        success, message, rdv_id = rdv_manager.prendre_rendez_vous(
+        # Série récurrente (suivi chronique) : toutes les occurrences en une réservation
+        frequence = request.form.get('recurrence')
+        if frequence:
+            success, message, _ = rdv_manager.prendre_serie_rendez_vous(
+                int(service_id),
+                patient_nom, patient_prenom, patient_telephone,
+                date_rdv, heure_debut, heure_fin,
+                frequence=frequence,
+                intervalle=request.form.get('recurrence_intervalle', type=int) or 1,
+                jusqu_au=request.form.get('recurrence_jusqu_au') or None,
+                nombre=request.form.get('recurrence_nombre', type=int),
+                motif=motif, patient_email=patient_email,
+                cree_par=admin_info['id'],
+                ignorer_conflits=bool(request.form.get('recurrence_ignorer_conflits'))
+            )
+            flash(message, 'success' if success else 'danger')
+            return redirect(url_for('mes_rdv'))
+        
+        success, message, rdv_id, raison = rdv_manager.prendre_rendez_vous(
             int(service_id),
             patient_nom, patient_prenom, patient_telephone,
             date_rdv, heure_debut, heure_fin,
@@ -674,6 +922,16 @@ def prendre_rdv():
                 flash('Votre demande de rendez-vous a été soumise et est en attente de validation par un administrateur.', 'info')
             else:
                 flash(message, 'success')
+        elif raison == RendezVous.RAISON_COMPLET and request.form.get('liste_attente'):
+            # Créneau complet (et seulement dans ce cas) : inscrire le patient sur la liste d'attente
+            heure_min = request.form.get('attente_heure_min') or heure_debut
+            heure_max = request.form.get('attente_heure_max') or heure_debut
+            inscrit, message_attente, _ = rdv_manager.liste_attente.inscrire(
+                int(service_id), date_rdv, heure_min, heure_max,
+                patient_nom, patient_prenom, patient_telephone,
+                patient_email, motif, admin_info['id']
+            )
+            flash(f"{message} {message_attente}", 'info' if inscrit else 'danger')
         else:
             flash(message, 'danger')
         
@@ -702,7 +960,7 @@ def prendre_rdv():
     
     if auth.est_user(admin_info) and admin_info.get('contact_id'):
         # Récupérer les infos du contact
-        conn = sqlite3.connect("polyclinique.db")
+        conn = connexion_base()
         cursor = conn.cursor()
         cursor.execute("SELECT nom, prenom, email, telephone FROM contacts WHERE id = ?", 
                       (admin_info['contact_id'],))
@@ -728,7 +986,7 @@ def prendre_rdv():
                          prefill_telephone=prefill_telephone,
                          auth=auth)
 
-@app.route('/api/creneaux')
+@route('/api/creneaux')
 @admin_required
 def api_creneaux():
     """API pour récupérer les créneaux disponibles (AJAX)"""
@@ -742,74 +1000,237 @@ def api_creneaux():
     if not service:
         return jsonify({'error': 'Service non trouvé'}), 404
     
-    creneaux = rdv_manager.generer_creneaux(date_str, service['horaire_debut'], service['horaire_fin'])
+    # Occupation de toute la journée en une seule requête agrégée
+    creneaux = rdv_manager.obtenir_creneaux_disponibles(int(service_id), date_str)
     
-    # Récupérer les créneaux occupés
-    creneaux_occupes = []
-    for debut, fin in creneaux:
-        if not rdv_manager.verifier_disponibilite(int(service_id), date_str, debut):
-            creneaux_occupes.append(debut)
+    # Créneaux complets et places restantes par créneau
+    creneaux_occupes = [debut for debut, fin, disponible, restantes in creneaux if not disponible]
+    places_restantes = {debut: restantes for debut, fin, disponible, restantes in creneaux}
     
     # Formater les créneaux pour l'affichage
-    creneaux_formates = [f"{debut}" for debut, fin in creneaux]
+    creneaux_formates = [f"{debut}" for debut, fin, disponible, restantes in creneaux]
     
     return jsonify({
         'creneaux': creneaux_formates,
-        'creneaux_occupes': creneaux_occupes
+        'creneaux_occupes': creneaux_occupes,
+        'places_restantes': places_restantes,
+        'capacite': service['capacite']
+    })
+
+@route('/api/evenements')
+@login_required
+def api_evenements():
+    """Flux Server-Sent Events des changements de créneaux et de la file de validation"""
+    admin_info = session['admin_info']
+    service_filtre = request.args.get('service', type=int)
+    
+    # Les événements de la file de validation (nominatifs) sont réservés aux admins, limités à leur service
+    voit_file = auth.est_super_admin(admin_info) or auth.est_admin(admin_info)
+    service_admin = None if auth.est_super_admin(admin_info) else admin_info.get('service_id')
+    
+    def flux():
+        file = bus_evenements.abonner()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    type_evenement, donnees = file.get(timeout=15)
+                except queue.Empty:
+                    # Commentaire de maintien : garde la connexion ouverte à travers les proxys
+                    yield ": ping\n\n"
+                    continue
+                
+                if service_filtre and donnees['service_id'] != service_filtre:
+                    continue
+                if type_evenement in (BusEvenements.RDV_EN_ATTENTE, BusEvenements.RDV_TRAITE):
+                    if not voit_file or (service_admin and donnees['service_id'] != service_admin):
+                        continue
+                
+                yield BusEvenements.formater_sse(type_evenement, donnees)
+        finally:
+            bus_evenements.desabonner(file)
+    
+    return Response(stream_with_context(flux()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@route('/api/rapports')
+@super_admin_required
+def api_rapports():
+    """API des indicateurs d'activité par service (occupation, annulations, rejets)"""
+    aujourd_hui = date.today()
+    date_debut = request.args.get('debut', (aujourd_hui - timedelta(weeks=12)).strftime('%Y-%m-%d'))
+    date_fin = request.args.get('fin', aujourd_hui.strftime('%Y-%m-%d'))
+    service_id = request.args.get('service', type=int)
+    granularite = request.args.get('granularite', 'semaine')
+    
+    try:
+        rapport = rapports.obtenir_rapport(date_debut, date_fin, service_id, granularite)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'debut': date_debut,
+        'fin': date_fin,
+        'granularite': granularite,
+        'lignes': rapport
     })
 
-@app.route('/mes_rdv')
+# ==================== CALENDRIERS (.ics) ====================
+
+def _reponse_calendrier(cle_compteur, generer_flux, nom_fichier):
+    """
+    Réponse .ics avec GET conditionnel : l'ETag et Last-Modified viennent du compteur de
+    modifications, un client dont la copie est à jour reçoit un 304 sans régénération
+    """
+    version, date_modification = compteurs.obtenir_version(cle_compteur)
+    # La date du jour fait partie de l'ETag : la fenêtre d'historique avance chaque jour
+    etag = f"{cle_compteur}-{version}-{date.today().strftime('%Y%m%d')}"
+    derniere_modification = None
+    if date_modification:
+        derniere_modification = datetime.strptime(date_modification, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    
+    a_jour = False
+    if request.if_none_match:
+        a_jour = request.if_none_match.contains(etag)
+    elif request.if_modified_since and derniere_modification:
+        a_jour = derniere_modification <= request.if_modified_since
+    
+    if a_jour:
+        reponse = Response(status=304)
+    else:
+        reponse = Response(generer_flux(), mimetype='text/calendar')
+        reponse.headers['Content-Disposition'] = f'inline; filename="{nom_fichier}"'
+    
+    reponse.set_etag(etag)
+    if derniere_modification:
+        reponse.last_modified = derniere_modification
+    reponse.headers['Cache-Control'] = 'private, no-cache'
+    return reponse
+
+@route('/calendrier/service/<int:service_id>.ics')
+def calendrier_service(service_id):
+    """Flux iCalendar des rendez-vous d'un service (admins du service, ou lien d'abonnement signé)"""
+    admin_info = session.get('admin_info')
+    autorise = calendrier.verifier_jeton('service', service_id, request.args.get('jeton'))
+    if admin_info and not autorise:
+        autorise = auth.est_super_admin(admin_info) or (
+            auth.est_admin(admin_info) and admin_info.get('service_id') == service_id)
+    if not autorise:
+        return Response("Accès refusé", status=403)
+    
+    service = services.obtenir_service_par_id(service_id)
+    if not service:
+        return Response("Service introuvable", status=404)
+    
+    return _reponse_calendrier(
+        CompteursModifications.cle_service(service_id),
+        lambda: calendrier.flux_service(service_id, service['nom']),
+        f"service-{service_id}.ics"
+    )
+
+@route('/calendrier/patient.ics')
+def calendrier_patient():
+    """Flux iCalendar des rendez-vous d'un patient (session, ou lien d'abonnement signé)"""
+    admin_info = session.get('admin_info')
+    patient_email = request.args.get('email', '')
+    if not calendrier.verifier_jeton('patient', patient_email, request.args.get('jeton')):
+        if not admin_info or not admin_info.get('email'):
+            return Response("Accès refusé", status=403)
+        patient_email = admin_info['email']
+    
+    return _reponse_calendrier(
+        CompteursModifications.cle_patient(patient_email),
+        lambda: calendrier.flux_patient(patient_email),
+        "mes-rendez-vous.ics"
+    )
+
+@route('/mes_rdv')
 @login_required
 def mes_rdv():
     """Liste des rendez-vous - Affiche selon le rôle de l'utilisateur"""
     admin_info = session['admin_info']
 
+    # Compteurs des rendez-vous visibles selon le rôle ; services et liste d'attente sont aussi affichés
     if auth.est_super_admin(admin_info):
-        # Super-admin voit tous les RDV
-        rdv_list = []
-        for s in services.obtenir_services_actifs():
-            rdv_list.extend(rdv_manager.obtenir_rendez_vous_par_service(s['id']))
+        cles = [CompteursModifications.CLE_RENDEZ_VOUS]
+        filtres = ()
     elif auth.est_admin(admin_info):
-        # Admin voit les RDV de son service
-        service_id = admin_info.get('service_id')
-        if service_id:
-            rdv_list = rdv_manager.obtenir_rendez_vous_par_service(service_id)
-        else:
-            rdv_list = []
+        cles = [CompteursModifications.cle_service(admin_info.get('service_id'))]
+        filtres = (admin_info.get('service_id'),)
     else:
-        # Patient (user) voit uniquement SES rendez-vous (par email)
-        user_email = admin_info.get('email')
-        if user_email:
-            rdv_list = rdv_manager.obtenir_rendez_vous_par_patient(user_email)
-        else:
+        cles = [CompteursModifications.cle_patient(admin_info.get('email'))]
+        filtres = (admin_info.get('email'),)
+    cles += [CompteursModifications.CLE_SERVICES, CompteursModifications.CLE_LISTE_ATTENTE]
+
+    def charger():
+        if auth.est_super_admin(admin_info):
+            # Super-admin voit tous les RDV
             rdv_list = []
+            for s in services.obtenir_services_actifs():
+                rdv_list.extend(rdv_manager.obtenir_rendez_vous_par_service(s['id']))
+        elif auth.est_admin(admin_info):
+            # Admin voit les RDV de son service
+            service_id = admin_info.get('service_id')
+            if service_id:
+                rdv_list = rdv_manager.obtenir_rendez_vous_par_service(service_id)
+            else:
+                rdv_list = []
+        else:
+            # Patient (user) voit uniquement SES rendez-vous (par email)
+            user_email = admin_info.get('email')
+            if user_email:
+                rdv_list = rdv_manager.obtenir_rendez_vous_par_patient(user_email)
+            else:
+                rdv_list = []
 
-    # Calculer les statistiques
-    stats = {
-        'a_venir': len([rdv for rdv in rdv_list if rdv.get('statut') in ['confirmé', 'en_attente']]),
-        'en_attente': len([rdv for rdv in rdv_list if rdv.get('statut') == 'en_attente']),
-        'confirmes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'confirmé']),
-        'rejetes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'rejeté']),
-        'passes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'passé'])
-    }
-    
-    # Récupérer les RDV en attente de validation (pour les admins)
-    rdv_en_attente = []
-    if auth.est_super_admin(admin_info):
-        rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente()
-    elif auth.est_admin(admin_info):
-        service_id = admin_info.get('service_id')
-        if service_id:
-            rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente(service_id)
+        # Calculer les statistiques
+        stats = {
+            'a_venir': len([rdv for rdv in rdv_list if rdv.get('statut') in ['confirmé', 'en_attente']]),
+            'en_attente': len([rdv for rdv in rdv_list if rdv.get('statut') == 'en_attente']),
+            'confirmes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'confirmé']),
+            'rejetes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'rejeté']),
+            'passes': len([rdv for rdv in rdv_list if rdv.get('statut') == 'passé'])
+        }
+        
+        # Récupérer les RDV en attente de validation (pour les admins)
+        rdv_en_attente = []
+        if auth.est_super_admin(admin_info):
+            rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente()
+        elif auth.est_admin(admin_info):
+            service_id = admin_info.get('service_id')
+            if service_id:
+                rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente(service_id)
+
+        # Inscriptions sur la liste d'attente
+        if auth.est_super_admin(admin_info):
+            inscriptions_attente = rdv_manager.liste_attente.obtenir_inscriptions()
+        elif auth.est_admin(admin_info):
+            service_id = admin_info.get('service_id')
+            inscriptions_attente = rdv_manager.liste_attente.obtenir_inscriptions(service_id) if service_id else []
+        else:
+            user_email = admin_info.get('email')
+            inscriptions_attente = rdv_manager.liste_attente.obtenir_inscriptions(patient_email=user_email) if user_email else []
+
+        # Lien d'abonnement calendrier (signé, utilisable sans session par les clients calendrier)
+        lien_calendrier = None
+        if auth.est_user(admin_info) and admin_info.get('email'):
+            lien_calendrier = url_for('calendrier_patient', email=admin_info['email'],
+                                      jeton=calendrier.generer_jeton('patient', admin_info['email']), _external=True)
+        elif auth.est_admin(admin_info) and admin_info.get('service_id'):
+            lien_calendrier = url_for('calendrier_service', service_id=admin_info['service_id'],
+                                      jeton=calendrier.generer_jeton('service', admin_info['service_id']), _external=True)
+
+        return {
+            'lien_calendrier': lien_calendrier,
+            'rendez_vous': rdv_list,
+            'stats': stats,
+            'rdv_en_attente': rdv_en_attente,
+            'inscriptions_attente': inscriptions_attente
+        }
 
-    return render_template('mes_rdv.html',
-                         admin_info=admin_info,
-                         rendez_vous=rdv_list,
-                         stats=stats,
-                         rdv_en_attente=rdv_en_attente,
-                         auth=auth)
+    return _page_conditionnelle('mes_rdv.html', cles, filtres, charger)
 
-@app.route('/annuler_rdv/<int:rdv_id>')
+@route('/annuler_rdv/<int:rdv_id>')
 @login_required
 def annuler_rdv(rdv_id):
     """Annuler un rendez-vous"""
@@ -817,23 +1238,17 @@ def annuler_rdv(rdv_id):
     admin_info = session['admin_info']
     
     # Récupérer le RDV
-    conn = sqlite3.connect("polyclinique.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT patient_email, cree_par FROM rendez_vous WHERE id = ?", (rdv_id,))
-    rdv = cursor.fetchone()
-    conn.close()
+    rdv = rdv_manager.obtenir_rendez_vous_par_id(rdv_id)
     
     if not rdv:
         flash('Rendez-vous introuvable.', 'danger')
         return redirect(url_for('mes_rdv'))
     
-    patient_email, cree_par = rdv
-    
     # Vérifier les permissions
     can_cancel = False
     if auth.est_super_admin(admin_info) or auth.est_admin(admin_info):
         can_cancel = True
-    elif auth.est_user(admin_info) and admin_info.get('email') == patient_email:
+    elif auth.est_user(admin_info) and RendezVous.appartient_au_patient(rdv, admin_info.get('email')):
         # Un patient peut annuler son propre RDV en attente
         can_cancel = True
     
@@ -848,7 +1263,87 @@ def annuler_rdv(rdv_id):
 
     return redirect(url_for('mes_rdv'))
 
-@app.route('/valider_rdv/<int:rdv_id>', methods=['POST'])
+@route('/annuler_attente/<int:inscription_id>')
+@login_required
+def annuler_attente(inscription_id):
+    """Retirer une inscription de la liste d'attente"""
+    admin_info = session['admin_info']
+    inscription = rdv_manager.liste_attente.obtenir_inscription_par_id(inscription_id)
+    
+    if not inscription:
+        flash('Inscription introuvable.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    # Un patient ne peut retirer que ses propres inscriptions
+    if auth.est_user(admin_info) and not RendezVous.appartient_au_patient(inscription, admin_info.get('email')):
+        flash('Vous n\'avez pas la permission de modifier cette inscription.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    if rdv_manager.liste_attente.annuler_inscription(inscription_id):
+        flash('Inscription retirée de la liste d\'attente.', 'success')
+    else:
+        flash('Cette inscription a déjà été traitée.', 'warning')
+    
+    return redirect(url_for('mes_rdv'))
+
+def _peut_gerer_serie(admin_info, serie):
+    """Vérifie qu'un utilisateur peut modifier ou annuler une série de rendez-vous"""
+    if auth.est_super_admin(admin_info):
+        return True
+    if auth.est_admin(admin_info):
+        return admin_info.get('service_id') == serie['service_id']
+    return RendezVous.appartient_au_patient(serie, admin_info.get('email'))
+
+@route('/annuler_serie/<int:serie_id>')
+@login_required
+def annuler_serie(serie_id):
+    """Annuler les rendez-vous à venir d'une série récurrente"""
+    admin_info = session['admin_info']
+    serie = rdv_manager.obtenir_serie(serie_id)
+    
+    if not serie:
+        flash('Série introuvable.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    if not _peut_gerer_serie(admin_info, serie):
+        flash('Vous n\'avez pas la permission d\'annuler cette série.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    nb_annules = rdv_manager.annuler_serie(serie_id)
+    if nb_annules:
+        flash(f'{nb_annules} rendez-vous de la série annulé(s).', 'success')
+    else:
+        flash('Aucun rendez-vous à venir dans cette série.', 'warning')
+    
+    return redirect(url_for('mes_rdv'))
+
+@route('/modifier_serie/<int:serie_id>', methods=['POST'])
+@login_required
+def modifier_serie(serie_id):
+    """Déplacer ou modifier le motif des rendez-vous à venir d'une série"""
+    admin_info = session['admin_info']
+    serie = rdv_manager.obtenir_serie(serie_id)
+    
+    if not serie:
+        flash('Série introuvable.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    if not _peut_gerer_serie(admin_info, serie):
+        flash('Vous n\'avez pas la permission de modifier cette série.', 'danger')
+        return redirect(url_for('mes_rdv'))
+    
+    success, message = rdv_manager.modifier_serie(
+        serie_id,
+        heure_debut=request.form.get('heure_debut') or None,
+        heure_fin=request.form.get('heure_fin') or None,
+        motif=request.form.get('motif') if 'motif' in request.form else None,
+        a_partir_de=request.form.get('a_partir_de') or None
+    )
+    flash(message, 'success' if success else 'danger')
+    
+    return redirect(url_for('mes_rdv'))
+
+@route('/valider_rdv/<int:rdv_id>', methods=['POST'])
 @admin_required
 def valider_rdv(rdv_id):
     """Valider un rendez-vous (Admin uniquement)"""
@@ -864,7 +1359,7 @@ def valider_rdv(rdv_id):
     
     return redirect(url_for('mes_rdv'))
 
-@app.route('/rejeter_rdv/<int:rdv_id>', methods=['POST'])
+@route('/rejeter_rdv/<int:rdv_id>', methods=['POST'])
 @admin_required
 def rejeter_rdv(rdv_id):
     """Rejeter un rendez-vous (Admin uniquement)"""
@@ -882,29 +1377,31 @@ def rejeter_rdv(rdv_id):
     
     return redirect(url_for('mes_rdv'))
 
-@app.route('/validation_rdv')
+@route('/validation_rdv')
 @admin_required
 def validation_rdv():
     """Page de validation des rendez-vous en attente"""
     admin_info = session['admin_info']
-    
+    service_id = None if auth.est_super_admin(admin_info) else admin_info.get('service_id')
     if auth.est_super_admin(admin_info):
-        # Super admin voit tous les RDV en attente
-        rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente()
+        cles = [CompteursModifications.CLE_RENDEZ_VOUS]
     else:
-        # Admin voit les RDV en attente de son service
-        service_id = admin_info.get('service_id')
-        if service_id:
+        cles = [CompteursModifications.cle_service(service_id)]
+    
+    def charger():
+        if auth.est_super_admin(admin_info):
+            # Super admin voit tous les RDV en attente
+            rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente()
+        elif service_id:
+            # Admin voit les RDV en attente de son service
             rdv_en_attente = rdv_manager.obtenir_rendez_vous_en_attente(service_id)
         else:
             rdv_en_attente = []
+        return {'rdv_en_attente': rdv_en_attente}
     
-    return render_template('validation_rdv.html',
-                         admin_info=admin_info,
-                         rdv_en_attente=rdv_en_attente,
-                         auth=auth)
+    return _page_conditionnelle('validation_rdv.html', cles, (service_id,), charger)
 
-@app.route('/modifier_rdv/<int:id>', methods=['GET', 'POST'])
+@route('/modifier_rdv/<int:id>', methods=['GET', 'POST'])
 @admin_required
 def modifier_rdv(id):
     """Modifier un rendez-vous"""
@@ -919,7 +1416,7 @@ def modifier_rdv(id):
 
 # ==================== GESTION DES SERVICES (Super-Admin) ====================
 
-@app.route('/gestion_services')
+@route('/gestion_services')
 @super_admin_required
 def gestion_services():
     """Gestion des services (Super-admin uniquement)"""
@@ -930,9 +1427,11 @@ def gestion_services():
                          admin_info=session['admin_info'],
                          services=services_list,
                          admins=admins_list,
+                         horaires=rdv_manager.horaires,
+                         aujourd_hui=date.today().strftime('%Y-%m-%d'),
                          auth=auth)
 
-@app.route('/modifier_service/<int:id>', methods=['POST'])
+@route('/modifier_service/<int:id>', methods=['POST'])
 @super_admin_required
 def modifier_service(id):
     """Modifier un service"""
@@ -941,29 +1440,94 @@ def modifier_service(id):
     horaire_debut = request.form.get('horaire_debut', '08:00').strip()
     horaire_fin = request.form.get('horaire_fin', '18:00').strip()
     responsable_id = request.form.get('responsable_id') or None
+    capacite = request.form.get('capacite', '').strip()
     
-    conn = sqlite3.connect("polyclinique.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE services 
-        SET nom = ?, description = ?, horaire_debut = ?, horaire_fin = ?, responsable_id = ?
-        WHERE id = ?
-    """, (nom, description, horaire_debut, horaire_fin, responsable_id, id))
+    if capacite and (not capacite.isdigit() or int(capacite) < 1):
+        flash('La capacité doit être un nombre entier supérieur ou égal à 1.', 'danger')
+        return redirect(url_for('gestion_services'))
     
-    conn.commit()
-    success = cursor.rowcount > 0
-    conn.close()
+    success = services.modifier_service(id, nom, description, horaire_debut, horaire_fin,
+                                        responsable_id, int(capacite) if capacite else None)
     
     if success:
-        services.charger_services()
         flash('Service modifié avec succès !', 'success')
     else:
         flash('Erreur lors de la modification.', 'danger')
     
     return redirect(url_for('gestion_services'))
 
-@app.route('/ajouter_service', methods=['POST'])
+@route('/ajouter_plage_capacite/<int:id>', methods=['POST'])
+@super_admin_required
+def ajouter_plage_capacite(id):
+    """Définir une capacité spécifique sur une plage horaire d'un service"""
+    heure_debut = request.form.get('heure_debut', '').strip()
+    heure_fin = request.form.get('heure_fin', '').strip()
+    capacite = request.form.get('capacite', '').strip()
+    
+    if not (heure_debut and heure_fin and capacite.isdigit()):
+        flash('Veuillez indiquer une plage horaire et une capacité valides.', 'danger')
+        return redirect(url_for('gestion_services'))
+    
+    success, message = services.ajouter_plage_capacite(id, heure_debut, heure_fin, int(capacite))
+    flash(message, 'success' if success else 'danger')
+    return redirect(url_for('gestion_services'))
+
+@route('/supprimer_plage_capacite/<int:plage_id>')
+@super_admin_required
+def supprimer_plage_capacite(plage_id):
+    """Supprimer une plage de capacité"""
+    if services.supprimer_plage_capacite(plage_id):
+        flash('Plage de capacité supprimée.', 'success')
+    else:
+        flash('Plage de capacité introuvable.', 'danger')
+    return redirect(url_for('gestion_services'))
+
+@route('/horaires_service/<int:id>', methods=['POST'])
+@super_admin_required
+def horaires_service(id):
+    """Définir les horaires hebdomadaires d'un service (plages séparées par des virgules, vide = fermé)"""
+    horaires = rdv_manager.horaires
+    
+    if request.form.get('action') == 'reinitialiser':
+        success, message = horaires.definir_horaires_semaine(id, {})
+    else:
+        try:
+            semaine = {jour: horaires.analyser_plages(request.form.get(f'jour_{jour}', ''))
+                       for jour in range(7)}
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('gestion_services'))
+        success, message = horaires.definir_horaires_semaine(id, semaine)
+    
+    flash(message, 'success' if success else 'danger')
+    return redirect(url_for('gestion_services'))
+
+@route('/ajouter_fermeture', methods=['POST'])
+@super_admin_required
+def ajouter_fermeture():
+    """Fermer un service, ou toute la polyclinique, sur une date ou une période"""
+    service_id = request.form.get('service_id') or None
+    date_debut = request.form.get('date_debut', '').strip()
+    date_fin = request.form.get('date_fin', '').strip() or None
+    motif = request.form.get('motif', '').strip()
+    
+    success, message = rdv_manager.horaires.ajouter_fermeture(
+        int(service_id) if service_id else None, date_debut, date_fin, motif
+    )
+    flash(message, 'success' if success else 'danger')
+    return redirect(url_for('gestion_services'))
+
+@route('/supprimer_fermeture/<int:fermeture_id>')
+@super_admin_required
+def supprimer_fermeture(fermeture_id):
+    """Supprimer une fermeture"""
+    if rdv_manager.horaires.supprimer_fermeture(fermeture_id):
+        flash('Fermeture supprimée.', 'success')
+    else:
+        flash('Fermeture introuvable.', 'danger')
+    return redirect(url_for('gestion_services'))
+
+@route('/ajouter_service', methods=['POST'])
 @super_admin_required
 def ajouter_service():
     """Ajouter un service"""
@@ -971,23 +1535,28 @@ def ajouter_service():
     description = request.form.get('description', '').strip()
     horaire_debut = request.form.get('horaire_debut', '08:00').strip()
     horaire_fin = request.form.get('horaire_fin', '18:00').strip()
+    capacite = request.form.get('capacite', '1').strip() or '1'
     
     if not nom:
         flash('Le nom du service est obligatoire.', 'danger')
         return redirect(url_for('gestion_services'))
     
-    if services.ajouter_service(nom, description, horaire_debut, horaire_fin):
+    if not capacite.isdigit() or int(capacite) < 1:
+        flash('La capacité doit être un nombre entier supérieur ou égal à 1.', 'danger')
+        return redirect(url_for('gestion_services'))
+    
+    if services.ajouter_service(nom, description, horaire_debut, horaire_fin, int(capacite)):
         flash(f'Service "{nom}" ajouté avec succès !', 'success')
     else:
         flash('Erreur lors de l\'ajout du service.', 'danger')
     
     return redirect(url_for('gestion_services'))
 
-@app.route('/supprimer_service/<int:id>')
+@route('/supprimer_service/<int:id>')
 @super_admin_required
 def supprimer_service(id):
     """Supprimer un service"""
-    conn = sqlite3.connect("polyclinique.db")
+    conn = connexion_base()
     cursor = conn.cursor()
     
     cursor.execute("DELETE FROM services WHERE id = ?", (id,))
@@ -1005,12 +1574,10 @@ def supprimer_service(id):
 
 # ==================== CONFIGURATION ====================
 
-@app.route('/configuration', methods=['GET', 'POST'])
+@route('/configuration', methods=['GET', 'POST'])
 @super_admin_required
 def configuration():
     """Page de configuration du système"""
-    global EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL, comm
-    
     if request.method == 'POST':
         action = request.form.get('action')
         
@@ -1020,9 +1587,7 @@ def configuration():
             
             if email and password:
                 save_email_config(email, password)
-                EMAIL_EXPEDITEUR = email
-                MOT_DE_PASSE_EMAIL = password
-                comm = Communication(EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL)
+                _services().recharger_communication()
                 flash('Configuration email sauvegardée avec succès !', 'success')
             else:
                 flash('Veuillez remplir tous les champs.', 'danger')
@@ -1030,7 +1595,7 @@ def configuration():
         return redirect(url_for('configuration'))
     
     # GET
-    email_config, _ = get_email_config()
+    email_config = _services().configuration.obtenir('email_expediteur')
     config = {
         'email': email_config,
         'email_configured': bool(email_config)
@@ -1043,7 +1608,7 @@ def configuration():
 
 # ==================== COMMUNICATION ====================
 
-@app.route('/mon_profil', methods=['GET', 'POST'])
+@route('/mon_profil', methods=['GET', 'POST'])
 @login_required
 def mon_profil():
     """Page de profil pour les utilisateurs (patients)"""
@@ -1057,7 +1622,7 @@ def mon_profil():
     # Récupérer les infos du contact
     contact_info = None
     if admin_info.get('contact_id'):
-        conn = sqlite3.connect("polyclinique.db")
+        conn = connexion_base()
         cursor = conn.cursor()
         cursor.execute("SELECT id, nom, prenom, email, telephone, adresse, fonction, entreprise FROM contacts WHERE id = ?", 
                       (admin_info['contact_id'],))
@@ -1097,16 +1662,19 @@ def mon_profil():
             entreprise = request.form.get('entreprise', '').strip()
             
             # Mettre à jour le contact
-            conn = sqlite3.connect("polyclinique.db")
+            conn = connexion_base()
             cursor = conn.cursor()
             try:
                 cursor.execute("""
                     UPDATE contacts 
-                    SET nom = ?, prenom = ?, telephone = ?, email = ?, 
+                    SET nom = ?, prenom = ?, nom_normalise = ?, prenom_normalise = ?,
+                        telephone = ?, telephone_canonique = ?, email = ?, 
                         adresse = ?, fonction = ?, entreprise = ?,
                         date_modification = CURRENT_TIMESTAMP
                     WHERE id = ?
-                """, (nom, prenom, telephone, email, adresse, fonction, entreprise, contact_info['id']))
+                """, (nom, prenom, normaliser_texte(nom), normaliser_texte(prenom),
+                      telephone, normaliser_telephone(telephone) or None, email,
+                      adresse, fonction, entreprise, contact_info['id']))
                 conn.commit()
                 flash('Informations personnelles mises à jour avec succès !', 'success')
             except sqlite3.IntegrityError as e:
@@ -1128,19 +1696,17 @@ def mon_profil():
                          contact_info=contact_info,
                          auth=auth)
 
-@app.route('/envoyer-email/<nom>/<prenom>', methods=['GET', 'POST'])
+@route('/envoyer-email/<int:contact_id>', methods=['GET', 'POST'])
 @login_required
-def envoyer_email(nom, prenom):
-    contact = carnet.rechercher_contact(nom, prenom)
+def envoyer_email(contact_id):
+    contact = carnet.obtenir_contact(contact_id)
     
     if not contact:
         flash('Contact introuvable !', 'danger')
         return redirect(url_for('index'))
     
-    # Recharger la config email au cas où elle a changé
-    global EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL, comm
-    EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL = get_email_config()
-    comm = Communication(EMAIL_EXPEDITEUR, MOT_DE_PASSE_EMAIL)
+    # Module recréé seulement si la configuration a changé (cache rafraîchi avant la requête)
+    _services().recharger_communication()
     
     if request.method == 'POST':
         sujet = request.form.get('sujet', '').strip()
@@ -1149,20 +1715,136 @@ def envoyer_email(nom, prenom):
         if not sujet or not message:
             flash('Le sujet et le message sont obligatoires !', 'danger')
             return render_template('envoyer_email.html', contact=contact, admin_info=session['admin_info'], 
-                                  config_email=bool(EMAIL_EXPEDITEUR), auth=auth)
+                                  config_email=bool(comm.email_expediteur), auth=auth)
         
-        success, msg = comm.envoyer_email(contact.email, sujet, message, html=False)
-        
-        if success:
-            flash(msg, 'success')
-            return redirect(url_for('index'))
-        else:
-            flash(msg, 'danger')
+        # Mise en file : l'envoi SMTP (et ses éventuels réessais) se fait hors de la requête
+        registre = _services()
+        registre.file_notifications.mettre_en_file(contact.email, sujet, message)
+        registre.distributeur_notifications.demarrer()
+        registre.distributeur_notifications.reveiller()
+        flash(f"Email à {contact.email} mis en file d'envoi.", 'success')
+        return redirect(url_for('index'))
     
     return render_template('envoyer_email.html', contact=contact, admin_info=session['admin_info'],
-                          config_email=bool(EMAIL_EXPEDITEUR), auth=auth)
+                          config_email=bool(comm.email_expediteur), auth=auth)
+
+@route('/api/campagnes', methods=['POST'])
+@admin_required
+def lancer_campagne():
+    """
+    Lance une campagne d'emails personnalisés sur un segment de contacts
+    (catégorie, entreprise, rendez-vous dans un service). Le sujet et le corps
+    acceptent $prenom, $nom, $nom_complet, $email, $entreprise, $fonction et $categorie.
+    """
+    donnees = request.get_json(silent=True) or request.form
+    sujet = (donnees.get('sujet') or '').strip()
+    corps = (donnees.get('corps') or '').strip()
+    if not sujet or not corps:
+        return jsonify({'error': "Le sujet et le corps sont obligatoires."}), 400
+    
+    try:
+        service_id = int(donnees['service_id']) if donnees.get('service_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "Service invalide."}), 400
+    
+    registre = _services()
+    campagne = CampagneEmail(registre.recharger_communication(), sujet, corps,
+                             html=str(donnees.get('html', '')).lower() in ('1', 'true', 'on'))
+    campagne.lancer(carnet.iterer_segment(donnees.get('categorie') or None,
+                                          donnees.get('entreprise') or None, service_id))
+    
+    campagne_id = max(registre.campagnes, default=0) + 1
+    registre.campagnes[campagne_id] = campagne
+    return jsonify({'id': campagne_id, 'progression': campagne.progression()}), 202
+
+@route('/api/campagnes/<int:campagne_id>')
+@admin_required
+def progression_campagne(campagne_id):
+    """Avancement d'une campagne lancée par ce processus"""
+    campagne = _services().campagnes.get(campagne_id)
+    if campagne is None:
+        return jsonify({'error': "Campagne introuvable."}), 404
+    return jsonify({'id': campagne_id, 'progression': campagne.progression()})
+
+@route('/api/campagnes/<int:campagne_id>/arreter', methods=['POST'])
+@admin_required
+def arreter_campagne(campagne_id):
+    """Interrompt une campagne après le lot en cours d'envoi"""
+    campagne = _services().campagnes.get(campagne_id)
+    if campagne is None:
+        return jsonify({'error': "Campagne introuvable."}), 404
+    campagne.arreter()
+    return jsonify({'id': campagne_id, 'progression': campagne.progression()})
+
+# ==================== APPLICATION ====================
+
+def create_app(config=None):
+    """
+    Crée l'application Flask sans toucher la base : le schéma est appliqué par
+    la commande init-db (ou au premier usage d'un module), et les modules métier
+    sont construits paresseusement, une fois par processus.
+    
+    Les notifications en file (promotions de la liste d'attente, emails) et les rappels
+    sont envoyés par des threads d'arrière-plan, démarrés au choix :
+    - par un processus dédié : flask --app app taches (à côté de flask run ou gunicorn) ;
+    - dans chaque processus servant, à sa première requête : config TACHES_ARRIERE_PLAN = True
+      (plusieurs workers peuvent tourner ensemble : lots réservés, rappels enregistrés une fois).
+    
+    Args:
+        config (dict, optional): Valeurs remplaçant CONFIG_PAR_DEFAUT (DATABASE, SECRET_KEY, ...)
+    
+    Returns:
+        Flask: Application configurée
+    """
+    app = Flask(__name__)
+    app.config.update(CONFIG_PAR_DEFAUT)
+    if config:
+        app.config.update(config)
+    
+    app.extensions['polyclinique'] = ServicesApplication(app.config['DATABASE'], app.config['SECRET_KEY'])
+    
+    for rule, options, vue in _ROUTES:
+        app.add_url_rule(rule, vue.__name__, vue, **options)
+    
+    @app.before_request
+    def rafraichir_caches():
+        _services().rafraichir_caches()
+    
+    if app.config['TACHES_ARRIERE_PLAN']:
+        @app.before_request
+        def demarrer_taches():
+            # Dans le processus qui sert (après un éventuel fork) ; sans effet une fois démarrées
+            _services().demarrer_taches()
+    
+    @app.cli.command('taches')
+    @click.option('--intervalle-rappels', default=3600, show_default=True,
+                  help="Secondes entre deux passages des rappels")
+    def taches(intervalle_rappels):
+        """Envoie en continu les notifications en file et les rappels (Ctrl+C pour arrêter)"""
+        registre = _services()
+        registre.demarrer_taches(intervalle_rappels)
+        click.echo(f"✓ Envoi des notifications et des rappels démarré ({app.config['DATABASE']})")
+        try:
+            registre.planificateur_rappels._thread.join()
+        except KeyboardInterrupt:
+            registre.arreter_taches()
+            click.echo("✓ Tâches arrêtées")
+    
+    @app.cli.command('init-db')
+    def init_db():
+        """Crée ou met à jour le schéma de la base et le compte directeur par défaut"""
+        nombre = migrer(app.config['DATABASE'])
+        Authentification(app.config['DATABASE'])
+        click.echo(f"✓ Base {app.config['DATABASE']} à jour ({nombre} migration(s) appliquée(s))")
+    
+    return app
 
 # ==================== LANCEMENT ====================
 
 if __name__ == '__main__':
+    app = create_app()
+    # En mode debug, le rechargeur lance deux processus : seul le processus servant démarre les rappels
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        with app.app_context():
+            _services().demarrer_taches()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,5 +1,6 @@
 import sqlite3
 import hashlib
+from migrations import assurer_schema
 
 class Authentification:
     """Classe gérant l'authentification avec rôles (Super-Admin, Admin et User)"""
@@ -23,7 +24,7 @@ class Authentification:
             db_name (str): Nom de la base de données
         """
         self.db_name = db_name
-        self.creer_table_admins()
+        assurer_schema(self.db_name)
         
         # Créer un super-admin par défaut si aucun n'existe
         if self.nombre_admins() == 0:
@@ -34,57 +35,6 @@ class Authentification:
         """Crée une connexion à la base de données"""
         return sqlite3.connect(self.db_name)
     
-    def creer_table_admins(self):
-        """Crée la table admins avec rôles"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom_utilisateur TEXT UNIQUE NOT NULL,
-                mot_de_passe_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                service_id INTEGER,
-                email TEXT UNIQUE,
-                contact_id INTEGER,
-                actif INTEGER DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (service_id) REFERENCES services(id),
-                FOREIGN KEY (contact_id) REFERENCES contacts(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✓ Table admins initialisée")
-        
-        # Migrer pour ajouter les nouvelles colonnes si elles n'existent pas
-        self._migrer_table_admins()
-    
-    def _migrer_table_admins(self):
-        """Ajoute les colonnes email et contact_id si elles n'existent pas"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("PRAGMA table_info(admins)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'email' not in columns:
-                cursor.execute("ALTER TABLE admins ADD COLUMN email TEXT UNIQUE")
-                print("✓ Colonne email ajoutée à la table admins")
-            
-            if 'contact_id' not in columns:
-                cursor.execute("ALTER TABLE admins ADD COLUMN contact_id INTEGER")
-                print("✓ Colonne contact_id ajoutée à la table admins")
-            
-            conn.commit()
-        except Exception as e:
-            print(f"⚠️ Note: {e}")
-        finally:
-            conn.close()
-    
     def hasher_mot_de_passe(self, mot_de_passe):
         """Hache un mot de passe avec SHA-256"""
         return hashlib.sha256(mot_de_passe.encode()).hexdigest()
@@ -0,0 +1,74 @@
+"""
+Mesure du coût de démarrage de l'application.
+
+Chaque mesure tourne dans un processus neuf (comme un worker gunicorn ou un outil
+en ligne de commande) sur une copie de la base, pour ne pas modifier l'originale :
+- import : import du module app
+- create_app : création de l'application
+- 1re requête : construction paresseuse des modules utilisés par la page de connexion
+- 2e requête : requête suivante, modules déjà construits
+
+Usage : python benchmark_demarrage.py [--base polyclinique.db] [--repetitions 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SCRIPT_MESURE = r'''
+import sys, time, json
+debut = time.perf_counter()
+import app as module_app
+t_import = time.perf_counter()
+application = module_app.create_app({'DATABASE': sys.argv[1]})
+t_create = time.perf_counter()
+client = application.test_client()
+client.post('/login', data={'username': 'inconnu', 'password': 'x'})
+t_premiere = time.perf_counter()
+client.post('/login', data={'username': 'inconnu', 'password': 'x'})
+t_seconde = time.perf_counter()
+print(json.dumps({
+    'import': t_import - debut,
+    'create_app': t_create - t_import,
+    '1re requête': t_premiere - t_create,
+    '2e requête': t_seconde - t_premiere,
+}))
+'''
+
+
+def mesurer(base, repetitions):
+    """Lance les mesures et retourne les durées (en secondes) par étape"""
+    dossier_app = os.path.dirname(os.path.abspath(__file__))
+    resultats = {}
+    
+    with tempfile.TemporaryDirectory() as dossier:
+        copie = os.path.join(dossier, os.path.basename(base))
+        for _ in range(repetitions):
+            if os.path.exists(base):
+                shutil.copy(base, copie)
+            sortie = subprocess.run(
+                [sys.executable, '-c', SCRIPT_MESURE, copie],
+                cwd=dossier_app, capture_output=True, text=True, check=True
+            ).stdout
+            mesures = json.loads(sortie.strip().splitlines()[-1])
+            for etape, duree in mesures.items():
+                resultats.setdefault(etape, []).append(duree)
+    
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesure du temps de démarrage de l'application")
+    parser.add_argument('--base', default="polyclinique.db", help="Base copiée pour chaque mesure")
+    parser.add_argument('--repetitions', type=int, default=5, help="Nombre de processus lancés")
+    args = parser.parse_args()
+    
+    resultats = mesurer(args.base, args.repetitions)
+    print(f"{'Étape':<14} {'médiane':>10} {'min':>10} {'max':>10}")
+    for etape, durees in resultats.items():
+        print(f"{etape:<14} {statistics.median(durees) * 1000:>8.1f}ms "
+              f"{min(durees) * 1000:>8.1f}ms {max(durees) * 1000:>8.1f}ms")
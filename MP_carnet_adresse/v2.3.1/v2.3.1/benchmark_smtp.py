@@ -0,0 +1,62 @@
+"""
+Mesure du débit d'envoi des emails contre un serveur SMTP de test.
+
+Compare l'ancien envoi (une session SMTP ouverte puis fermée par email) et le pool
+de sessions persistantes de Communication, avec plusieurs tailles de pool.
+Aucun email réel n'est envoyé si le serveur est un serveur de test local, par exemple :
+    python -m aiosmtpd -n -l localhost:8025
+
+Usage : python benchmark_smtp.py [--host localhost] [--port 8025] [--nombre 200] [--sessions 1 4 8]
+"""
+import argparse
+import time
+
+from communication import Communication
+
+
+def envoyer_une_session_par_email(comm, messages):
+    """Ancien comportement : connexion, envoi et déconnexion pour chaque email"""
+    for m in messages:
+        server = comm._ouvrir_session_smtp()
+        server.send_message(comm._construire_message(m['destinataire'], m['sujet'], m['message']))
+        server.quit()
+
+
+def mesurer(host, port, nombre, tailles, debit_max=None, starttls=False):
+    """Envoie le même lot avec chaque méthode et retourne la durée (en secondes) de chacune"""
+    messages = [{'destinataire': f"patient{i}@exemple.test", 'sujet': f"Test {i}",
+                 'message': "Message de test du banc d'envoi."} for i in range(nombre)]
+    resultats = {}
+    
+    comm = Communication("banc@polyclinique.local", None, host, port, starttls)
+    debut = time.perf_counter()
+    envoyer_une_session_par_email(comm, messages)
+    resultats["1 session / email"] = time.perf_counter() - debut
+    
+    for taille in tailles:
+        comm = Communication("banc@polyclinique.local", None, host, port, starttls,
+                             sessions_smtp=taille, debit_max=debit_max)
+        debut = time.perf_counter()
+        echecs = [r for r in comm.envoyer_emails_lot(messages) if not r[1]]
+        resultats[f"pool de {taille}"] = time.perf_counter() - debut
+        comm.fermer()
+        if echecs:
+            print(f"✗ pool de {taille} : {len(echecs)} échec(s), ex. {echecs[0][2]}")
+    
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesure du débit d'envoi des emails")
+    parser.add_argument('--host', default="localhost", help="Serveur SMTP de test")
+    parser.add_argument('--port', type=int, default=8025, help="Port du serveur SMTP de test")
+    parser.add_argument('--nombre', type=int, default=200, help="Nombre d'emails par méthode")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 8], help="Tailles de pool mesurées")
+    parser.add_argument('--debit-max', type=float, help="Limite d'emails par seconde")
+    parser.add_argument('--tls', action='store_true', help="Utiliser STARTTLS")
+    args = parser.parse_args()
+    
+    resultats = mesurer(args.host, args.port, args.nombre, args.sessions, args.debit_max, args.tls)
+    print(f"{'Méthode':<20} {'durée':>10} {'emails/s':>10}")
+    for methode, duree in resultats.items():
+        print(f"{methode:<20} {duree * 1000:>8.0f}ms {args.nombre / duree:>10.1f}")
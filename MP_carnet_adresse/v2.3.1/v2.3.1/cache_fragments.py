@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheFragments:
+    """
+    Cache des fragments HTML rendus (listes de contacts, de rendez-vous...), partagé par les
+    requêtes d'un processus. La clé contient les versions des compteurs de modifications :
+    une écriture rend l'ancienne entrée inutilisable, elle sort du cache par ancienneté (LRU).
+    """
+    
+    TAILLE_MAX = 256
+    
+    def __init__(self, taille_max=TAILLE_MAX):
+        """
+        Initialise le cache
+        
+        Args:
+            taille_max (int): Nombre maximal de fragments conservés
+        """
+        self.taille_max = taille_max
+        self._fragments = OrderedDict()
+        self._verrou = threading.Lock()
+    
+    def obtenir(self, cle, generer):
+        """
+        Retourne le fragment d'une clé, rendu par generer() s'il n'est pas en cache
+        
+        Args:
+            cle (tuple): Clé du fragment (versions, rôle, filtres...)
+            generer (callable): Rendu du fragment (requêtes et gabarit), appelé hors du verrou
+        
+        Returns:
+            Le fragment rendu
+        """
+        with self._verrou:
+            if cle in self._fragments:
+                self._fragments.move_to_end(cle)
+                return self._fragments[cle]
+        
+        fragment = generer()
+        
+        with self._verrou:
+            self._fragments[cle] = fragment
+            self._fragments.move_to_end(cle)
+            while len(self._fragments) > self.taille_max:
+                self._fragments.popitem(last=False)
+        return fragment
+    
+    def vider(self):
+        """Supprime tous les fragments"""
+        with self._verrou:
+            self._fragments.clear()
+    
+    def __len__(self):
+        return len(self._fragments)
@@ -0,0 +1,138 @@
+import sqlite3
+import hmac
+import hashlib
+from datetime import datetime, timedelta, timezone
+from normalisation import normaliser_email
+
+class CalendrierICS:
+    """Classe générant les flux iCalendar (.ics) des rendez-vous"""
+    
+    TAILLE_LOT = 200
+    JOURS_HISTORIQUE = 30
+    
+    def __init__(self, db_name="polyclinique.db", cle_secrete=""):
+        """
+        Initialise la génération des calendriers
+        
+        Args:
+            db_name (str): Nom de la base de données
+            cle_secrete (str): Clé de signature des liens d'abonnement
+        """
+        self.db_name = db_name
+        self.cle_secrete = cle_secrete
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def generer_jeton(self, type_flux, identifiant):
+        """
+        Génère le jeton d'un lien d'abonnement : les clients calendrier n'ont pas de session
+        
+        Args:
+            type_flux (str): 'service' ou 'patient'
+            identifiant: ID du service ou email du patient
+        """
+        message = f"{type_flux}:{str(identifiant).strip().lower()}".encode()
+        return hmac.new(self.cle_secrete.encode(), message, hashlib.sha256).hexdigest()[:32]
+    
+    def verifier_jeton(self, type_flux, identifiant, jeton):
+        """Vérifie le jeton d'un lien d'abonnement"""
+        return bool(jeton) and hmac.compare_digest(self.generer_jeton(type_flux, identifiant), jeton)
+    
+    @staticmethod
+    def _echapper(texte):
+        """Échappe une valeur texte selon la RFC 5545"""
+        return (str(texte or '').replace('\\', '\\\\').replace(';', '\\;')
+                .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+    
+    @staticmethod
+    def _plier(ligne):
+        """Coupe une ligne de contenu à 75 octets (lignes de continuation préfixées d'un espace)"""
+        octets = ligne.encode('utf-8')
+        if len(octets) <= 75:
+            return ligne + "\r\n"
+        
+        morceaux = []
+        courant = ""
+        limite = 75
+        for caractere in ligne:
+            if len((courant + caractere).encode('utf-8')) > limite:
+                morceaux.append(courant)
+                courant = caractere
+                limite = 74
+            else:
+                courant += caractere
+        morceaux.append(courant)
+        return "\r\n ".join(morceaux) + "\r\n"
+    
+    def _vevent(self, rdv, horodatage):
+        """Formate un rendez-vous en VEVENT"""
+        rdv_id, date_rdv, heure_debut, heure_fin, statut, motif, nom, prenom, telephone, service_nom = rdv
+        jour = date_rdv.replace('-', '')
+        resume = f"{service_nom} - {nom} {prenom}"
+        description = f"Patient : {nom} {prenom}\nTéléphone : {telephone}"
+        if motif:
+            description += f"\nMotif : {motif}"
+        
+        lignes = [
+            "BEGIN:VEVENT",
+            f"UID:rdv-{rdv_id}@polyclinique",
+            f"DTSTAMP:{horodatage}",
+            f"DTSTART:{jour}T{heure_debut.replace(':', '')}00",
+            f"DTEND:{jour}T{heure_fin.replace(':', '')}00",
+            f"SUMMARY:{self._echapper(resume)}",
+            f"DESCRIPTION:{self._echapper(description)}",
+            f"STATUS:{'CONFIRMED' if statut == 'confirmé' else 'TENTATIVE'}",
+            "END:VEVENT",
+        ]
+        return ''.join(self._plier(ligne) for ligne in lignes)
+    
+    def _flux(self, nom_calendrier, where_clause, params):
+        """
+        Générateur du calendrier : l'en-tête, puis les VEVENT lus par lots sur le curseur
+        
+        Yields:
+            str: Morceaux du fichier .ics
+        """
+        horodatage = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        depuis = (datetime.now() - timedelta(days=self.JOURS_HISTORIQUE)).strftime("%Y-%m-%d")
+        
+        yield ''.join(self._plier(ligne) for ligne in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//Polyclinique//Rendez-vous//FR",
+            "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{self._echapper(nom_calendrier)}",
+        ))
+        
+        conn = self.creer_connexion()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT r.id, r.date_rdv, r.heure_debut, r.heure_fin, r.statut, r.motif,
+                       r.patient_nom, r.patient_prenom, r.patient_telephone, s.nom
+                FROM rendez_vous r
+                JOIN services s ON r.service_id = s.id
+                WHERE {where_clause} AND r.date_rdv >= ? AND r.statut IN ('en_attente', 'confirmé')
+                ORDER BY r.date_rdv, r.heure_debut
+            """, (*params, depuis))
+            
+            while True:
+                lot = cursor.fetchmany(self.TAILLE_LOT)
+                if not lot:
+                    break
+                yield ''.join(self._vevent(rdv, horodatage) for rdv in lot)
+        finally:
+            conn.close()
+        
+        yield self._plier("END:VCALENDAR")
+    
+    def flux_service(self, service_id, service_nom):
+        """Flux .ics des rendez-vous d'un service"""
+        return self._flux(f"Polyclinique - {service_nom}", "r.service_id = ?", (service_id,))
+    
+    def flux_patient(self, patient_email):
+        """Flux .ics des rendez-vous d'un patient"""
+        return self._flux("Mes rendez-vous - Polyclinique", "r.patient_cle_email = ?",
+                          (normaliser_email(patient_email),))
@@ -0,0 +1,247 @@
+import html
+import queue
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from string import Template
+
+
+@lru_cache(maxsize=64)
+def compiler_modele(texte):
+    """
+    Compile un modèle de message ($prenom, $nom, $nom_complet, $email, $entreprise, $fonction, $categorie).
+    Le même texte n'est compilé qu'une fois, quel que soit le nombre de destinataires ou de campagnes.
+    """
+    return Template(texte)
+
+
+def personnaliser(modele, contact, echapper_html=False):
+    """
+    Remplit un modèle compilé avec les champs d'un contact.
+    Une variable inconnue est laissée telle quelle plutôt que de faire échouer l'envoi.
+    
+    Args:
+        modele (Template): Modèle compilé par compiler_modele
+        contact (dict): Contact (tel que produit par AddressBook.iterer_segment)
+        echapper_html (bool): Échapper les valeurs (corps HTML)
+    
+    Returns:
+        str: Message personnalisé
+    """
+    champs = {
+        'nom': contact['nom'],
+        'prenom': contact['prenom'],
+        'nom_complet': f"{contact['prenom']} {contact['nom']}",
+        'email': contact.get('email') or '',
+        'entreprise': contact.get('entreprise') or '',
+        'fonction': contact.get('fonction') or '',
+        'categorie': contact.get('categorie') or '',
+    }
+    if echapper_html:
+        champs = {cle: html.escape(valeur) for cle, valeur in champs.items()}
+    return modele.safe_substitute(champs)
+
+
+class MetriquesCampagne:
+    """Compteurs d'avancement d'une campagne, mis à jour par ses threads et lus par l'interface"""
+    
+    NB_ERREURS_CONSERVEES = 20
+    
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.selectionnes = 0
+        self.ignores = 0
+        self.envoyes = 0
+        self.echecs = 0
+        self.erreurs = deque(maxlen=self.NB_ERREURS_CONSERVEES)
+        self.debut = None
+        self.fin = None
+    
+    def ajouter(self, **increments):
+        """Incrémente des compteurs (selectionnes, ignores, envoyes, echecs)"""
+        with self._verrou:
+            for compteur, valeur in increments.items():
+                setattr(self, compteur, getattr(self, compteur) + valeur)
+    
+    def ajouter_erreur(self, erreur):
+        """Conserve une erreur (seules les plus récentes sont gardées)"""
+        with self._verrou:
+            self.erreurs.append(erreur)
+    
+    def instantane(self, lots_en_file=0):
+        """
+        Retourne l'état de la campagne
+        
+        Returns:
+            dict: Compteurs, durée (s), débit (emails/s) et état (en_attente, en_cours, terminee)
+        """
+        with self._verrou:
+            duree = 0.0
+            if self.debut is not None:
+                duree = (self.fin or time.monotonic()) - self.debut
+            traites = self.envoyes + self.echecs
+            return {
+                'etat': 'en_attente' if self.debut is None else ('terminee' if self.fin else 'en_cours'),
+                'selectionnes': self.selectionnes,
+                'ignores': self.ignores,
+                'envoyes': self.envoyes,
+                'echecs': self.echecs,
+                'lots_en_file': lots_en_file,
+                'duree': round(duree, 3),
+                'debit': round(traites / duree, 1) if duree > 0 else 0.0,
+                'erreurs': list(self.erreurs)
+            }
+
+
+class CampagneEmail:
+    """
+    Campagne d'emails personnalisés sur un segment de contacts.
+    Un thread producteur parcourt le segment et prépare les messages par lots ;
+    le consommateur les envoie sur le pool SMTP du module de communication.
+    La file entre les deux est bornée : la mémoire reste constante quelle que soit la taille du segment.
+    """
+    
+    def __init__(self, communication, sujet, corps, html=False, taille_lot=100, lots_en_file=4):
+        """
+        Initialise la campagne
+        
+        Args:
+            communication (Communication): Module d'envoi des emails
+            sujet (str): Modèle du sujet
+            corps (str): Modèle du corps du message
+            html (bool): Si True, le corps est en HTML (les champs des contacts sont échappés)
+            taille_lot (int): Nombre d'emails par lot envoyé
+            lots_en_file (int): Nombre maximal de lots préparés en attente d'envoi
+        """
+        self.communication = communication
+        self.modele_sujet = compiler_modele(sujet)
+        self.modele_corps = compiler_modele(corps)
+        self.html = html
+        self.taille_lot = max(1, int(taille_lot))
+        self.metriques = MetriquesCampagne()
+        self._file = queue.Queue(maxsize=max(1, int(lots_en_file)))
+        self._arret = threading.Event()
+        self._thread = None
+    
+    def preparer(self, contact):
+        """
+        Prépare l'email personnalisé d'un contact
+        
+        Returns:
+            dict: Message (destinataire, sujet, message, html) ou None si le contact n'a pas d'email
+        """
+        if not contact.get('email'):
+            return None
+        return {
+            'destinataire': contact['email'],
+            'sujet': personnaliser(self.modele_sujet, contact),
+            'message': personnaliser(self.modele_corps, contact, self.html),
+            'html': self.html
+        }
+    
+    def _deposer(self, element):
+        """Dépose un lot dans la file (bloque tant qu'elle est pleine, sauf arrêt demandé)"""
+        while not self._arret.is_set():
+            try:
+                self._file.put(element, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _produire(self, contacts):
+        """Thread producteur : parcours du segment et préparation des lots"""
+        lot = []
+        try:
+            for contact in contacts:
+                if self._arret.is_set():
+                    break
+                message = self.preparer(contact)
+                if message is None:
+                    self.metriques.ajouter(selectionnes=1, ignores=1)
+                    continue
+                self.metriques.ajouter(selectionnes=1)
+                lot.append(message)
+                if len(lot) >= self.taille_lot:
+                    if not self._deposer(lot):
+                        return
+                    lot = []
+            if lot:
+                self._deposer(lot)
+        except Exception as e:
+            self.metriques.ajouter_erreur(f"Lecture du segment interrompue : {e}")
+        finally:
+            # Le curseur du segment est fermé dans ce thread, celui qui l'a ouvert
+            if hasattr(contacts, 'close'):
+                contacts.close()
+            # Fin de production, même en cas d'erreur ou d'arrêt : le consommateur ne reste pas bloqué
+            # (en cas d'arrêt il vide la file sans envoyer, ce dépôt finit donc par passer)
+            self._file.put(None)
+    
+    def executer(self, contacts):
+        """
+        Déroule la campagne jusqu'au bout (ou jusqu'à l'arrêt) dans le thread appelant
+        
+        Args:
+            contacts (iterable): Contacts du segment, par exemple AddressBook.iterer_segment(...)
+        
+        Returns:
+            dict: Métriques finales de la campagne
+        """
+        self.metriques.debut = time.monotonic()
+        producteur = threading.Thread(target=self._produire, args=(contacts,),
+                                      name="campagne-producteur", daemon=True)
+        producteur.start()
+        
+        # Toute la campagne compte comme un envoi en cours : si la configuration SMTP change,
+        # le module remplacé garde ses sessions jusqu'au dernier lot
+        with self.communication.utilisation():
+            while True:
+                lot = self._file.get()
+                if lot is None:
+                    break
+                if self._arret.is_set():
+                    continue
+                try:
+                    resultats = self.communication.envoyer_emails_lot(lot)
+                except Exception as e:
+                    self.metriques.ajouter(echecs=len(lot))
+                    self.metriques.ajouter_erreur(f"Envoi du lot interrompu : {e}")
+                    self._arret.set()
+                    continue
+                for destinataire, success, msg in resultats:
+                    if success:
+                        self.metriques.ajouter(envoyes=1)
+                    else:
+                        self.metriques.ajouter(echecs=1)
+                        self.metriques.ajouter_erreur(f"{destinataire}: {msg}")
+        
+        producteur.join()
+        self.metriques.fin = time.monotonic()
+        return self.progression()
+    
+    def lancer(self, contacts):
+        """
+        Déroule la campagne dans un thread d'arrière-plan
+        
+        Returns:
+            threading.Thread: Le thread démarré
+        """
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        
+        self._thread = threading.Thread(target=self.executer, args=(contacts,),
+                                        name="campagne-email", daemon=True)
+        self._thread.start()
+        return self._thread
+    
+    def arreter(self):
+        """Interrompt la campagne après le lot en cours d'envoi"""
+        self._arret.set()
+        if self._thread:
+            self._thread.join()
+    
+    def progression(self):
+        """Retourne les métriques courantes de la campagne"""
+        return self.metriques.instantane(self._file.qsize())
@@ -1,22 +1,152 @@
 import smtplib
+import threading
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import webbrowser
 import urllib.parse
+from string import Template
+from pool_smtp import PoolSMTP
+from normalisation import normaliser_telephone
+from campagnes import compiler_modele, personnaliser
+
+# Modèles compilés une seule fois à l'import (et non reconstruits à chaque appel)
+TEMPLATES_EMAIL = {
+    "bienvenue": Template("""
+                <html>
+                    <body style="font-family: Arial, sans-serif; padding: 20px;">
+                        <h2 style="color: #667eea;">Bonjour $nom_contact !</h2>
+                        <p>Nous sommes ravis de vous compter parmi nos contacts.</p>
+                        <p>N'hésitez pas à nous contacter pour toute question.</p>
+                        <br>
+                        <p>Cordialement,</p>
+                        <p><strong>L'équipe</strong></p>
+                    </body>
+                </html>
+            """),
+    "rappel": Template("""
+                <html>
+                    <body style="font-family: Arial, sans-serif; padding: 20px;">
+                        <h2 style="color: #f39c12;">Rappel - $nom_contact</h2>
+                        <p>Ceci est un rappel concernant notre prochain rendez-vous.</p>
+                        <p>Nous vous attendons avec plaisir.</p>
+                        <br>
+                        <p>Cordialement,</p>
+                    </body>
+                </html>
+            """),
+    "invitation": Template("""
+                <html>
+                    <body style="font-family: Arial, sans-serif; padding: 20px;">
+                        <h2 style="color: #27ae60;">Invitation - $nom_contact</h2>
+                        <p>Vous êtes cordialement invité(e) à notre événement.</p>
+                        <p>Nous serions honorés de votre présence.</p>
+                        <br>
+                        <p>Cordialement,</p>
+                    </body>
+                </html>
+            """),
+}
+
 
 class Communication:
     """Classe pour gérer l'envoi d'emails et de messages WhatsApp"""
     
-    def __init__(self, email_expediteur=None, mot_de_passe_email=None):
+    SMTP_HOTE_PAR_DEFAUT = 'smtp.gmail.com'
+    SMTP_PORT_PAR_DEFAUT = 587
+    SESSIONS_SMTP_PAR_DEFAUT = 4
+    
+    def __init__(self, email_expediteur=None, mot_de_passe_email=None,
+                 smtp_host=SMTP_HOTE_PAR_DEFAUT, smtp_port=SMTP_PORT_PAR_DEFAUT, starttls=True,
+                 sessions_smtp=SESSIONS_SMTP_PAR_DEFAUT, debit_max=None):
         """
         Initialise le module de communication
         
         Args:
             email_expediteur (str): Adresse email de l'expéditeur
             mot_de_passe_email (str): Mot de passe de l'email (ou mot de passe d'application)
+            smtp_host (str): Serveur SMTP (un serveur local sans authentification peut être utilisé pour les tests)
+            smtp_port (int): Port du serveur SMTP
+            starttls (bool): Chiffrer la session avec STARTTLS
+            sessions_smtp (int): Nombre de sessions SMTP gardées ouvertes et utilisées en parallèle
+            debit_max (float): Limite d'emails par seconde vers le serveur (None = sans limite)
         """
         self.email_expediteur = email_expediteur
         self.mot_de_passe_email = mot_de_passe_email
+        self.smtp_host = smtp_host
+        self.smtp_port = int(smtp_port)
+        self.starttls = starttls
+        self.sessions_smtp = sessions_smtp
+        self.debit_max = debit_max
+        self._pool = None
+        self._verrou_pool = threading.Lock()
+        self._utilisations = 0              # envois (lots, campagnes) en cours sur ce module
+        self._fermeture_demandee = False
+    
+    @property
+    def pool(self):
+        """Pool des sessions SMTP authentifiées, créé au premier envoi réel"""
+        # Double vérification : deux threads (campagne, file de notifications) qui envoient
+        # en même temps ne créent pas chacun un pool dont l'un ne serait jamais fermé
+        if self._pool is None:
+            with self._verrou_pool:
+                if self._pool is None:
+                    self._pool = PoolSMTP(self._ouvrir_session_smtp, self.sessions_smtp, self.debit_max,
+                                          (self.smtp_host, self.smtp_port))
+        return self._pool
+    
+    def _fermer_pool(self):
+        """Ferme le pool (sous _verrou_pool) ; un envoi ultérieur en recréera un"""
+        if self._pool is not None:
+            self._pool.fermer()
+            self._pool = None
+    
+    def fermer(self):
+        """Ferme les sessions SMTP gardées ouvertes"""
+        with self._verrou_pool:
+            self._fermer_pool()
+    
+    def fermer_apres_usage(self):
+        """
+        Ferme les sessions SMTP dès qu'aucun envoi n'utilise plus ce module (tout de suite s'il est libre).
+        Appelé sur un module remplacé : les lots et campagnes en cours finissent sur leurs sessions ;
+        un envoi commencé plus tard sur ce module rouvre un pool, refermé à la fin de cet envoi.
+        """
+        with self._verrou_pool:
+            self._fermeture_demandee = True
+            if self._utilisations == 0:
+                self._fermer_pool()
+    
+    @contextmanager
+    def utilisation(self):
+        """Délimite un envoi en cours : le pool n'est pas fermé par fermer_apres_usage pendant ce bloc"""
+        with self._verrou_pool:
+            self._utilisations += 1
+        try:
+            yield self
+        finally:
+            with self._verrou_pool:
+                self._utilisations -= 1
+                if self._fermeture_demandee and self._utilisations == 0:
+                    self._fermer_pool()
+    
+    def _ouvrir_session_smtp(self):
+        """Ouvre une session SMTP authentifiée (si un mot de passe est configuré)"""
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.mot_de_passe_email and str(self.mot_de_passe_email).strip():
+            server.login(self.email_expediteur, self.mot_de_passe_email)
+        return server
+    
+    def _construire_message(self, destinataire, sujet, message, html=False):
+        """Construit le message MIME d'un email"""
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.email_expediteur
+        msg['To'] = destinataire
+        msg['Subject'] = sujet
+        msg.attach(MIMEText(message, 'html' if html else 'plain'))
+        return msg
     
     def envoyer_email(self, destinataire, sujet, message, html=False):
         """
@@ -32,11 +162,7 @@ class Communication:
         Returns:
             tuple: (success: bool, message: str)
         """
-        # Vérifie si les credentials sont configurés (non vides)
-        email_ok = self.email_expediteur and str(self.email_expediteur).strip()
-        pass_ok = self.mot_de_passe_email and str(self.mot_de_passe_email).strip()
-        
-        if not email_ok or not pass_ok:
+        if not self.email_est_configure():
             # Mode simulation : l'email est "fakement" envoyé
             print(f"\n[FAKE EMAIL - Mode Développement]")
             print(f"{'='*50}")
@@ -50,26 +176,11 @@ class Communication:
         
         try:
             # Créer le message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.email_expediteur
-            msg['To'] = destinataire
-            msg['Subject'] = sujet
-            
-            # Ajouter le corps du message
-            if html:
-                part = MIMEText(message, 'html')
-            else:
-                part = MIMEText(message, 'plain')
-            msg.attach(part)
-            
-            # Connexion au serveur SMTP Gmail
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.email_expediteur, self.mot_de_passe_email)
+            msg = self._construire_message(destinataire, sujet, message, html)
             
-            # Envoyer l'email
-            server.send_message(msg)
-            server.quit()
+            # Envoyer l'email sur une session du pool (ouverte au besoin, gardée pour les suivants)
+            with self.utilisation():
+                self.pool.envoyer_message(msg)
             
             return (True, f"Email envoyé avec succès à {destinataire} !")
             
@@ -80,9 +191,63 @@ class Communication:
         except Exception as e:
             return (False, f"Erreur lors de l'envoi : {str(e)}")
     
+    @staticmethod
+    def lien_whatsapp(numero, message=None):
+        """
+        Construit le lien wa.me d'un numéro (normalisé en E.164) avec un message pré-rempli
+        
+        Args:
+            numero (str): Numéro de téléphone (format national ou international)
+            message (str): Message à pré-remplir (optionnel)
+            
+        Returns:
+            str: Lien https://wa.me/..., None si le numéro ne contient aucun chiffre
+        """
+        numero_e164 = normaliser_telephone(numero)
+        if not numero_e164:
+            return None
+        return Communication._lien_wa_me(numero_e164, message)
+    
+    @staticmethod
+    def _lien_wa_me(numero_e164, message=None):
+        """Lien wa.me d'un numéro déjà normalisé (+212...)"""
+        url = f"https://wa.me/{numero_e164[1:]}"
+        if message:
+            url += f"?text={urllib.parse.quote(message)}"
+        return url
+    
+    @classmethod
+    def generer_liens_whatsapp(cls, contacts, modele_message):
+        """
+        Génère les liens WhatsApp personnalisés d'un segment de contacts, au fil de l'eau.
+        Le modèle accepte les mêmes variables que les campagnes email ($prenom, $nom, ...).
+        Aucun navigateur n'est ouvert : les liens sont destinés à être cliqués par l'utilisateur.
+        
+        Args:
+            contacts (iterable): Contacts, par exemple AddressBook.iterer_segment(...)
+            modele_message (str): Modèle du message
+            
+        Yields:
+            dict: nom, prenom, telephone, telephone_e164, message et lien (None si numéro invalide)
+        """
+        modele = compiler_modele(modele_message)
+        for contact in contacts:
+            # Numéro canonique stocké en base ; normalisé ici seulement s'il manque
+            numero_e164 = contact.get('telephone_canonique') or normaliser_telephone(contact['telephone'])
+            message = personnaliser(modele, contact)
+            yield {
+                'nom': contact['nom'],
+                'prenom': contact['prenom'],
+                'telephone': contact['telephone'],
+                'telephone_e164': numero_e164,
+                'message': message,
+                'lien': cls._lien_wa_me(numero_e164, message) if numero_e164 else None
+            }
+    
     def envoyer_whatsapp_web(self, numero, message):
         """
-        Ouvre WhatsApp Web avec un message pré-rempli
+        Ouvre WhatsApp Web avec un message pré-rempli, dans le navigateur du poste local
+        (application de bureau uniquement : côté serveur, utiliser lien_whatsapp)
         
         Args:
             numero (str): Numéro de téléphone (format international recommandé)
@@ -91,25 +256,13 @@ class Communication:
         Returns:
             tuple: (success: bool, message: str)
         """
+        numero_e164 = normaliser_telephone(numero)
+        if not numero_e164:
+            return (False, "Numéro de téléphone invalide.")
+        
         try:
-            # Nettoyer le numéro (enlever espaces, tirets, etc.)
-            numero_clean = ''.join(filter(str.isdigit, numero))
-            
-            # Si le numéro commence par 0, on suppose que c'est un numéro marocain
-            if numero_clean.startswith('0'):
-                numero_clean = '212' + numero_clean[1:]  # +212 pour le Maroc
-            elif not numero_clean.startswith('212') and not numero_clean.startswith('+'):
-                numero_clean = '212' + numero_clean
-            
-            # Encoder le message pour l'URL
-            message_encoded = urllib.parse.quote(message)
-            
-            # Créer l'URL WhatsApp Web
-            url = f"https://web.whatsapp.com/send?phone={numero_clean}&text={message_encoded}"
-            
-            # Ouvrir dans le navigateur
+            url = f"https://web.whatsapp.com/send?phone={numero_e164[1:]}&text={urllib.parse.quote(message)}"
             webbrowser.open(url)
-            
             return (True, f"WhatsApp Web ouvert pour {numero}. Veuillez appuyer sur Entrée pour envoyer le message.")
             
         except Exception as e:
@@ -117,7 +270,8 @@ class Communication:
     
     def envoyer_whatsapp_mobile(self, numero, message):
         """
-        Ouvre l'application WhatsApp mobile avec un message pré-rempli
+        Ouvre l'application WhatsApp avec un message pré-rempli, sur le poste local
+        (application de bureau uniquement : côté serveur, utiliser lien_whatsapp)
         
         Args:
             numero (str): Numéro de téléphone
@@ -126,23 +280,12 @@ class Communication:
         Returns:
             tuple: (success: bool, message: str)
         """
+        lien = self.lien_whatsapp(numero, message)
+        if not lien:
+            return (False, "Numéro de téléphone invalide.")
+        
         try:
-            # Nettoyer le numéro
-            numero_clean = ''.join(filter(str.isdigit, numero))
-            
-            if numero_clean.startswith('0'):
-                numero_clean = '212' + numero_clean[1:]
-            elif not numero_clean.startswith('212'):
-                numero_clean = '212' + numero_clean
-            
-            # Encoder le message
-            message_encoded = urllib.parse.quote(message)
-            
-            # URL pour mobile
-            url = f"https://api.whatsapp.com/send?phone={numero_clean}&text={message_encoded}"
-            
-            webbrowser.open(url)
-            
+            webbrowser.open(lien)
             return (True, f"WhatsApp ouvert pour {numero}.")
             
         except Exception as e:
@@ -155,10 +298,60 @@ class Communication:
         Returns:
             bool: True si les credentials SMTP sont configurés
         """
-        # Vérifie que les credentials existent et ne sont pas vides
+        # Vérifie que les credentials existent et ne sont pas vides.
+        # Un serveur autre que celui par défaut (relais local, serveur de test) peut se passer de mot de passe.
         email_ok = self.email_expediteur and str(self.email_expediteur).strip()
         pass_ok = self.mot_de_passe_email and str(self.mot_de_passe_email).strip()
-        return bool(email_ok and pass_ok)
+        relais_ok = self.smtp_host != self.SMTP_HOTE_PAR_DEFAUT
+        return bool(email_ok and (pass_ok or relais_ok))
+    
+    def envoyer_emails_lot(self, messages):
+        """
+        Envoie une liste d'emails personnalisés sur les sessions SMTP du pool, en parallèle.
+        Si une session est coupée en cours de lot, elle est rouverte et l'email renvoyé une fois.
+        Si les credentials SMTP ne sont pas configurés, simule l'envoi (mode développement).
+        
+        Args:
+            messages (list): Dicts avec les clés destinataire, sujet, message et html (optionnel)
+            
+        Returns:
+            list: Un tuple (destinataire, success: bool, message: str) par email, dans l'ordre
+        """
+        if not self.email_est_configure():
+            print(f"\n[FAKE EMAIL LOT - Mode Développement]")
+            print(f"{'='*50}")
+            for m in messages:
+                print(f"À: {m['destinataire']} | Sujet: {m['sujet']}")
+            print(f"Nombre d'emails simulés: {len(messages)}")
+            print(f"{'='*50}\n")
+            return [(m['destinataire'], True, "[SIMULATION] Email envoyé") for m in messages]
+        
+        with self.utilisation():
+            try:
+                # Une première session ouverte avant le lot : serveur injoignable ou identifiants refusés
+                # font échouer tout le lot d'un coup plutôt qu'email par email
+                self.pool.verifier()
+            except smtplib.SMTPAuthenticationError:
+                erreur = "Erreur d'authentification. Vérifiez votre email et mot de passe."
+                return [(m['destinataire'], False, erreur) for m in messages]
+            except Exception as e:
+                erreur = f"Erreur lors de l'envoi : {str(e)}"
+                return [(m['destinataire'], False, erreur) for m in messages]
+            
+            msgs = [self._construire_message(m['destinataire'], m['sujet'], m['message'], m.get('html', False))
+                    for m in messages]
+            erreurs = self.pool.envoyer(msgs)
+        
+        resultats = []
+        for m, erreur in zip(messages, erreurs):
+            if erreur is None:
+                resultats.append((m['destinataire'], True, "Email envoyé"))
+            elif isinstance(erreur, smtplib.SMTPException):
+                resultats.append((m['destinataire'], False, f"Erreur SMTP : {str(erreur)}"))
+            else:
+                resultats.append((m['destinataire'], False, f"Erreur lors de l'envoi : {str(erreur)}"))
+        
+        return resultats
     
     def envoyer_email_multiple(self, destinataires, sujet, message, html=False):
         """
@@ -188,8 +381,8 @@ class Communication:
         errors = 0
         erreurs_detail = []
         
-        for destinataire in destinataires:
-            resultat, msg = self.envoyer_email(destinataire, sujet, message, html)
+        lot = [{'destinataire': d, 'sujet': sujet, 'message': message, 'html': html} for d in destinataires]
+        for destinataire, resultat, msg in self.envoyer_emails_lot(lot):
             if resultat:
                 success += 1
             else:
@@ -210,41 +403,5 @@ class Communication:
         Returns:
             str: Template HTML
         """
-        templates = {
-            "bienvenue": f"""
-                <html>
-                    <body style="font-family: Arial, sans-serif; padding: 20px;">
-                        <h2 style="color: #667eea;">Bonjour {nom_contact} !</h2>
-                        <p>Nous sommes ravis de vous compter parmi nos contacts.</p>
-                        <p>N'hésitez pas à nous contacter pour toute question.</p>
-                        <br>
-                        <p>Cordialement,</p>
-                        <p><strong>L'équipe</strong></p>
-                    </body>
-                </html>
-            """,
-            "rappel": f"""
-                <html>
-                    <body style="font-family: Arial, sans-serif; padding: 20px;">
-                        <h2 style="color: #f39c12;">Rappel - {nom_contact}</h2>
-                        <p>Ceci est un rappel concernant notre prochain rendez-vous.</p>
-                        <p>Nous vous attendons avec plaisir.</p>
-                        <br>
-                        <p>Cordialement,</p>
-                    </body>
-                </html>
-            """,
-            "invitation": f"""
-                <html>
-                    <body style="font-family: Arial, sans-serif; padding: 20px;">
-                        <h2 style="color: #27ae60;">Invitation - {nom_contact}</h2>
-                        <p>Vous êtes cordialement invité(e) à notre événement.</p>
-                        <p>Nous serions honorés de votre présence.</p>
-                        <br>
-                        <p>Cordialement,</p>
-                    </body>
-                </html>
-            """
-        }
-        
-        return templates.get(type_message, templates["bienvenue"])
\ No newline at end of file
+        modele = TEMPLATES_EMAIL.get(type_message, TEMPLATES_EMAIL["bienvenue"])
+        return modele.substitute(nom_contact=nom_contact)
@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+from migrations import assurer_schema
+from versions import CompteursModifications
+
+
+def _booleen(valeur):
+    """Convertit une valeur stockée en texte ('1', 'true', 'oui', ...) en booléen"""
+    return str(valeur).strip().lower() in ('1', 'true', 'on', 'oui')
+
+
+class ConfigurationPolyclinique:
+    """
+    Classe gérant la configuration stockée dans la table config.
+    Les valeurs sont gardées en mémoire et typées ; le cache est rechargé quand le compteur
+    de modifications 'config' a bougé (écriture de ce processus ou d'un autre worker).
+    """
+    
+    # Clé -> (type, valeur par défaut)
+    PARAMETRES = {
+        'email_expediteur': (str, None),
+        'email_password': (str, None),
+        'smtp_host': (str, 'smtp.gmail.com'),
+        'smtp_port': (int, 587),
+        'smtp_starttls': (_booleen, True),
+        'smtp_sessions': (int, 4),
+        'smtp_debit_max': (float, None),
+    }
+    
+    def __init__(self, db_name="polyclinique.db"):
+        """
+        Initialise la configuration et charge les valeurs en mémoire
+        
+        Args:
+            db_name (str): Nom de la base de données
+        """
+        self.db_name = db_name
+        self.valeurs = {}
+        self.version_chargee = None
+        self._verrou = threading.Lock()
+        assurer_schema(self.db_name)
+        self.charger()
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def charger(self):
+        """Charge toute la table config en une requête"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        # Version lue avant les lignes : une écriture concurrente provoquera un nouveau chargement
+        version = CompteursModifications.lire_version(cursor, CompteursModifications.CLE_CONFIG)
+        cursor.execute("SELECT key, value FROM config")
+        valeurs = dict(cursor.fetchall())
+        conn.close()
+        
+        with self._verrou:
+            self.valeurs = valeurs
+            self.version_chargee = version
+    
+    def rafraichir_si_modifie(self, version=None):
+        """
+        Recharge la configuration si elle a été modifiée depuis le dernier chargement
+        
+        Args:
+            version (int, optional): Version courante déjà lue ; lue en base sinon
+        
+        Returns:
+            bool: True si la configuration a été rechargée
+        """
+        if version is None:
+            conn = self.creer_connexion()
+            version = CompteursModifications.lire_version(conn.cursor(), CompteursModifications.CLE_CONFIG)
+            conn.close()
+        
+        if version == self.version_chargee:
+            return False
+        self.charger()
+        return True
+    
+    def obtenir(self, cle):
+        """
+        Retourne la valeur typée d'un paramètre (valeur par défaut s'il n'est pas enregistré)
+        
+        Args:
+            cle (str): Nom du paramètre
+        
+        Returns:
+            La valeur convertie selon PARAMETRES ; le texte brut pour une clé non déclarée
+        """
+        conversion, defaut = self.PARAMETRES.get(cle, (str, None))
+        valeur = self.valeurs.get(cle)
+        if valeur is None or valeur == '':
+            return defaut
+        try:
+            return conversion(valeur)
+        except (TypeError, ValueError):
+            return defaut
+    
+    def definir(self, valeurs):
+        """
+        Enregistre plusieurs paramètres dans une transaction, puis recharge le cache
+        (les triggers incrémentent le compteur : les autres workers rechargeront aussi)
+        
+        Args:
+            valeurs (dict): {cle: valeur} ; None supprime le paramètre
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        for cle, valeur in valeurs.items():
+            if valeur is None:
+                cursor.execute("DELETE FROM config WHERE key = ?", (cle,))
+            else:
+                if isinstance(valeur, bool):
+                    valeur = '1' if valeur else '0'
+                cursor.execute("""
+                    INSERT INTO config (key, value) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                """, (cle, str(valeur)))
+        conn.commit()
+        conn.close()
+        
+        self.charger()
+    
+    def config_email(self):
+        """
+        Retourne les identifiants d'envoi des emails
+        
+        Returns:
+            tuple: (email_expediteur, mot_de_passe) ; None pour une valeur absente
+        """
+        return (self.obtenir('email_expediteur'), self.obtenir('email_password'))
+    
+    def parametres_communication(self):
+        """
+        Retourne les arguments du module Communication
+        
+        Returns:
+            tuple: (email_expediteur, mot_de_passe, smtp_host, smtp_port, starttls, sessions_smtp, debit_max)
+        """
+        return self.config_email() + (
+            self.obtenir('smtp_host'), self.obtenir('smtp_port'), self.obtenir('smtp_starttls'),
+            self.obtenir('smtp_sessions'), self.obtenir('smtp_debit_max')
+        )
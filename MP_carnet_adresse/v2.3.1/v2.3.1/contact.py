@@ -1,7 +1,9 @@
+from normalisation import normaliser_telephone, normaliser_texte, chiffres_telephone
+
 class Contact:
     """Classe représentant un contact avec nom, prénom, email, téléphone et informations supplémentaires"""
     
-    def __init__(self, nom, prenom, email, telephone, adresse="", fonction="", entreprise="", categorie="Personnel"):
+    def __init__(self, nom, prenom, email, telephone, adresse="", fonction="", entreprise="", categorie="Personnel", id=None):
         """
         Initialise un nouveau contact
         
@@ -14,13 +16,25 @@ class Contact:
             fonction (str): Fonction/poste (optionnel)
             entreprise (str): Nom de l'entreprise (optionnel)
             categorie (str): Catégorie du contact (Personnel, Entreprise, Client, Fournisseur)
+            id (int, optional): Identifiant en base (None tant que le contact n'est pas enregistré)
         """
+        self.id = id
+        
         # MODIFICATION PROF : Convertir nom et prénom en MAJUSCULES
         self.nom = nom.upper()
         self.prenom = prenom.upper()
         
         self.email = email
         self.telephone = telephone
+        # Numéro E.164 (+212...) : clé de recherche et de dédoublonnage, lien WhatsApp
+        self.telephone_canonique = normaliser_telephone(telephone)
+        # Chiffres du numéro (saisi et international) : recherche d'une suite de chiffres n'importe où
+        self.chiffres_telephone = chiffres_telephone(telephone)
+        
+        # Clés sans accents ni casse, calculées une fois : tri et recherche sans conversion à chaque requête
+        self.cle_nom = normaliser_texte(self.nom)
+        self.cle_prenom = normaliser_texte(self.prenom)
+        self.cle_recherche = f"{self.cle_nom} {self.cle_prenom}\n{normaliser_texte(email)}"
         
         # Nouveaux champs pour Partie 8
         self.adresse = adresse
@@ -0,0 +1,333 @@
+"""
+Détection des contacts en double (même patient saisi deux fois avec des variantes).
+
+La base ne refuse que les doublons exacts d'email et de téléphone : "EL ALAOUI MOHAMED" et
+"ALAOUI MOHAMED" avec deux emails différents passent. Pour ne pas comparer chaque contact
+à tous les autres, les contacts sont rangés dans des blocs (code phonétique de chaque mot
+du nom avec le début du prénom, fin du numéro, partie locale de l'email) : seuls les contacts d'un même bloc sont comparés.
+
+Usage : python doublons.py [--db polyclinique.db] [--seuil 0.7]
+"""
+import argparse
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from normalisation import normaliser_telephone
+
+# Particules ignorées dans les noms ("EL ALAOUI" et "ALAOUI" ont le même bloc)
+PARTICULES = {
+    'EL', 'AL', 'BEN', 'BENT', 'BEL', 'BOU', 'ABOU', 'AIT', 'OULD', 'IBN',
+    'DE', 'DU', 'DES', 'LE', 'LA', 'LES', 'D', 'L', 'VAN', 'VON', 'DA', 'DOS'
+}
+
+# Remplacements phonétiques appliqués dans l'ordre (graphies françaises et transcriptions de l'arabe)
+REMPLACEMENTS_PHONETIQUES = [
+    ('OU', 'U'), ('PH', 'F'), ('CH', 'S'), ('SH', 'S'), ('KH', 'K'), ('GH', 'G'),
+    ('QU', 'K'), ('CK', 'K'), ('Q', 'K'), ('C', 'K'), ('Z', 'S'), ('W', 'V'),
+    ('Y', 'I'), ('H', ''),
+]
+
+LONGUEUR_SUFFIXE_TELEPHONE = 6
+
+
+def sans_accents(texte):
+    """Retire les accents et met en majuscules ('Éloïse' -> 'ELOISE')"""
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).upper()
+
+
+def mots_du_nom(nom):
+    """
+    Mots significatifs d'un nom, sans les particules
+    
+    Returns:
+        list: Mots en majuscules sans accents ("EL-ALAOUI" -> ['ALAOUI'])
+    """
+    mots = re.split(r"[^A-Z0-9]+", sans_accents(nom))
+    significatifs = [m for m in mots if m and m not in PARTICULES]
+    # Un nom fait uniquement de particules ("DE LA") est gardé tel quel
+    return significatifs or [m for m in mots if m]
+
+
+def code_phonetique(mot):
+    """
+    Code phonétique d'un mot : les graphies proches ont le même code
+    ("ALAOUI" / "ALAOUY", "CHRAIBI" / "CHRAYBI", "FILALI" / "PHILALI")
+    
+    Returns:
+        str: Première lettre puis consonnes sans répétition (4 caractères au plus)
+    """
+    mot = ''.join(c for c in sans_accents(mot) if c.isalpha())
+    if not mot:
+        return ''
+    for graphie, son in REMPLACEMENTS_PHONETIQUES:
+        mot = mot.replace(graphie, son)
+    if not mot:
+        return ''
+    
+    code = mot[0]
+    for c in mot[1:]:
+        if c in 'AEIOU' or c == code[-1]:
+            continue
+        code += c
+    # Consonnes finales muettes en français
+    if len(code) > 2 and code[-1] in 'STX':
+        code = code[:-1]
+    return code[:4]
+
+
+def partie_locale_email(email):
+    """
+    Partie locale d'un email sans ponctuation, chiffres ni extension '+...'
+    ("M.Alaoui+rdv@gmail.com" et "malaoui85@yahoo.fr" -> 'malaoui')
+    """
+    locale = (email or '').strip().lower().split('@')[0].split('+')[0]
+    return re.sub(r'[^a-z]', '', sans_accents(locale).lower())
+
+
+def similarite(a, b):
+    """Similarité de deux textes entre 0 et 1"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class DetecteurDoublons:
+    """
+    Index des contacts par blocs, pour proposer des fusions.
+    L'index est construit une fois depuis le carnet ; la vérification d'un nouveau contact
+    ne compare que les quelques contacts de ses blocs (une fraction de milliseconde).
+    """
+    
+    SEUIL = 0.7
+    # Un bloc plus grand est trop peu discriminant : il est ignoré (les autres clés du contact restent)
+    TAILLE_BLOC_MAX = 200
+    CHAMPS_COMPLEMENTAIRES = ('adresse', 'fonction', 'entreprise')
+    
+    def __init__(self, contacts=()):
+        """
+        Initialise l'index
+        
+        Args:
+            contacts (iterable): Contacts du carnet (objets Contact avec leur id)
+        """
+        self.fiches = {}
+        self.blocs = defaultdict(set)
+        for contact in contacts:
+            self.indexer(contact)
+    
+    @staticmethod
+    def empreinte(contact):
+        """Champs dont dépend la fiche d'un contact"""
+        return (contact.nom, contact.prenom, contact.email, contact.telephone,
+                getattr(contact, 'telephone_canonique', None))
+    
+    @staticmethod
+    def preparer(contact):
+        """
+        Calcule une fois les valeurs comparées d'un contact
+        
+        Returns:
+            dict: Fiche (contact, empreinte, nom, prenom, telephone, email, cles)
+        """
+        mots = mots_du_nom(contact.nom)
+        telephone = getattr(contact, 'telephone_canonique', None) or normaliser_telephone(contact.telephone)
+        email = partie_locale_email(contact.email)
+        
+        # Nom seul trop courant (ALAOUI, BENNANI...) : le bloc est affiné par le début du prénom
+        prenoms = mots_du_nom(contact.prenom)
+        initiale = code_phonetique(prenoms[0])[:2] if prenoms else ''
+        cles = {f'nom:{code}/{initiale}' for code in map(code_phonetique, mots) if code}
+        if len(telephone) > LONGUEUR_SUFFIXE_TELEPHONE:
+            cles.add('tel:' + telephone[-LONGUEUR_SUFFIXE_TELEPHONE:])
+        if len(email) >= 3:
+            cles.add('email:' + email)
+        
+        return {
+            'contact': contact,
+            'empreinte': DetecteurDoublons.empreinte(contact),
+            'nom': ' '.join(mots),
+            'prenom': ' '.join(prenoms),
+            'telephone': telephone,
+            'email': email,
+            'cles': cles
+        }
+    
+    def indexer(self, contact):
+        """Ajoute (ou remplace) un contact dans l'index"""
+        if contact.id in self.fiches:
+            self.retirer(contact.id)
+        fiche = self.preparer(contact)
+        self.fiches[contact.id] = fiche
+        for cle in fiche['cles']:
+            self.blocs[cle].add(contact.id)
+    
+    def retirer(self, contact_id):
+        """Retire un contact de l'index"""
+        fiche = self.fiches.pop(contact_id, None)
+        if fiche is None:
+            return
+        for cle in fiche['cles']:
+            self.blocs[cle].discard(contact_id)
+            if not self.blocs[cle]:
+                del self.blocs[cle]
+    
+    def synchroniser(self, contacts):
+        """
+        Met l'index à jour après un rechargement du carnet : seuls les contacts ajoutés,
+        modifiés ou supprimés sont recalculés
+        
+        Args:
+            contacts (iterable): Contacts rechargés (objets Contact avec leur id)
+        """
+        presents = set()
+        for contact in contacts:
+            presents.add(contact.id)
+            fiche = self.fiches.get(contact.id)
+            if fiche is not None and fiche['empreinte'] == self.empreinte(contact):
+                fiche['contact'] = contact
+            else:
+                self.indexer(contact)
+        for contact_id in self.fiches.keys() - presents:
+            self.retirer(contact_id)
+    
+    @staticmethod
+    def comparer(fiche_a, fiche_b):
+        """
+        Score de ressemblance de deux fiches
+        
+        Returns:
+            tuple: (score entre 0 et 1, liste des champs concordants)
+        """
+        score_nom = similarite(fiche_a['nom'], fiche_b['nom'])
+        score_prenom = similarite(fiche_a['prenom'], fiche_b['prenom'])
+        
+        tel_a, tel_b = fiche_a['telephone'], fiche_b['telephone']
+        if tel_a and tel_a == tel_b:
+            score_tel = 1.0
+        elif tel_a and tel_b and tel_a[-LONGUEUR_SUFFIXE_TELEPHONE:] == tel_b[-LONGUEUR_SUFFIXE_TELEPHONE:]:
+            score_tel = 0.8
+        else:
+            score_tel = 0.0
+        score_email = 1.0 if fiche_a['email'] and fiche_a['email'] == fiche_b['email'] else 0.0
+        
+        score = 0.45 * score_nom + 0.30 * score_prenom + 0.15 * score_tel + 0.10 * score_email
+        raisons = [champ for champ, valeur in (('nom', score_nom), ('prenom', score_prenom),
+                                               ('telephone', score_tel), ('email', score_email))
+                   if valeur >= 0.8]
+        return round(score, 3), raisons
+    
+    def suggestion(self, fiche_a, fiche_b, score, raisons):
+        """
+        Suggestion de fusion : le contact le plus ancien est conservé et complété par l'autre
+        
+        Returns:
+            dict: score, raisons, conserver, fusionner, completer {champ: valeur}
+        """
+        a, b = fiche_a['contact'], fiche_b['contact']
+        # Un contact pas encore enregistré (id None) n'est jamais celui conservé
+        if a.id is None or (b.id is not None and b.id < a.id):
+            a, b = b, a
+        return {
+            'score': score,
+            'raisons': raisons,
+            'conserver': a,
+            'fusionner': b,
+            'completer': {champ: getattr(b, champ) for champ in self.CHAMPS_COMPLEMENTAIRES
+                          if getattr(b, champ) and not getattr(a, champ)}
+        }
+    
+    def verifier(self, contact, seuil=None):
+        """
+        Cherche les doublons probables d'un contact (nouveau ou déjà indexé)
+        
+        Args:
+            contact (Contact): Contact à vérifier
+            seuil (float, optional): Score minimal (SEUIL par défaut)
+        
+        Returns:
+            list: Suggestions de fusion, de la plus probable à la moins probable
+        """
+        seuil = self.SEUIL if seuil is None else seuil
+        fiche = self.preparer(contact)
+        
+        candidats = set()
+        for cle in fiche['cles']:
+            membres = self.blocs.get(cle, ())
+            if len(membres) <= self.TAILLE_BLOC_MAX:
+                candidats.update(membres)
+        candidats.discard(contact.id)
+        
+        suggestions = []
+        for candidat in candidats:
+            autre = self.fiches[candidat]
+            score, raisons = self.comparer(fiche, autre)
+            if score >= seuil:
+                suggestions.append(self.suggestion(fiche, autre, score, raisons))
+        suggestions.sort(key=lambda s: s['score'], reverse=True)
+        return suggestions
+    
+    def detecter(self, seuil=None):
+        """
+        Parcourt tout l'index et compare les contacts de chaque bloc deux à deux
+        (chaque paire n'est évaluée qu'une fois, même si elle partage plusieurs blocs)
+        
+        Args:
+            seuil (float, optional): Score minimal (SEUIL par défaut)
+        
+        Returns:
+            list: Suggestions de fusion, de la plus probable à la moins probable
+        """
+        seuil = self.SEUIL if seuil is None else seuil
+        paires_vues = set()
+        suggestions = []
+        
+        for membres in self.blocs.values():
+            if len(membres) < 2 or len(membres) > self.TAILLE_BLOC_MAX:
+                continue
+            membres = sorted(membres)
+            for i, id_a in enumerate(membres):
+                for id_b in membres[i + 1:]:
+                    if (id_a, id_b) in paires_vues:
+                        continue
+                    paires_vues.add((id_a, id_b))
+                    fiche_a, fiche_b = self.fiches[id_a], self.fiches[id_b]
+                    score, raisons = self.comparer(fiche_a, fiche_b)
+                    if score >= seuil:
+                        suggestions.append(self.suggestion(fiche_a, fiche_b, score, raisons))
+        
+        suggestions.sort(key=lambda s: s['score'], reverse=True)
+        return suggestions
+
+
+def rapport(suggestions):
+    """Met en forme les suggestions de fusion pour l'affichage"""
+    if not suggestions:
+        return "✓ Aucun doublon probable."
+    
+    lignes = [f"{len(suggestions)} doublon(s) probable(s) :"]
+    for s in suggestions:
+        a, b = s['conserver'], s['fusionner']
+        lignes.append(f"  [{s['score']:.2f}] conserver #{a.id} {a.get_nom_complet()} <{a.email}> {a.telephone}")
+        lignes.append(f"         fusionner #{b.id} {b.get_nom_complet()} <{b.email}> {b.telephone}")
+        lignes.append(f"         concordances : {', '.join(s['raisons']) or '-'}")
+        if s['completer']:
+            complements = ', '.join(f"{champ}={valeur}" for champ, valeur in s['completer'].items())
+            lignes.append(f"         à reprendre : {complements}")
+    return '\n'.join(lignes)
+
+
+if __name__ == '__main__':
+    from address_book import AddressBook
+    
+    parser = argparse.ArgumentParser(description="Détection des contacts en double")
+    parser.add_argument('--db', default="polyclinique.db", help="Base de données")
+    parser.add_argument('--seuil', type=float, default=DetecteurDoublons.SEUIL, help="Score minimal (0 à 1)")
+    args = parser.parse_args()
+    
+    carnet = AddressBook(args.db)
+    print(rapport(carnet.doublons.detecter(args.seuil)))
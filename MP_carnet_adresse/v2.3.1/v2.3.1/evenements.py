@@ -0,0 +1,73 @@
+import json
+import queue
+import threading
+
+class BusEvenements:
+    """Classe de publication/abonnement en mémoire pour diffuser les changements d'agenda en direct"""
+    
+    CRENEAU_PRIS = "creneau_pris"
+    CRENEAU_LIBERE = "creneau_libere"
+    RDV_EN_ATTENTE = "rdv_en_attente"
+    RDV_TRAITE = "rdv_traite"
+    
+    def __init__(self, taille_file=100):
+        """
+        Initialise le bus d'événements
+        
+        Args:
+            taille_file (int): Nombre maximal d'événements gardés pour un client lent
+        """
+        self.taille_file = taille_file
+        self._abonnes = set()
+        self._verrou = threading.Lock()
+    
+    def abonner(self):
+        """
+        Inscrit un nouveau client
+        
+        Returns:
+            queue.Queue: File bornée dans laquelle le client lit ses événements
+        """
+        file = queue.Queue(maxsize=self.taille_file)
+        with self._verrou:
+            self._abonnes.add(file)
+        return file
+    
+    def desabonner(self, file):
+        """Retire un client (connexion fermée)"""
+        with self._verrou:
+            self._abonnes.discard(file)
+    
+    def nombre_abonnes(self):
+        """Retourne le nombre de clients connectés"""
+        with self._verrou:
+            return len(self._abonnes)
+    
+    def publier(self, type_evenement, donnees):
+        """
+        Diffuse un événement à tous les clients sans jamais bloquer l'appelant.
+        Si la file d'un client est pleine, son plus ancien événement est abandonné.
+        
+        Args:
+            type_evenement (str): Type de l'événement (creneau_pris, creneau_libere, ...)
+            donnees (dict): Contenu de l'événement
+        """
+        evenement = (type_evenement, donnees)
+        with self._verrou:
+            abonnes = list(self._abonnes)
+        
+        for file in abonnes:
+            while True:
+                try:
+                    file.put_nowait(evenement)
+                    break
+                except queue.Full:
+                    try:
+                        file.get_nowait()
+                    except queue.Empty:
+                        pass
+    
+    @staticmethod
+    def formater_sse(type_evenement, donnees):
+        """Formate un événement au format text/event-stream"""
+        return f"event: {type_evenement}\ndata: {json.dumps(donnees, ensure_ascii=False)}\n\n"
@@ -0,0 +1,364 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from migrations import assurer_schema
+from versions import CompteursModifications
+
+class HorairesServices:
+    """
+    Classe gérant les horaires hebdomadaires, les pauses et les fermetures des services.
+    Les horaires sont compilés en un calendrier {(service, date): créneaux} précalculé :
+    la prise de rendez-vous le consulte sans accès à la base.
+    """
+    
+    JOURS_SEMAINE = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+    DUREE_CRENEAU = 30       # minutes
+    HORIZON_JOURS = 120      # jours précalculés à partir d'aujourd'hui
+    
+    def __init__(self, db_name="polyclinique.db"):
+        """
+        Initialise les horaires et compile le calendrier
+        
+        Args:
+            db_name (str): Nom de la base de données
+        """
+        self.db_name = db_name
+        self.version_chargee = None
+        self._verrou = threading.Lock()
+        assurer_schema(self.db_name)
+        self.compiler()
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    # ==================== CRÉNEAUX ====================
+    
+    @staticmethod
+    def decouper(horaire_debut, horaire_fin, duree_minutes=DUREE_CRENEAU):
+        """
+        Découpe une plage d'ouverture en créneaux
+        
+        Returns:
+            list: Liste des créneaux [(heure_debut, heure_fin), ...]
+        """
+        creneaux = []
+        
+        debut = datetime.strptime(horaire_debut, "%H:%M")
+        fin = datetime.strptime(horaire_fin, "%H:%M")
+        
+        current = debut
+        while current < fin:
+            heure_debut = current.strftime("%H:%M")
+            current += timedelta(minutes=duree_minutes)
+            heure_fin = current.strftime("%H:%M")
+            
+            if current <= fin:
+                creneaux.append((heure_debut, heure_fin))
+        
+        return creneaux
+    
+    @staticmethod
+    def analyser_plages(texte):
+        """
+        Lit des plages d'ouverture saisies sous la forme "08:00-12:00, 14:00-18:00"
+        
+        Returns:
+            list: [(heure_debut, heure_fin), ...] ; vide si le texte est vide (jour fermé)
+        
+        Raises:
+            ValueError: Si une plage est mal formée
+        """
+        plages = []
+        for morceau in (texte or '').replace(';', ',').split(','):
+            morceau = morceau.strip()
+            if not morceau:
+                continue
+            debut, separateur, fin = morceau.partition('-')
+            if not separateur:
+                raise ValueError(f"Plage invalide : « {morceau} » (format attendu 08:00-12:00)")
+            plages.append((debut.strip(), fin.strip()))
+        return plages
+    
+    @staticmethod
+    def _valider_plages(plages):
+        """Vérifie le format, l'ordre et l'absence de chevauchement des plages d'une journée"""
+        triees = []
+        for debut, fin in plages:
+            try:
+                datetime.strptime(debut, "%H:%M")
+                datetime.strptime(fin, "%H:%M")
+            except ValueError:
+                raise ValueError(f"Heure invalide dans la plage {debut}-{fin} (format HH:MM)")
+            if debut >= fin:
+                raise ValueError(f"La plage {debut}-{fin} se termine avant de commencer")
+            triees.append((debut, fin))
+        
+        triees.sort()
+        for (_, fin_precedente), (debut, _) in zip(triees, triees[1:]):
+            if debut < fin_precedente:
+                raise ValueError(f"Les plages se chevauchent autour de {debut}")
+        return triees
+    
+    # ==================== COMPILATION DU CALENDRIER ====================
+    
+    def compiler(self):
+        """Recharge horaires et fermetures en trois requêtes et précalcule le calendrier"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        # Version lue avant les lignes : une écriture concurrente provoquera une nouvelle compilation
+        version = CompteursModifications.lire_version(cursor, CompteursModifications.CLE_HORAIRES)
+        
+        cursor.execute("SELECT id, horaire_debut, horaire_fin FROM services")
+        horaires_par_defaut = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        
+        cursor.execute("""
+            SELECT service_id, jour_semaine, heure_debut, heure_fin FROM horaires_services
+            ORDER BY service_id, jour_semaine, heure_debut
+        """)
+        semaines = {}
+        for service_id, jour, debut, fin in cursor.fetchall():
+            semaines.setdefault(service_id, {j: [] for j in range(7)})[jour].append((debut, fin))
+        
+        cursor.execute("""
+            SELECT id, service_id, date_debut, date_fin, motif FROM fermetures_services
+            ORDER BY date_debut
+        """)
+        fermetures = [{'id': row[0], 'service_id': row[1], 'date_debut': row[2],
+                       'date_fin': row[3], 'motif': row[4]} for row in cursor.fetchall()]
+        conn.close()
+        
+        # Un modèle de créneaux par jour de la semaine ; sans horaires hebdomadaires,
+        # le service est ouvert tous les jours sur sa plage horaire_debut - horaire_fin
+        modeles = {}
+        for service_id, (debut, fin) in horaires_par_defaut.items():
+            semaine = semaines.get(service_id) or {j: [(debut, fin)] for j in range(7)}
+            modeles[service_id] = tuple(self._modele_jour(semaine[j]) for j in range(7))
+        
+        with self._verrou:
+            self._semaines = semaines
+            self._horaires_par_defaut = horaires_par_defaut
+            self._fermetures = fermetures
+            self._modeles = modeles
+            
+            aujourd_hui = datetime.now().date()
+            calendrier = {}
+            for decalage in range(self.HORIZON_JOURS):
+                jour = aujourd_hui + timedelta(days=decalage)
+                date_str = jour.strftime("%Y-%m-%d")
+                for service_id in modeles:
+                    calendrier[(service_id, date_str)] = self._calculer(service_id, date_str, jour.weekday())
+            
+            self._calendrier = calendrier
+            self._date_compilation = aujourd_hui
+            self.version_chargee = version
+    
+    def _modele_jour(self, plages):
+        """Créneaux d'une journée et ensemble de leurs heures de début"""
+        creneaux = tuple(c for debut, fin in plages for c in self.decouper(debut, fin, self.DUREE_CRENEAU))
+        return (creneaux, frozenset(debut for debut, _ in creneaux))
+    
+    def _calculer(self, service_id, date_str, jour_semaine):
+        """Journée d'un service : fermée, ou le modèle de son jour de la semaine"""
+        for fermeture in self._fermetures:
+            if fermeture['service_id'] in (None, service_id) and \
+                    fermeture['date_debut'] <= date_str <= (fermeture['date_fin'] or fermeture['date_debut']):
+                return ((), frozenset())
+        return self._modeles[service_id][jour_semaine]
+    
+    def _journee(self, service_id, date_str):
+        """Entrée du calendrier ; hors de l'horizon, calculée depuis les modèles (sans base)"""
+        try:
+            service_id = int(service_id)
+        except (TypeError, ValueError):
+            return ((), frozenset())
+        
+        journee = self._calendrier.get((service_id, date_str))
+        if journee is not None:
+            return journee
+        
+        # Service inconnu : créé par un autre processus depuis la dernière compilation ?
+        if service_id not in self._modeles:
+            self.rafraichir_si_modifie()
+            if service_id not in self._modeles:
+                return ((), frozenset())
+        try:
+            jour_semaine = datetime.strptime(date_str, "%Y-%m-%d").weekday()
+        except (TypeError, ValueError):
+            return ((), frozenset())
+        return self._calculer(service_id, date_str, jour_semaine)
+    
+    def creneaux_du_jour(self, service_id, date_str):
+        """
+        Créneaux ouverts d'un service pour une date (vide si fermé)
+        
+        Args:
+            service_id (int): ID du service
+            date_str (str): Date (YYYY-MM-DD)
+        
+        Returns:
+            list: Liste des créneaux [(heure_debut, heure_fin), ...]
+        """
+        return list(self._journee(service_id, date_str)[0])
+    
+    def est_ouvert(self, service_id, date_str, heure_debut):
+        """Indique si un créneau commençant à heure_debut existe ce jour-là"""
+        return heure_debut in self._journee(service_id, date_str)[1]
+    
+    def rafraichir_si_modifie(self, version=None):
+        """
+        Recompile le calendrier si les horaires ont été modifiés depuis la dernière compilation
+        (par ce processus, un autre worker ou l'agenda Tkinter), ou si la date a changé
+        
+        Args:
+            version (int, optional): Version courante déjà lue ; lue en base sinon
+        
+        Returns:
+            bool: True si le calendrier a été recompilé
+        """
+        if version is None:
+            conn = self.creer_connexion()
+            version = CompteursModifications.lire_version(conn.cursor(), CompteursModifications.CLE_HORAIRES)
+            conn.close()
+        
+        if version == self.version_chargee and self._date_compilation == datetime.now().date():
+            return False
+        self.compiler()
+        return True
+    
+    # ==================== HORAIRES HEBDOMADAIRES ====================
+    
+    def obtenir_horaires_semaine(self, service_id):
+        """
+        Retourne les plages d'ouverture de chaque jour de la semaine
+        
+        Returns:
+            dict: {jour_semaine (0 = lundi): [(heure_debut, heure_fin), ...]} ; un jour sans plage est fermé
+        """
+        semaine = self._semaines.get(service_id)
+        if semaine:
+            return {jour: list(plages) for jour, plages in semaine.items()}
+        
+        defaut = self._horaires_par_defaut.get(service_id)
+        return {jour: [defaut] if defaut else [] for jour in range(7)}
+    
+    def a_horaires_hebdomadaires(self, service_id):
+        """Indique si le service a des horaires par jour (sinon sa plage unique s'applique tous les jours)"""
+        return service_id in self._semaines
+    
+    def definir_horaires_semaine(self, service_id, horaires):
+        """
+        Remplace les horaires hebdomadaires d'un service. Les pauses sont les intervalles
+        entre deux plages d'une même journée ; un jour sans plage est fermé.
+        
+        Args:
+            service_id (int): ID du service
+            horaires (dict): {jour_semaine (0 = lundi): [(heure_debut, heure_fin), ...]} ;
+                             un dictionnaire vide revient à la plage unique du service
+        
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        try:
+            lignes = []
+            for jour, plages in horaires.items():
+                jour = int(jour)
+                if not 0 <= jour <= 6:
+                    raise ValueError(f"Jour de la semaine invalide : {jour}")
+                for debut, fin in self._valider_plages(plages):
+                    lignes.append((service_id, jour, debut, fin))
+        except ValueError as e:
+            return (False, f"✗ {e}")
+        
+        if horaires and not lignes:
+            return (False, "✗ Le service doit être ouvert au moins un jour par semaine.")
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("DELETE FROM horaires_services WHERE service_id = ?", (service_id,))
+            cursor.executemany("""
+                INSERT INTO horaires_services (service_id, jour_semaine, heure_debut, heure_fin)
+                VALUES (?, ?, ?, ?)
+            """, lignes)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return (False, f"✗ Erreur : {e}")
+        finally:
+            conn.close()
+        
+        self.compiler()
+        if not lignes:
+            return (True, "✓ Horaires hebdomadaires supprimés : la plage unique du service s'applique tous les jours.")
+        return (True, "✓ Horaires hebdomadaires enregistrés.")
+    
+    # ==================== FERMETURES ====================
+    
+    def obtenir_fermetures(self, service_id=None, depuis=None):
+        """
+        Retourne les fermetures (jours fériés, congés, travaux...)
+        
+        Args:
+            service_id (int, optional): Fermetures de ce service et de toute la polyclinique
+            depuis (str, optional): Ignorer les fermetures terminées avant cette date (YYYY-MM-DD)
+        
+        Returns:
+            list: Liste de dictionnaires (service_id None = toute la polyclinique)
+        """
+        return [f for f in self._fermetures
+                if (service_id is None or f['service_id'] in (None, service_id))
+                and (depuis is None or (f['date_fin'] or f['date_debut']) >= depuis)]
+    
+    def ajouter_fermeture(self, service_id, date_debut, date_fin=None, motif=""):
+        """
+        Ferme un service (ou toute la polyclinique) sur une date ou une période
+        
+        Args:
+            service_id (int or None): ID du service, None pour toute la polyclinique
+            date_debut (str): Premier jour fermé (YYYY-MM-DD)
+            date_fin (str, optional): Dernier jour fermé, inclus (YYYY-MM-DD)
+            motif (str): Motif affiché (ex: Aïd, inventaire)
+        
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        try:
+            datetime.strptime(date_debut, "%Y-%m-%d")
+            if date_fin:
+                datetime.strptime(date_fin, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            return (False, "✗ Date invalide (format AAAA-MM-JJ).")
+        
+        if date_fin and date_fin < date_debut:
+            return (False, "✗ La fin de la fermeture précède son début.")
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO fermetures_services (service_id, date_debut, date_fin, motif)
+            VALUES (?, ?, ?, ?)
+        """, (service_id, date_debut, date_fin or None, motif))
+        conn.commit()
+        conn.close()
+        
+        self.compiler()
+        return (True, "✓ Fermeture enregistrée.")
+    
+    def supprimer_fermeture(self, fermeture_id):
+        """Supprime une fermeture"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM fermetures_services WHERE id = ?", (fermeture_id,))
+        supprimee = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        if supprimee:
+            self.compiler()
+        return supprimee
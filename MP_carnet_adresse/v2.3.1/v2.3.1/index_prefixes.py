@@ -0,0 +1,135 @@
+"""
+Index de préfixes pour la saisie semi-automatique des contacts.
+
+Chaque contact est rangé sous plusieurs clés normalisées (nom, prénom, "nom prénom",
+"prénom nom", email, téléphone E.164) dans un tableau trié : les contacts dont une clé
+commence par le texte saisi forment une plage contiguë, trouvée par recherche dichotomique.
+Après un rechargement du carnet, seules les entrées des contacts modifiés sont déplacées.
+"""
+import re
+from bisect import bisect_left, insort
+
+from normalisation import normaliser_telephone, normaliser_debut_telephone, normaliser_texte
+
+# Saisie d'un début de numéro : chiffres avec espaces, tirets, points, parenthèses ou +
+RE_DEBUT_TELEPHONE = re.compile(r'[+(]?(?:\d[\s.()-]*)+')
+
+
+def cles_contact(contact):
+    """
+    Clés de recherche d'un contact
+    
+    Returns:
+        set: Clés normalisées (sans accents ni casse, téléphone au format E.164)
+    """
+    cles = {contact.cle_nom, contact.cle_prenom,
+            f"{contact.cle_nom} {contact.cle_prenom}", f"{contact.cle_prenom} {contact.cle_nom}"}
+    # Nom composé ("el alaoui") : chaque mot est aussi un début possible
+    cles.update(contact.cle_nom.split())
+    if contact.email:
+        cles.add(normaliser_texte(contact.email))
+    # Numéro en double en base (telephone_canonique vide) : clé recalculée depuis la saisie
+    cles.add(contact.telephone_canonique or normaliser_telephone(contact.telephone))
+    cles.discard('')
+    return cles
+
+
+def cle_saisie(texte):
+    """Normalise le texte saisi comme les clés de l'index (numéro ou texte)"""
+    texte = (texte or '').strip()
+    if RE_DEBUT_TELEPHONE.fullmatch(texte):
+        return normaliser_debut_telephone(texte)
+    return normaliser_texte(texte)
+
+
+class IndexPrefixes:
+    """
+    Tableau trié d'entrées (clé, nom, prénom, id) construit une fois, puis tenu à jour
+    à chaque rechargement du carnet (insertion et suppression dichotomiques)
+    """
+    
+    def __init__(self, contacts=()):
+        """
+        Construit l'index
+        
+        Args:
+            contacts (list): Contacts du carnet (objets Contact avec leur id)
+        """
+        self.contacts_par_id = {}
+        self.fiches = {}  # id -> (empreinte, entrées du contact)
+        entrees = []
+        for contact in contacts:
+            entrees.extend(self._enregistrer(contact))
+        # Nom, prénom puis id départagent les clés égales : ordre d'affichage du carnet
+        entrees.sort()
+        self.entrees = entrees
+    
+    @staticmethod
+    def empreinte(contact):
+        """Champs dont dépendent les clés d'un contact"""
+        return (contact.cle_nom, contact.cle_prenom, contact.email, contact.telephone,
+                contact.telephone_canonique)
+    
+    def _enregistrer(self, contact):
+        """Mémorise un contact et retourne ses entrées (non encore placées dans le tableau)"""
+        entrees = [(cle, contact.cle_nom, contact.cle_prenom, contact.id) for cle in cles_contact(contact)]
+        self.contacts_par_id[contact.id] = contact
+        self.fiches[contact.id] = (self.empreinte(contact), entrees)
+        return entrees
+    
+    def _retirer(self, contact_id):
+        """Supprime les entrées d'un contact du tableau"""
+        _, entrees = self.fiches.pop(contact_id)
+        del self.contacts_par_id[contact_id]
+        for entree in entrees:
+            i = bisect_left(self.entrees, entree)
+            if i < len(self.entrees) and self.entrees[i] == entree:
+                del self.entrees[i]
+    
+    def synchroniser(self, contacts):
+        """
+        Met l'index à jour après un rechargement du carnet : seuls les contacts ajoutés,
+        modifiés ou supprimés changent de place dans le tableau
+        
+        Args:
+            contacts (iterable): Contacts rechargés (objets Contact avec leur id)
+        """
+        presents = set()
+        for contact in contacts:
+            presents.add(contact.id)
+            fiche = self.fiches.get(contact.id)
+            if fiche is not None and fiche[0] == self.empreinte(contact):
+                self.contacts_par_id[contact.id] = contact
+                continue
+            if fiche is not None:
+                self._retirer(contact.id)
+            for entree in self._enregistrer(contact):
+                insort(self.entrees, entree)
+        for contact_id in self.fiches.keys() - presents:
+            self._retirer(contact_id)
+    
+    def rechercher(self, texte, limite=10):
+        """
+        Contacts dont une clé commence par le texte saisi
+        
+        Args:
+            texte (str): Début de nom, prénom, email ou numéro
+            limite (int): Nombre maximal de contacts retournés
+        
+        Returns:
+            list: Contacts, par ordre alphabétique de la clé trouvée
+        """
+        prefixe = cle_saisie(texte)
+        if not prefixe:
+            return []
+        
+        trouves = []
+        vus = set()
+        i = bisect_left(self.entrees, (prefixe,))
+        while i < len(self.entrees) and len(trouves) < limite and self.entrees[i][0].startswith(prefixe):
+            contact_id = self.entrees[i][3]
+            if contact_id not in vus:
+                vus.add(contact_id)
+                trouves.append(self.contacts_par_id[contact_id])
+            i += 1
+        return trouves
@@ -0,0 +1,278 @@
+import sqlite3
+from datetime import datetime, date
+from notifications import FileNotifications
+from normalisation import normaliser_email, normaliser_telephone
+from migrations import assurer_schema
+
+class ListeAttente:
+    """Classe gérant la liste d'attente des patients pour les créneaux complets"""
+    
+    def __init__(self, db_name="polyclinique.db", horaires=None):
+        """
+        Initialise la liste d'attente
+        
+        Args:
+            db_name (str): Nom de la base de données
+            horaires (HorairesServices): Calendrier compilé des ouvertures (vérification des inscriptions)
+        """
+        self.db_name = db_name
+        self.horaires = horaires
+        self.notifications = FileNotifications(db_name)
+        assurer_schema(self.db_name)
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def inscrire(self, service_id, date_rdv, heure_min, heure_max, patient_nom, patient_prenom,
+                 patient_telephone, patient_email="", motif="", cree_par=None):
+        """
+        Inscrit un patient sur la liste d'attente d'un service pour une date et une fenêtre horaire
+        
+        Args:
+            service_id (int): ID du service
+            date_rdv (str): Date souhaitée (YYYY-MM-DD)
+            heure_min (str): Début de la fenêtre acceptée (HH:MM)
+            heure_max (str): Dernière heure de début acceptée (HH:MM)
+            patient_nom (str): Nom du patient
+            patient_prenom (str): Prénom du patient
+            patient_telephone (str): Téléphone
+            patient_email (str): Email (optionnel)
+            motif (str): Motif de consultation
+            cree_par (int): ID de l'utilisateur qui inscrit le patient
+        
+        Returns:
+            tuple: (success: bool, message: str, inscription_id: int or None)
+        """
+        try:
+            # Heures remises au format HH:MM : la promotion les compare comme des chaînes
+            heure_min = datetime.strptime(heure_min, "%H:%M").strftime("%H:%M")
+            heure_max = datetime.strptime(heure_max, "%H:%M").strftime("%H:%M")
+        except (TypeError, ValueError):
+            return (False, "Les heures de la fenêtre doivent être au format HH:MM.", None)
+        if heure_min > heure_max:
+            return (False, "La fenêtre horaire est invalide.", None)
+        
+        try:
+            if datetime.strptime(date_rdv, "%Y-%m-%d").date() < date.today():
+                return (False, "Impossible de s'inscrire en liste d'attente pour une date passée.", None)
+        except (TypeError, ValueError):
+            return (False, "La date doit être au format YYYY-MM-DD.", None)
+        
+        if self.horaires is not None and not any(
+                heure_min <= debut <= heure_max for debut, _ in self.horaires.creneaux_du_jour(service_id, date_rdv)):
+            return (False, "Le service est fermé à cette date ou sur cette fenêtre horaire.", None)
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            # Vérifications et insertion dans la même transaction (pas de double inscription concurrente)
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT actif FROM services WHERE id = ?", (service_id,))
+            service = cursor.fetchone()
+            if not service or service[0] != 1:
+                conn.rollback()
+                conn.close()
+                return (False, "Service introuvable ou inactif.", None)
+            
+            if self._deja_inscrit(cursor, service_id, date_rdv, patient_email, patient_telephone):
+                conn.rollback()
+                conn.close()
+                return (False, "Ce patient est déjà sur la liste d'attente de ce service pour cette date.", None)
+            
+            cursor.execute("""
+                INSERT INTO liste_attente
+                (service_id, date_rdv, heure_min, heure_max, patient_nom, patient_prenom,
+                 patient_telephone, patient_email, motif, cree_par)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (service_id, date_rdv, heure_min, heure_max, patient_nom.upper(), patient_prenom.upper(),
+                  patient_telephone, patient_email, motif, cree_par))
+            
+            inscription_id = cursor.lastrowid
+            conn.commit()
+            position = self._position(cursor, inscription_id)
+            conn.close()
+            
+            return (True, f"Inscrit sur la liste d'attente (position {position}).", inscription_id)
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return (False, f"Erreur : {str(e)}", None)
+    
+    @staticmethod
+    def _deja_inscrit(cursor, service_id, date_rdv, patient_email, patient_telephone):
+        """Indique si le patient (même email, sinon même téléphone) attend déjà pour ce service et cette date"""
+        cle_email = normaliser_email(patient_email)
+        cle_telephone = normaliser_telephone(patient_telephone)
+        
+        cursor.execute("""
+            SELECT patient_email, patient_telephone FROM liste_attente
+            WHERE service_id = ? AND date_rdv = ? AND statut = 'en_attente'
+        """, (service_id, date_rdv))
+        for email, telephone in cursor.fetchall():
+            if cle_email and normaliser_email(email) == cle_email:
+                return True
+            if cle_telephone and normaliser_telephone(telephone) == cle_telephone:
+                return True
+        return False
+    
+    def _position(self, cursor, inscription_id):
+        """Position d'une inscription dans la file de son service et de sa date"""
+        cursor.execute("""
+            SELECT COUNT(*) FROM liste_attente l
+            JOIN liste_attente moi ON moi.id = ?
+            WHERE l.service_id = moi.service_id AND l.date_rdv = moi.date_rdv
+              AND l.statut = 'en_attente' AND l.id <= moi.id
+        """, (inscription_id,))
+        return cursor.fetchone()[0]
+    
+    def annuler_inscription(self, inscription_id):
+        """Retire un patient de la liste d'attente"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "UPDATE liste_attente SET statut = 'annulé' WHERE id = ? AND statut = 'en_attente'",
+            (inscription_id,)
+        )
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        return success
+    
+    def obtenir_inscription_par_id(self, inscription_id):
+        """Retourne une inscription par son ID"""
+        inscriptions = self._lister("WHERE l.id = ?", (inscription_id,))
+        return inscriptions[0] if inscriptions else None
+    
+    def obtenir_inscriptions(self, service_id=None, patient_email=None):
+        """
+        Retourne les inscriptions actives de la liste d'attente
+        
+        Args:
+            service_id (int, optional): Filtrer par service
+            patient_email (str, optional): Filtrer par patient
+        
+        Returns:
+            list: Liste des inscriptions, dans l'ordre de la file
+        """
+        conditions = ["l.statut = 'en_attente'"]
+        params = []
+        if service_id:
+            conditions.append("l.service_id = ?")
+            params.append(service_id)
+        if patient_email:
+            conditions.append("lower(trim(l.patient_email)) = ?")
+            params.append(normaliser_email(patient_email))
+        
+        return self._lister(f"WHERE {' AND '.join(conditions)}", params)
+    
+    def _lister(self, where_clause, params):
+        """Exécute une requête de liste sur la liste d'attente"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT l.id, l.service_id, l.date_rdv, l.heure_min, l.heure_max, l.patient_nom,
+                   l.patient_prenom, l.patient_telephone, l.patient_email, l.motif, l.statut,
+                   l.rdv_id, l.date_inscription, s.nom
+            FROM liste_attente l
+            JOIN services s ON l.service_id = s.id
+            {where_clause}
+            ORDER BY l.date_rdv, l.id
+        """, params)
+        
+        inscriptions = []
+        for row in cursor.fetchall():
+            inscriptions.append({
+                'id': row[0],
+                'service_id': row[1],
+                'date_rdv': row[2],
+                'heure_min': row[3],
+                'heure_max': row[4],
+                'patient_nom': row[5],
+                'patient_prenom': row[6],
+                'patient_telephone': row[7],
+                'patient_email': row[8],
+                'motif': row[9],
+                'statut': row[10],
+                'rdv_id': row[11],
+                'date_inscription': row[12],
+                'service_nom': row[13]
+            })
+        
+        conn.close()
+        return inscriptions
+    
+    def promouvoir_suivant(self, cursor, service_id, date_rdv, heure_debut, heure_fin):
+        """
+        Attribue un créneau libéré au premier patient éligible de la file.
+        Utilise le curseur de l'appelant : la promotion, le nouveau rendez-vous et la
+        notification sont validés dans la même transaction que l'annulation ou le rejet.
+        
+        Args:
+            cursor: Curseur SQLite de la transaction en cours
+            service_id (int): ID du service
+            date_rdv (str): Date du créneau libéré
+            heure_debut (str): Heure de début du créneau libéré
+            heure_fin (str): Heure de fin du créneau libéré
+        
+        Returns:
+            int or None: ID du rendez-vous créé, None si personne n'est éligible
+                         ou si le créneau libéré a déjà commencé
+        """
+        # Créneau déjà commencé (annulation tardive, rejet après coup) : l'inscription reste en file
+        if datetime.strptime(f"{date_rdv} {heure_debut}", "%Y-%m-%d %H:%M") < datetime.now():
+            return None
+        
+        cursor.execute("""
+            SELECT id, patient_nom, patient_prenom, patient_telephone, patient_email, motif, cree_par
+            FROM liste_attente
+            WHERE service_id = ? AND date_rdv = ? AND statut = 'en_attente'
+              AND heure_min <= ? AND heure_max >= ?
+            ORDER BY id
+            LIMIT 1
+        """, (service_id, date_rdv, heure_debut, heure_debut))
+        suivant = cursor.fetchone()
+        
+        if not suivant:
+            return None
+        
+        inscription_id, nom, prenom, telephone, email, motif, cree_par = suivant
+        
+        # Import local : rendez_vous importe ce module
+        from rendez_vous import RendezVous
+        
+        # Le rendez-vous promu suit le circuit normal de validation ; clés du patient et contact
+        # du carnet calculés comme pour une prise de rendez-vous (segments des campagnes)
+        cursor.execute("""
+            INSERT INTO rendez_vous
+            (service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
+             date_rdv, heure_debut, heure_fin, motif, cree_par,
+             patient_cle_email, patient_cle_telephone, contact_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (service_id, nom, prenom, telephone, email, date_rdv, heure_debut, heure_fin, motif, cree_par,
+              *RendezVous._identite_patient(cursor, email, telephone)))
+        rdv_id = cursor.lastrowid
+        
+        cursor.execute("""
+            UPDATE liste_attente
+            SET statut = 'promu', rdv_id = ?, date_promotion = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (rdv_id, inscription_id))
+        
+        # Sans email, pas de notification (aucun envoi SMS) : le rendez-vous promu est signalé
+        # "à appeler" dans la file de validation (RendezVous.obtenir_rendez_vous_en_attente)
+        if email:
+            FileNotifications.ajouter(
+                cursor, email,
+                "Une place s'est libérée pour votre rendez-vous",
+                f"Bonjour {prenom} {nom},\n\n"
+                f"Une place s'est libérée le {date_rdv} à {heure_debut}. "
+                f"Votre demande de rendez-vous a été créée et est en attente de validation.\n\n"
+                f"Cordialement,\nLa Polyclinique"
+            )
+        
+        return rdv_id
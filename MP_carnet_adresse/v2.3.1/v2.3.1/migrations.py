@@ -0,0 +1,713 @@
+"""
+Migrations du schéma de la base, numérotées et appliquées une seule fois.
+
+Le numéro de la dernière migration appliquée est enregistré dans PRAGMA user_version :
+au démarrage sur une base à jour, une seule lecture de ce PRAGMA suffit.
+Chaque migration s'exécute dans sa propre transaction avec la mise à jour du numéro.
+"""
+import sqlite3
+import threading
+from normalisation import normaliser_email, normaliser_telephone, normaliser_texte
+
+_bases_a_jour = set()
+_verrou = threading.Lock()
+
+
+# ==================== SCHÉMAS DES TABLES RECONSTRUITES ====================
+
+SCHEMA_CONTACTS = '''
+    CREATE TABLE IF NOT EXISTS {nom} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nom TEXT NOT NULL,
+        prenom TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        telephone TEXT NOT NULL UNIQUE,
+        adresse TEXT DEFAULT '',
+        fonction TEXT DEFAULT '',
+        entreprise TEXT DEFAULT '',
+        categorie TEXT DEFAULT 'Personnel',
+        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+SCHEMA_RENDEZ_VOUS = '''
+    CREATE TABLE IF NOT EXISTS {nom} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        service_id INTEGER NOT NULL,
+        patient_nom TEXT NOT NULL,
+        patient_prenom TEXT NOT NULL,
+        patient_telephone TEXT NOT NULL,
+        patient_email TEXT,
+        date_rdv DATE NOT NULL,
+        heure_debut TIME NOT NULL,
+        heure_fin TIME NOT NULL,
+        motif TEXT,
+        statut TEXT DEFAULT 'en_attente',
+        cree_par INTEGER,
+        valide_par INTEGER,
+        date_validation TIMESTAMP,
+        commentaire_validation TEXT,
+        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        serie_id INTEGER,
+        patient_cle_email TEXT,
+        patient_cle_telephone TEXT,
+        contact_id INTEGER,
+        FOREIGN KEY (service_id) REFERENCES services(id),
+        FOREIGN KEY (cree_par) REFERENCES admins(id),
+        FOREIGN KEY (valide_par) REFERENCES admins(id),
+        FOREIGN KEY (serie_id) REFERENCES series_rendez_vous(id),
+        FOREIGN KEY (contact_id) REFERENCES contacts(id)
+    )
+'''
+
+SCHEMA_STATS_JOURNALIERES = '''
+    CREATE TABLE IF NOT EXISTS {nom} (
+        service_id INTEGER NOT NULL,
+        jour DATE NOT NULL,
+        reserves INTEGER NOT NULL DEFAULT 0,
+        en_attente INTEGER NOT NULL DEFAULT 0,
+        confirmes INTEGER NOT NULL DEFAULT 0,
+        annules INTEGER NOT NULL DEFAULT 0,
+        rejetes INTEGER NOT NULL DEFAULT 0,
+        date_calcul TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (service_id, jour),
+        FOREIGN KEY (service_id) REFERENCES services(id)
+    )
+'''
+
+
+# ==================== OUTILS ====================
+
+def _colonnes(cursor, table):
+    """Noms des colonnes d'une table"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _sql_table(cursor, table):
+    """Instruction CREATE d'une table, None si elle n'existe pas"""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _reconstruire_table(cursor, table, schema, ignorer_doublons=False):
+    """
+    Reconstruit une table avec un nouveau schéma : création de la nouvelle table,
+    copie des colonnes communes par INSERT ... SELECT, suppression de l'ancienne, renommage.
+    La nouvelle table est renommée (et non l'ancienne) pour que les clés étrangères
+    des autres tables continuent de désigner le bon nom.
+    """
+    nouvelle = f"{table}_nouveau"
+    anciennes_colonnes = set(_colonnes(cursor, table))
+    
+    cursor.execute(f"DROP TABLE IF EXISTS {nouvelle}")
+    cursor.execute(schema.format(nom=nouvelle))
+    communes = ', '.join(c for c in _colonnes(cursor, nouvelle) if c in anciennes_colonnes)
+    
+    cursor.execute(f"""
+        INSERT {'OR IGNORE ' if ignorer_doublons else ''}INTO {nouvelle} ({communes})
+        SELECT {communes} FROM {table}
+    """)
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {nouvelle} RENAME TO {table}")
+
+
+# ==================== MIGRATIONS ====================
+
+def _m001_schema_initial(cursor):
+    """Tables principales"""
+    cursor.execute(SCHEMA_CONTACTS.format(nom='contacts'))
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom_utilisateur TEXT UNIQUE NOT NULL,
+            mot_de_passe_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            service_id INTEGER,
+            email TEXT UNIQUE,
+            contact_id INTEGER,
+            actif INTEGER DEFAULT 1,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (service_id) REFERENCES services(id),
+            FOREIGN KEY (contact_id) REFERENCES contacts(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT UNIQUE NOT NULL,
+            description TEXT,
+            responsable_id INTEGER,
+            horaire_debut TEXT DEFAULT '08:00',
+            horaire_fin TEXT DEFAULT '18:00',
+            actif INTEGER DEFAULT 1,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            capacite INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (responsable_id) REFERENCES admins(id)
+        )
+    ''')
+    # Capacité spécifique à une plage horaire (ex: 6 postes le matin, 2 l'après-midi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS capacites_services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER NOT NULL,
+            heure_debut TEXT NOT NULL,
+            heure_fin TEXT NOT NULL,
+            capacite INTEGER NOT NULL,
+            FOREIGN KEY (service_id) REFERENCES services(id)
+        )
+    ''')
+    cursor.execute(SCHEMA_RENDEZ_VOUS.format(nom='rendez_vous'))
+    # Règles de récurrence des séries de rendez-vous (suivis chroniques)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS series_rendez_vous (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER NOT NULL,
+            patient_nom TEXT NOT NULL,
+            patient_prenom TEXT NOT NULL,
+            patient_telephone TEXT NOT NULL,
+            patient_email TEXT,
+            heure_debut TIME NOT NULL,
+            heure_fin TIME NOT NULL,
+            motif TEXT,
+            frequence TEXT NOT NULL,
+            intervalle INTEGER NOT NULL DEFAULT 1,
+            date_debut DATE NOT NULL,
+            date_fin DATE,
+            nombre_occurrences INTEGER,
+            cree_par INTEGER,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (service_id) REFERENCES services(id),
+            FOREIGN KEY (cree_par) REFERENCES admins(id)
+        )
+    ''')
+    cursor.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _m002_contacts_contraintes_uniques(cursor):
+    """Contacts : UNIQUE sur email et téléphone au lieu de (nom, prénom)"""
+    table_sql = _sql_table(cursor, 'contacts')
+    if 'UNIQUE(nom, prenom)' in table_sql or 'UNIQUE (nom, prenom)' in table_sql \
+            or 'email TEXT NOT NULL UNIQUE' not in table_sql:
+        # Les doublons d'email ou de téléphone ne peuvent pas être conservés
+        _reconstruire_table(cursor, 'contacts', SCHEMA_CONTACTS, ignorer_doublons=True)
+
+
+def _m003_admins_email_contact(cursor):
+    """Admins : colonnes email (unique) et contact_id"""
+    colonnes = _colonnes(cursor, 'admins')
+    if 'email' not in colonnes:
+        # SQLite refuse ADD COLUMN ... UNIQUE : l'unicité passe par un index
+        cursor.execute("ALTER TABLE admins ADD COLUMN email TEXT")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_admins_email ON admins(email)")
+    if 'contact_id' not in colonnes:
+        cursor.execute("ALTER TABLE admins ADD COLUMN contact_id INTEGER REFERENCES contacts(id)")
+
+
+def _m004_services_capacite(cursor):
+    """Services : capacité par créneau"""
+    if 'capacite' not in _colonnes(cursor, 'services'):
+        cursor.execute("ALTER TABLE services ADD COLUMN capacite INTEGER NOT NULL DEFAULT 1")
+
+
+def _m005_rendez_vous_schema_courant(cursor):
+    """Rendez-vous : sans UNIQUE(service_id, date_rdv, heure_debut), avec séries et identité patient"""
+    table_sql = _sql_table(cursor, 'rendez_vous')
+    colonnes_attendues = {'valide_par', 'date_validation', 'commentaire_validation', 'serie_id',
+                          'patient_cle_email', 'patient_cle_telephone', 'contact_id'}
+    if 'UNIQUE(service_id, date_rdv, heure_debut)' in table_sql \
+            or not colonnes_attendues <= set(_colonnes(cursor, 'rendez_vous')):
+        _reconstruire_table(cursor, 'rendez_vous', SCHEMA_RENDEZ_VOUS)
+
+
+def _m006_tables_annexes(cursor):
+    """Liste d'attente, notifications, rappels, compteurs de modifications et rapports"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS liste_attente (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER NOT NULL,
+            date_rdv DATE NOT NULL,
+            heure_min TIME NOT NULL,
+            heure_max TIME NOT NULL,
+            patient_nom TEXT NOT NULL,
+            patient_prenom TEXT NOT NULL,
+            patient_telephone TEXT NOT NULL,
+            patient_email TEXT,
+            motif TEXT,
+            cree_par INTEGER,
+            statut TEXT DEFAULT 'en_attente',
+            rdv_id INTEGER,
+            date_inscription TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_promotion TIMESTAMP,
+            FOREIGN KEY (service_id) REFERENCES services(id),
+            FOREIGN KEY (cree_par) REFERENCES admins(id),
+            FOREIGN KEY (rdv_id) REFERENCES rendez_vous(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            canal TEXT NOT NULL DEFAULT 'email',
+            destinataire TEXT NOT NULL,
+            sujet TEXT,
+            message TEXT NOT NULL,
+            statut TEXT NOT NULL DEFAULT 'en_attente',
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_envoi TIMESTAMP
+        )
+    ''')
+    # Un rappel au plus par rendez-vous : relancer le planificateur n'envoie rien en double
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rappels_envoyes (
+            rdv_id INTEGER PRIMARY KEY,
+            destinataire TEXT NOT NULL,
+            date_envoi TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (rdv_id) REFERENCES rendez_vous(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compteurs_modifications (
+            cle TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Agrégats d'activité : une ligne par service et par jour
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_journalieres (
+            service_id INTEGER NOT NULL,
+            jour DATE NOT NULL,
+            reserves INTEGER NOT NULL DEFAULT 0,
+            en_attente INTEGER NOT NULL DEFAULT 0,
+            confirmes INTEGER NOT NULL DEFAULT 0,
+            annules INTEGER NOT NULL DEFAULT 0,
+            rejetes INTEGER NOT NULL DEFAULT 0,
+            places_offertes INTEGER NOT NULL DEFAULT 0,
+            date_calcul TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (service_id, jour),
+            FOREIGN KEY (service_id) REFERENCES services(id)
+        )
+    ''')
+    # Journal des (service, jour) touchés, alimenté par triggers dans la transaction de l'écriture
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS journal_rendez_vous (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER NOT NULL,
+            jour DATE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rapports_etat (
+            cle TEXT PRIMARY KEY,
+            valeur INTEGER NOT NULL
+        )
+    ''')
+
+
+def _m007_index(cursor):
+    """Index des recherches fréquentes"""
+    for instruction in (
+        "CREATE INDEX IF NOT EXISTS idx_capacites_service ON capacites_services(service_id, heure_debut)",
+        "CREATE INDEX IF NOT EXISTS idx_rendez_vous_serie ON rendez_vous(serie_id)",
+        "CREATE INDEX IF NOT EXISTS idx_rendez_vous_patient_email ON rendez_vous(patient_cle_email, date_rdv)",
+        "CREATE INDEX IF NOT EXISTS idx_rendez_vous_patient_tel ON rendez_vous(patient_cle_telephone)",
+        "CREATE INDEX IF NOT EXISTS idx_rendez_vous_contact ON rendez_vous(contact_id)",
+        # Les rendez-vous d'une date et d'un statut donnés sont lus par l'index (rappels, agenda)
+        "CREATE INDEX IF NOT EXISTS idx_rendez_vous_date_statut ON rendez_vous(date_rdv, statut)",
+        # La file d'un (service, date) est lue dans l'ordre d'inscription (id)
+        "CREATE INDEX IF NOT EXISTS idx_liste_attente_file ON liste_attente(service_id, date_rdv, statut, id)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_statut ON notifications(statut, id)",
+        "CREATE INDEX IF NOT EXISTS idx_stats_journalieres_jour ON stats_journalieres(jour)",
+    ):
+        cursor.execute(instruction)
+
+
+def _m008_identite_patient(cursor):
+    """Rendez-vous : clés normalisées du patient et lien vers le carnet d'adresses"""
+    # Avant les triggers : ce remplissage n'est pas une modification d'agenda
+    cursor.execute("""
+        SELECT id, patient_email, patient_telephone FROM rendez_vous
+        WHERE patient_cle_email IS NULL OR patient_cle_telephone IS NULL
+    """)
+    a_remplir = [(normaliser_email(email), normaliser_telephone(telephone), rdv_id)
+                 for rdv_id, email, telephone in cursor.fetchall()]
+    cursor.executemany(
+        "UPDATE rendez_vous SET patient_cle_email = ?, patient_cle_telephone = ? WHERE id = ?",
+        a_remplir
+    )
+    cursor.execute("""
+        UPDATE rendez_vous SET contact_id = (
+            SELECT c.id FROM contacts c
+            WHERE lower(trim(c.email)) = rendez_vous.patient_cle_email
+        )
+        WHERE contact_id IS NULL AND patient_cle_email != ''
+    """)
+
+
+def _m009_triggers_rendez_vous(cursor):
+    """Triggers du journal des rapports et des compteurs de modifications"""
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_journal_rdv_insert AFTER INSERT ON rendez_vous
+        BEGIN
+            INSERT INTO journal_rendez_vous (service_id, jour) VALUES (NEW.service_id, NEW.date_rdv);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_journal_rdv_update AFTER UPDATE ON rendez_vous
+        BEGIN
+            INSERT INTO journal_rendez_vous (service_id, jour) VALUES (NEW.service_id, NEW.date_rdv);
+            INSERT INTO journal_rendez_vous (service_id, jour)
+            SELECT OLD.service_id, OLD.date_rdv
+            WHERE OLD.service_id != NEW.service_id OR OLD.date_rdv != NEW.date_rdv;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_journal_rdv_delete AFTER DELETE ON rendez_vous
+        BEGIN
+            INSERT INTO journal_rendez_vous (service_id, jour) VALUES (OLD.service_id, OLD.date_rdv);
+        END
+    ''')
+    
+    # Chaque écriture sur rendez_vous incrémente, dans sa propre transaction,
+    # le compteur global, celui du service et celui du patient concernés
+    increment = '''
+            INSERT INTO compteurs_modifications (cle, version, date_modification)
+            VALUES ({cle}, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(cle) DO UPDATE SET version = version + 1,
+                                           date_modification = CURRENT_TIMESTAMP;'''
+    
+    def increments(ligne):
+        return ''.join(increment.format(cle=cle) for cle in (
+            "'rendez_vous'",
+            f"'rendez_vous:service:' || {ligne}.service_id",
+            f"'rendez_vous:patient:' || lower(trim(COALESCE({ligne}.patient_email, '')))"
+        ))
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_compteurs_rdv_insert AFTER INSERT ON rendez_vous
+        BEGIN{increments('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_compteurs_rdv_update AFTER UPDATE ON rendez_vous
+        BEGIN{increments('NEW')}{increments('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_compteurs_rdv_delete AFTER DELETE ON rendez_vous
+        BEGIN{increments('OLD')}
+        END
+    ''')
+    
+    # Première initialisation des rapports : tous les jours existants sont à calculer
+    cursor.execute("SELECT valeur FROM rapports_etat WHERE cle = 'watermark'")
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO journal_rendez_vous (service_id, jour)
+            SELECT DISTINCT service_id, date_rdv FROM rendez_vous
+        ''')
+        cursor.execute("INSERT INTO rapports_etat (cle, valeur) VALUES ('watermark', 0)")
+
+
+def _m010_services_par_defaut(cursor):
+    """Services médicaux de base"""
+    cursor.executemany(
+        "INSERT OR IGNORE INTO services (nom, description, horaire_debut, horaire_fin, capacite) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("Médecine Générale", "Consultations générales et suivi médical", "08:00", "18:00", 1),
+            ("Pédiatrie", "Soins et consultations pour enfants", "08:00", "17:00", 1),
+            ("Cardiologie", "Examens et consultations cardiaques", "09:00", "16:00", 1),
+            ("Dermatologie", "Soins de la peau", "08:30", "17:30", 1),
+            ("Ophtalmologie", "Examens de la vue", "08:00", "16:00", 1),
+            ("Dentaire", "Soins dentaires", "08:00", "18:00", 1),
+            ("Radiologie", "Examens radiologiques", "08:00", "17:00", 4),
+            ("Laboratoire", "Analyses médicales", "07:00", "19:00", 6),
+        ]
+    )
+
+
+def _m011_compteurs_contacts_services(cursor):
+    """Compteurs de modifications des contacts et des services (caches en mémoire des processus)"""
+    increment = '''
+            INSERT INTO compteurs_modifications (cle, version, date_modification)
+            VALUES ('{cle}', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(cle) DO UPDATE SET version = version + 1,
+                                           date_modification = CURRENT_TIMESTAMP;'''
+    
+    for table, cle in (('contacts', 'contacts'), ('services', 'services'), ('capacites_services', 'services')):
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_compteurs_{table}_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN{increment.format(cle=cle)}
+                END
+            ''')
+
+
+def _m012_horaires_fermetures(cursor):
+    """Horaires hebdomadaires (avec pauses) et fermetures des services"""
+    # Plusieurs plages par jour : l'intervalle entre deux plages est une pause ; un jour sans plage est fermé
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS horaires_services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER NOT NULL,
+            jour_semaine INTEGER NOT NULL CHECK (jour_semaine BETWEEN 0 AND 6),
+            heure_debut TEXT NOT NULL,
+            heure_fin TEXT NOT NULL,
+            FOREIGN KEY (service_id) REFERENCES services(id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_horaires_service ON horaires_services(service_id, jour_semaine)")
+    # service_id NULL : fermeture de toute la polyclinique (jour férié)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fermetures_services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_id INTEGER,
+            date_debut DATE NOT NULL,
+            date_fin DATE,
+            motif TEXT DEFAULT '',
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (service_id) REFERENCES services(id)
+        )
+    ''')
+    
+    # Compteur 'horaires' : invalide le calendrier compilé de chaque processus
+    increment = '''
+            INSERT INTO compteurs_modifications (cle, version, date_modification)
+            VALUES ('horaires', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(cle) DO UPDATE SET version = version + 1,
+                                           date_modification = CURRENT_TIMESTAMP;'''
+    
+    evenements = [(f"{table}_{operation.lower()}", f"{operation} ON {table}")
+                  for table in ('horaires_services', 'fermetures_services')
+                  for operation in ('INSERT', 'UPDATE', 'DELETE')]
+    evenements += [('services_insert', "INSERT ON services"),
+                   ('services_delete', "DELETE ON services"),
+                   ('services_update', "UPDATE OF horaire_debut, horaire_fin ON services")]
+    for nom, evenement in evenements:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_horaires_{nom} AFTER {evenement}
+            BEGIN{increment}
+            END
+        ''')
+
+
+def _m013_notifications_boite_envoi(cursor):
+    """Notifications : boîte d'envoi avec nouvelles tentatives espacées et échecs définitifs"""
+    colonnes = _colonnes(cursor, 'notifications')
+    for colonne, definition in (
+        ('html', "INTEGER NOT NULL DEFAULT 0"),
+        ('tentatives', "INTEGER NOT NULL DEFAULT 0"),
+        # Tant qu'elle est dans le futur, la notification n'est pas reprise (réessai différé ou envoi en cours)
+        ('prochaine_tentative', "TIMESTAMP"),
+        ('derniere_erreur', "TEXT"),
+    ):
+        if colonne not in colonnes:
+            cursor.execute(f"ALTER TABLE notifications ADD COLUMN {colonne} {definition}")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_a_distribuer
+        ON notifications(canal, statut, prochaine_tentative)
+    ''')
+
+
+def _m014_compteur_configuration(cursor):
+    """Compteur de modifications de la configuration (cache en mémoire des processus)"""
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_compteurs_config_{operation.lower()}
+            AFTER {operation} ON config
+            BEGIN
+                INSERT INTO compteurs_modifications (cle, version, date_modification)
+                VALUES ('config', 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(cle) DO UPDATE SET version = version + 1,
+                                               date_modification = CURRENT_TIMESTAMP;
+            END
+        ''')
+
+
+def _m015_contacts_telephone_canonique(cursor):
+    """Contacts : téléphone canonique E.164, unique et indexé"""
+    if 'telephone_canonique' not in _colonnes(cursor, 'contacts'):
+        cursor.execute("ALTER TABLE contacts ADD COLUMN telephone_canonique TEXT")
+    
+    cursor.execute("SELECT id, telephone FROM contacts ORDER BY id")
+    deja_vus = set()
+    a_remplir = []
+    doublons = []
+    for contact_id, telephone in cursor.fetchall():
+        canonique = normaliser_telephone(telephone) or None
+        if canonique in deja_vus:
+            # Même numéro saisi autrement ("06 12 ..." et "0612...") : le plus ancien contact le garde
+            doublons.append(contact_id)
+            canonique = None
+        elif canonique:
+            deja_vus.add(canonique)
+        a_remplir.append((canonique, contact_id))
+    cursor.executemany("UPDATE contacts SET telephone_canonique = ? WHERE id = ?", a_remplir)
+    if doublons:
+        print(f"✗ {len(doublons)} contact(s) au téléphone déjà utilisé par un autre contact "
+              f"(sans téléphone canonique) : {', '.join(map(str, doublons))}")
+    
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_telephone_canonique
+        ON contacts(telephone_canonique)
+    ''')
+
+
+def _m016_contacts_noms_normalises(cursor):
+    """Contacts : nom et prénom sans accents ni casse, indexés pour le tri et la recherche"""
+    colonnes = _colonnes(cursor, 'contacts')
+    for colonne in ('nom_normalise', 'prenom_normalise'):
+        if colonne not in colonnes:
+            cursor.execute(f"ALTER TABLE contacts ADD COLUMN {colonne} TEXT")
+    
+    cursor.execute("SELECT id, nom, prenom FROM contacts")
+    cursor.executemany(
+        "UPDATE contacts SET nom_normalise = ?, prenom_normalise = ? WHERE id = ?",
+        [(normaliser_texte(nom), normaliser_texte(prenom), contact_id)
+         for contact_id, nom, prenom in cursor.fetchall()]
+    )
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_noms_normalises
+        ON contacts(nom_normalise, prenom_normalise)
+    ''')
+
+
+def _m017_compteur_liste_attente(cursor):
+    """Compteur de modifications de la liste d'attente (ETag des pages de rendez-vous)"""
+    increment = '''
+            INSERT INTO compteurs_modifications (cle, version, date_modification)
+            VALUES ('liste_attente', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(cle) DO UPDATE SET version = version + 1,
+                                           date_modification = CURRENT_TIMESTAMP;'''
+    
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_compteurs_liste_attente_{operation.lower()}
+            AFTER {operation} ON liste_attente
+            BEGIN{increment}
+            END
+        ''')
+
+
+def _m018_promotions_sans_email(cursor):
+    """Liste d'attente : promotions sans email signalées au personnel (plus de file SMS sans expéditeur)"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_liste_attente_rdv ON liste_attente(rdv_id)")
+    # Aucun expéditeur ne traite le canal SMS : ces messages resteraient en attente indéfiniment
+    cursor.execute("""
+        UPDATE notifications
+        SET statut = 'échec', prochaine_tentative = NULL,
+            derniere_erreur = 'Canal SMS non pris en charge : patient à prévenir par téléphone'
+        WHERE canal = 'sms' AND statut = 'en_attente'
+    """)
+
+
+def _m019_stats_sans_places_offertes(cursor):
+    """Agrégats d'activité : suppression de la colonne places_offertes (calculée par les rapports)"""
+    _reconstruire_table(cursor, 'stats_journalieres', SCHEMA_STATS_JOURNALIERES)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stats_journalieres_jour ON stats_journalieres(jour)")
+
+
+# Ordre d'application : ne jamais renuméroter ni modifier une migration publiée, en ajouter une nouvelle
+MIGRATIONS = [
+    (1, _m001_schema_initial),
+    (2, _m002_contacts_contraintes_uniques),
+    (3, _m003_admins_email_contact),
+    (4, _m004_services_capacite),
+    (5, _m005_rendez_vous_schema_courant),
+    (6, _m006_tables_annexes),
+    (7, _m007_index),
+    (8, _m008_identite_patient),
+    (9, _m009_triggers_rendez_vous),
+    (10, _m010_services_par_defaut),
+    (11, _m011_compteurs_contacts_services),
+    (12, _m012_horaires_fermetures),
+    (13, _m013_notifications_boite_envoi),
+    (14, _m014_compteur_configuration),
+    (15, _m015_contacts_telephone_canonique),
+    (16, _m016_contacts_noms_normalises),
+    (17, _m017_compteur_liste_attente),
+    (18, _m018_promotions_sans_email),
+    (19, _m019_stats_sans_places_offertes),
+]
+
+VERSION_COURANTE = MIGRATIONS[-1][0]
+
+
+def version_schema(db_name):
+    """Retourne le numéro de la dernière migration appliquée à une base"""
+    conn = sqlite3.connect(db_name)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version
+
+
+def migrer(db_name):
+    """
+    Applique les migrations manquantes, chacune dans sa transaction.
+    Le numéro est relu sous verrou d'écriture : deux processus qui démarrent
+    ensemble n'appliquent pas deux fois la même migration.
+    
+    Args:
+        db_name (str): Nom de la base de données
+    
+    Returns:
+        int: Nombre de migrations appliquées
+    """
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    cursor = conn.cursor()
+    appliquees = 0
+    
+    try:
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= VERSION_COURANTE:
+            return 0
+        
+        # Journal WAL (persistant dans le fichier) : les lectures ne bloquent plus les écritures
+        # et une écriture courte (mise en file d'une notification) ne force plus de fsync de la base
+        cursor.execute("PRAGMA journal_mode = WAL")
+        
+        for numero, migration in MIGRATIONS:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if cursor.execute("PRAGMA user_version").fetchone()[0] >= numero:
+                    cursor.execute("ROLLBACK")
+                    continue
+                
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {numero}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            
+            appliquees += 1
+            print(f"✓ Migration {numero} appliquée : {migration.__doc__}")
+    finally:
+        conn.close()
+    
+    return appliquees
+
+
+def assurer_schema(db_name):
+    """
+    Garantit qu'une base est au schéma courant ; ne fait rien après le premier appel du processus
+    
+    Args:
+        db_name (str): Nom de la base de données
+    """
+    if db_name in _bases_a_jour:
+        return
+    with _verrou:
+        if db_name not in _bases_a_jour:
+            migrer(db_name)
+            _bases_a_jour.add(db_name)
+
+
+if __name__ == '__main__':
+    import sys
+    base = sys.argv[1] if len(sys.argv) > 1 else "polyclinique.db"
+    nombre = migrer(base)
+    print(f"✓ Base {base} au schéma {version_schema(base)} ({nombre} migration(s) appliquée(s))")
@@ -0,0 +1,92 @@
+"""Normalisation des identifiants patients (email, téléphone) et des noms pour les recherches indexées"""
+import unicodedata
+
+INDICATIF_PAR_DEFAUT = "212"  # Maroc
+
+
+def normaliser_texte(texte):
+    """
+    Clé de tri et de recherche d'un nom : sans accents, casse repliée, espaces réduits
+    ("  Éloïse  EL-FASSI" -> 'eloise el-fassi')
+    
+    Args:
+        texte (str): Texte saisi
+    
+    Returns:
+        str: Texte normalisé ('' si absent)
+    """
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    return ' '.join(sans_accents.casefold().split())
+
+
+def normaliser_email(email):
+    """
+    Clé de recherche d'un email : sans espaces autour, en minuscules
+    
+    Args:
+        email (str): Email saisi
+    
+    Returns:
+        str: Email normalisé ('' si absent)
+    """
+    return (email or '').strip().lower()
+
+
+def normaliser_telephone(telephone, indicatif=INDICATIF_PAR_DEFAUT):
+    """
+    Clé de recherche d'un téléphone au format E.164 (+212612345678).
+    Les numéros nationaux (06..., 6...) reçoivent l'indicatif par défaut.
+    
+    Args:
+        telephone (str): Numéro saisi (espaces, tirets, parenthèses acceptés)
+        indicatif (str): Indicatif pays des numéros nationaux
+    
+    Returns:
+        str: Numéro normalisé ('' si aucun chiffre)
+    """
+    telephone = (telephone or '').strip()
+    chiffres = ''.join(c for c in telephone if c.isdigit())
+    
+    if not chiffres:
+        return ''
+    if telephone.startswith('+'):
+        return '+' + chiffres
+    if chiffres.startswith('00'):
+        return '+' + chiffres[2:]
+    if chiffres.startswith(indicatif) and len(chiffres) > 10:
+        return '+' + chiffres
+    if chiffres.startswith('0'):
+        return '+' + indicatif + chiffres[1:]
+    return '+' + indicatif + chiffres
+
+
+def normaliser_debut_telephone(saisie, indicatif=INDICATIF_PAR_DEFAUT):
+    """
+    Début de numéro saisi (recherche, saisie semi-automatique) au format E.164.
+    Contrairement à normaliser_telephone, une saisie partielle commençant par l'indicatif
+    ("212 6 12") est reconnue sans attendre le numéro complet : '+212612', pas '+212212612'.
+    
+    Args:
+        saisie (str): Début de numéro saisi
+        indicatif (str): Indicatif pays des numéros nationaux
+    
+    Returns:
+        str: Début normalisé ('' si aucun chiffre)
+    """
+    saisie = (saisie or '').strip()
+    chiffres = ''.join(c for c in saisie if c.isdigit())
+    
+    if chiffres.startswith(indicatif) and not saisie.startswith('+'):
+        return '+' + chiffres
+    return normaliser_telephone(saisie, indicatif)
+
+
+def chiffres_telephone(telephone, indicatif=INDICATIF_PAR_DEFAUT):
+    """
+    Chiffres d'un numéro tel que saisi et au format international, séparés par un saut de ligne
+    ("06 12 34 56 78" -> '0612345678\n212612345678') : une suite de chiffres tapée au milieu
+    du numéro ("5678") le retrouve dans l'une ou l'autre écriture
+    """
+    chiffres = ''.join(c for c in (telephone or '') if c.isdigit())
+    return f"{chiffres}\n{normaliser_telephone(telephone, indicatif)[1:]}"
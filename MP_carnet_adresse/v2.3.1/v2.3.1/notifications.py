@@ -0,0 +1,360 @@
+import sqlite3
+import threading
+from migrations import assurer_schema
+
+class FileNotifications:
+    """Classe gérant la file persistante des notifications à envoyer aux patients"""
+    
+    CANAL_EMAIL = "email"
+    CANAL_SMS = "sms"
+    
+    MAX_TENTATIVES = 6
+    DELAI_REESSAI = 60           # secondes avant la 2e tentative, doublé ensuite
+    DELAI_REESSAI_MAX = 6 * 3600
+    DUREE_RESERVATION = 300      # secondes avant qu'un lot réservé et non traité (processus arrêté) soit repris
+    
+    def __init__(self, db_name="polyclinique.db"):
+        """
+        Initialise la file de notifications
+        
+        Args:
+            db_name (str): Nom de la base de données
+        """
+        self.db_name = db_name
+        self._connexion_file = None
+        self._verrou_file = threading.Lock()
+        assurer_schema(self.db_name)
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    @staticmethod
+    def ajouter(cursor, destinataire, sujet, message, canal=CANAL_EMAIL, html=False):
+        """
+        Met une notification en file avec le curseur de l'appelant,
+        pour qu'elle soit validée dans la même transaction que l'événement qui la déclenche
+        
+        Args:
+            cursor: Curseur SQLite de la transaction en cours
+            destinataire (str): Email ou téléphone du destinataire
+            sujet (str): Sujet du message
+            message (str): Corps du message
+            canal (str): email ou sms
+            html (bool): Si True, le message est en HTML
+        
+        Returns:
+            int: ID de la notification
+        """
+        cursor.execute(
+            "INSERT INTO notifications (canal, destinataire, sujet, message, html) VALUES (?, ?, ?, ?, ?)",
+            (canal, destinataire, sujet, message, int(bool(html)))
+        )
+        return cursor.lastrowid
+    
+    def mettre_en_file(self, destinataire, sujet, message, canal=CANAL_EMAIL, html=False):
+        """
+        Met une notification en file dans sa propre transaction, sans attendre l'envoi.
+        La connexion est gardée ouverte et partagée (sous verrou) : fermer la dernière connexion
+        d'une base WAL force un point de contrôle, qui coûterait un fsync à chaque mise en file ;
+        synchronous = NORMAL ne synchronise le disque qu'aux points de contrôle.
+        
+        Returns:
+            int: ID de la notification
+        """
+        with self._verrou_file:
+            if self._connexion_file is None:
+                self._connexion_file = sqlite3.connect(self.db_name, check_same_thread=False)
+                self._connexion_file.execute("PRAGMA synchronous = NORMAL")
+            
+            cursor = self._connexion_file.cursor()
+            try:
+                notification_id = self.ajouter(cursor, destinataire, sujet, message, canal, html)
+                self._connexion_file.commit()
+            except Exception:
+                self._connexion_file.rollback()
+                raise
+        return notification_id
+    
+    def reserver_lot(self, canal=CANAL_EMAIL, limite=50):
+        """
+        Réserve les prochaines notifications à envoyer d'un canal : leur prochaine tentative
+        est repoussée de DUREE_RESERVATION pour qu'aucun autre processus ne les reprenne
+        pendant l'envoi, et leur nombre de tentatives est incrémenté.
+        
+        Args:
+            canal (str): email ou sms
+            limite (int): Taille maximale du lot
+        
+        Returns:
+            list: Liste de dictionnaires de notifications (avec tentatives déjà incrémentées)
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT id, destinataire, sujet, message, html, tentatives
+                FROM notifications
+                WHERE canal = ? AND statut = 'en_attente'
+                  AND (prochaine_tentative IS NULL OR prochaine_tentative <= datetime('now'))
+                ORDER BY id
+                LIMIT ?
+            """, (canal, limite))
+            
+            lot = []
+            for row in cursor.fetchall():
+                lot.append({
+                    'id': row[0],
+                    'destinataire': row[1],
+                    'sujet': row[2] or '',
+                    'message': row[3],
+                    'html': bool(row[4]),
+                    'tentatives': row[5] + 1
+                })
+            
+            cursor.executemany(f"""
+                UPDATE notifications
+                SET tentatives = tentatives + 1,
+                    prochaine_tentative = datetime('now', '+{self.DUREE_RESERVATION} seconds')
+                WHERE id = ?
+            """, [(n['id'],) for n in lot])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return lot
+    
+    def delai_reessai(self, tentatives):
+        """Délai en secondes avant la tentative suivante (backoff exponentiel plafonné)"""
+        return min(self.DELAI_REESSAI * 2 ** (tentatives - 1), self.DELAI_REESSAI_MAX)
+    
+    def enregistrer_resultats(self, resultats):
+        """
+        Enregistre en une transaction le résultat de l'envoi d'un lot réservé.
+        Une notification en échec est replanifiée après un délai croissant,
+        ou passe au statut 'échec' après MAX_TENTATIVES tentatives.
+        
+        Args:
+            resultats (list): Tuples (notification: dict, success: bool, erreur: str)
+        
+        Returns:
+            tuple: (nb_envoyees: int, nb_replanifiees: int, nb_echecs_definitifs: int)
+        """
+        envoyees = []
+        replanifiees = []
+        echecs = []
+        for notification, success, erreur in resultats:
+            if success:
+                envoyees.append((notification['id'],))
+            elif notification['tentatives'] >= self.MAX_TENTATIVES:
+                echecs.append((erreur, notification['id']))
+            else:
+                delai = self.delai_reessai(notification['tentatives'])
+                replanifiees.append((f"+{delai} seconds", erreur, notification['id']))
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        cursor.executemany("""
+            UPDATE notifications
+            SET statut = 'envoyé', date_envoi = CURRENT_TIMESTAMP, prochaine_tentative = NULL
+            WHERE id = ?
+        """, envoyees)
+        cursor.executemany("""
+            UPDATE notifications SET prochaine_tentative = datetime('now', ?), derniere_erreur = ?
+            WHERE id = ?
+        """, replanifiees)
+        cursor.executemany("""
+            UPDATE notifications SET statut = 'échec', prochaine_tentative = NULL, derniere_erreur = ?
+            WHERE id = ?
+        """, echecs)
+        conn.commit()
+        conn.close()
+        
+        return (len(envoyees), len(replanifiees), len(echecs))
+    
+    def obtenir_notifications_en_echec(self, limite=100):
+        """Retourne les notifications abandonnées après MAX_TENTATIVES, les plus récentes d'abord"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, canal, destinataire, sujet, tentatives, derniere_erreur, date_creation
+            FROM notifications
+            WHERE statut = 'échec'
+            ORDER BY id DESC
+            LIMIT ?
+        """, (limite,))
+        
+        notifications = []
+        for row in cursor.fetchall():
+            notifications.append({
+                'id': row[0],
+                'canal': row[1],
+                'destinataire': row[2],
+                'sujet': row[3],
+                'tentatives': row[4],
+                'derniere_erreur': row[5],
+                'date_creation': row[6]
+            })
+        
+        conn.close()
+        return notifications
+    
+    def relancer(self, notification_id):
+        """Remet en file une notification en échec (tentatives remises à zéro)"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE notifications
+            SET statut = 'en_attente', tentatives = 0, prochaine_tentative = NULL
+            WHERE id = ? AND statut = 'échec'
+        """, (notification_id,))
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        return success
+    
+    def obtenir_notifications_en_attente(self, limite=100):
+        """Retourne les notifications non encore envoyées, dans l'ordre d'arrivée"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, canal, destinataire, sujet, message, date_creation
+            FROM notifications
+            WHERE statut = 'en_attente'
+            ORDER BY id
+            LIMIT ?
+        """, (limite,))
+        
+        notifications = []
+        for row in cursor.fetchall():
+            notifications.append({
+                'id': row[0],
+                'canal': row[1],
+                'destinataire': row[2],
+                'sujet': row[3],
+                'message': row[4],
+                'date_creation': row[5]
+            })
+        
+        conn.close()
+        return notifications
+    
+    def marquer_envoyee(self, notification_id):
+        """Marque une notification comme envoyée"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "UPDATE notifications SET statut = 'envoyé', date_envoi = CURRENT_TIMESTAMP WHERE id = ?",
+            (notification_id,)
+        )
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        return success
+
+
+class DistributeurNotifications:
+    """
+    Thread d'arrière-plan vidant la file des notifications email par lots,
+    sur les sessions SMTP du module de communication
+    """
+    
+    TAILLE_LOT = 50
+    
+    def __init__(self, communication, file_notifications):
+        """
+        Initialise le distributeur
+        
+        Args:
+            communication (Communication): Module d'envoi des emails
+            file_notifications (FileNotifications): File persistante des notifications
+        """
+        self.communication = communication
+        self.file = file_notifications
+        self._arret = threading.Event()
+        self._reveil = threading.Event()
+        self._thread = None
+    
+    def vider(self):
+        """
+        Envoie les notifications email dues, lot par lot, jusqu'à épuisement de la file
+        
+        Returns:
+            tuple: (nb_envoyees: int, nb_replanifiees: int, nb_echecs_definitifs: int)
+        """
+        # Module lu une fois par passage : recharger_communication peut le remplacer entre deux passages,
+        # l'ancien ne ferme ses sessions qu'à la fin de celui-ci
+        communication = self.communication
+        
+        # Sans SMTP, l'envoi ne serait que simulé : les notifications restent en file
+        # (sans tentative consommée) jusqu'à ce que l'email soit configuré
+        if not communication.email_est_configure():
+            return (0, 0, 0)
+        
+        totaux = [0, 0, 0]
+        with communication.utilisation():
+            while not self._arret.is_set():
+                lot = self.file.reserver_lot(FileNotifications.CANAL_EMAIL, self.TAILLE_LOT)
+                if not lot:
+                    break
+                
+                envois = communication.envoyer_emails_lot(lot)
+                resultats = [(notification, success, msg)
+                             for notification, (_, success, msg) in zip(lot, envois)]
+                for i, nombre in enumerate(self.file.enregistrer_resultats(resultats)):
+                    totaux[i] += nombre
+        
+        return tuple(totaux)
+    
+    def reveiller(self):
+        """Demande un passage immédiat (après une mise en file)"""
+        self._reveil.set()
+    
+    def demarrer(self, intervalle_secondes=30):
+        """
+        Lance le thread d'envoi. Il vide la file à chaque réveil, et au plus tard
+        toutes les intervalle_secondes pour les notifications replanifiées.
+        
+        Returns:
+            threading.Thread: Le thread démarré
+        """
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, args=(intervalle_secondes,),
+                                        name="distributeur-notifications", daemon=True)
+        self._thread.start()
+        return self._thread
+    
+    def arreter(self):
+        """Arrête le thread d'arrière-plan (le lot en cours est terminé)"""
+        self._arret.set()
+        self._reveil.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._arret.clear()
+    
+    def _boucle(self, intervalle_secondes):
+        """Boucle du thread : vidage de la file, puis attente d'un réveil, de l'intervalle ou de l'arrêt"""
+        while not self._arret.is_set():
+            self._reveil.clear()
+            try:
+                nb_envoyees, nb_replanifiees, nb_echecs = self.vider()
+                if nb_replanifiees or nb_echecs:
+                    print(f"✗ Notifications : {nb_replanifiees} à réessayer, {nb_echecs} en échec définitif")
+            except Exception as e:
+                print(f"✗ Erreur lors de l'envoi des notifications : {e}")
+            self._reveil.wait(intervalle_secondes)
@@ -0,0 +1,224 @@
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LimiteurDebit:
+    """Seau à jetons limitant le nombre d'emails par seconde vers un serveur SMTP"""
+    
+    _limiteurs = {}
+    _verrou_registre = threading.Lock()
+    
+    def __init__(self, debit, rafale=None):
+        """
+        Initialise le limiteur
+        
+        Args:
+            debit (float): Nombre d'emails autorisés par seconde
+            rafale (int): Nombre d'emails pouvant partir d'un coup (par défaut le débit arrondi)
+        """
+        self.debit = float(debit)
+        self.rafale = max(1, int(rafale if rafale is not None else debit))
+        self._jetons = float(self.rafale)
+        self._dernier = time.monotonic()
+        self._verrou = threading.Lock()
+    
+    @classmethod
+    def pour_serveur(cls, hote, port, debit, rafale=None):
+        """
+        Retourne le limiteur partagé d'un serveur, pour que plusieurs pools
+        vers le même serveur respectent ensemble la même limite
+        """
+        with cls._verrou_registre:
+            limiteur = cls._limiteurs.get((hote, port))
+            if limiteur is None or limiteur.debit != float(debit):
+                limiteur = cls(debit, rafale)
+                cls._limiteurs[(hote, port)] = limiteur
+            return limiteur
+    
+    def attendre(self):
+        """Bloque jusqu'à ce qu'un jeton soit disponible, puis le consomme"""
+        while True:
+            with self._verrou:
+                maintenant = time.monotonic()
+                self._jetons = min(self.rafale, self._jetons + (maintenant - self._dernier) * self.debit)
+                self._dernier = maintenant
+                if self._jetons >= 1:
+                    self._jetons -= 1
+                    return
+                attente = (1 - self._jetons) / self.debit
+            time.sleep(attente)
+
+
+class PoolSMTP:
+    """
+    Pool de sessions SMTP authentifiées réutilisées d'un envoi à l'autre.
+    Les envois d'un lot sont répartis sur plusieurs threads (une session chacun) ;
+    une session coupée par le serveur est rouverte et l'email renvoyé une fois.
+    """
+    
+    INACTIVITE_MAX = 60  # secondes avant de vérifier une session par NOOP
+    
+    def __init__(self, ouvrir_session, taille=4, debit_max=None, serveur=None):
+        """
+        Initialise le pool (les sessions sont ouvertes à la demande)
+        
+        Args:
+            ouvrir_session (callable): Fonction retournant une session smtplib.SMTP prête à envoyer
+            taille (int): Nombre maximal de sessions (et de threads d'envoi)
+            debit_max (float): Limite d'emails par seconde vers le serveur (None = sans limite)
+            serveur (tuple): (hôte, port) servant à partager la limite de débit entre pools
+        """
+        self.ouvrir_session = ouvrir_session
+        self.taille = max(1, int(taille))
+        self.limiteur = None
+        if debit_max:
+            self.limiteur = LimiteurDebit.pour_serveur(*(serveur or (None, None)), debit_max)
+        self._libres = queue.LifoQueue()
+        self._nb_ouvertes = 0
+        self._verrou = threading.Lock()
+        self._places = threading.BoundedSemaphore(self.taille)
+    
+    def _acquerir(self):
+        """Retourne une session libre, en ouvre une nouvelle si aucune n'est disponible"""
+        self._places.acquire()
+        try:
+            try:
+                server, derniere_utilisation = self._libres.get_nowait()
+            except queue.Empty:
+                return self._ouvrir()
+            
+            if time.monotonic() - derniere_utilisation > self.INACTIVITE_MAX:
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("Session expirée")
+                except (smtplib.SMTPException, OSError):
+                    self._fermer_session(server)
+                    return self._ouvrir()
+            return server
+        except BaseException:
+            self._places.release()
+            raise
+    
+    def _ouvrir(self):
+        """Ouvre une nouvelle session et la comptabilise"""
+        server = self.ouvrir_session()
+        with self._verrou:
+            self._nb_ouvertes += 1
+        return server
+    
+    def _rendre(self, server):
+        """Remet une session en état de marche dans le pool"""
+        self._libres.put((server, time.monotonic()))
+        self._places.release()
+    
+    def _jeter(self, server):
+        """Ferme une session inutilisable et libère sa place"""
+        self._fermer_session(server)
+        self._places.release()
+    
+    def _fermer_session(self, server):
+        """Ferme une session sans propager d'erreur"""
+        with self._verrou:
+            self._nb_ouvertes -= 1
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+    
+    def envoyer_message(self, msg):
+        """
+        Envoie un message MIME sur une session du pool
+        
+        Args:
+            msg (email.message.Message): Message à envoyer
+        
+        Raises:
+            smtplib.SMTPException, OSError: si l'envoi échoue même après reconnexion
+        """
+        if self.limiteur is not None:
+            self.limiteur.attendre()
+        
+        server = self._acquerir()
+        for tentative in (1, 2):
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Session coupée par le serveur : on en rouvre une et on renvoie une fois
+                self._fermer_session(server)
+                try:
+                    if tentative == 2:
+                        raise
+                    server = self._ouvrir()
+                except BaseException:
+                    self._places.release()
+                    raise
+                continue
+            except smtplib.SMTPException:
+                # Refus d'un destinataire, etc. : la session reste utilisable
+                self._rendre(server)
+                raise
+            except BaseException:
+                self._jeter(server)
+                raise
+            self._rendre(server)
+            return
+    
+    def envoyer(self, messages):
+        """
+        Envoie une liste de messages en parallèle sur les sessions du pool
+        
+        Args:
+            messages (list): Messages MIME à envoyer
+        
+        Returns:
+            list: Pour chaque message, dans l'ordre, None s'il est parti ou l'exception levée
+        """
+        def envoyer_un(msg):
+            try:
+                self.envoyer_message(msg)
+            except Exception as e:
+                return e
+            return None
+        
+        if self.taille == 1 or len(messages) <= 1:
+            return [envoyer_un(msg) for msg in messages]
+        
+        with ThreadPoolExecutor(max_workers=min(self.taille, len(messages)),
+                                thread_name_prefix="smtp") as executeur:
+            return list(executeur.map(envoyer_un, messages))
+    
+    def verifier(self):
+        """
+        Emprunte puis rend une session, pour détecter avant un lot
+        un serveur injoignable ou des identifiants refusés
+        
+        Raises:
+            smtplib.SMTPException, OSError: si aucune session ne peut être ouverte
+        """
+        self._rendre(self._acquerir())
+    
+    def nb_sessions(self):
+        """Retourne le nombre de sessions actuellement ouvertes"""
+        with self._verrou:
+            return self._nb_ouvertes
+    
+    def fermer(self):
+        """Ferme toutes les sessions libres du pool"""
+        while True:
+            try:
+                server, _ = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._fermer_session(server)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fermer()
@@ -0,0 +1,220 @@
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from communication import Communication
+from notifications import FileNotifications, DistributeurNotifications
+from migrations import assurer_schema
+from configuration import ConfigurationPolyclinique
+
+class PlanificateurRappels:
+    """Classe gérant la mise en file des rappels de rendez-vous de la veille"""
+    
+    def __init__(self, distributeur, db_name="polyclinique.db"):
+        """
+        Initialise le planificateur de rappels
+        
+        Args:
+            distributeur (DistributeurNotifications): Envoi des notifications mises en file
+            db_name (str): Nom de la base de données
+        """
+        self.distributeur = distributeur
+        self.db_name = db_name
+        self._arret = threading.Event()
+        self._thread = None
+        assurer_schema(self.db_name)
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def obtenir_rappels_a_envoyer(self, date_rdv):
+        """
+        Retourne les rendez-vous confirmés d'une date qui n'ont pas encore reçu de rappel
+        
+        Args:
+            date_rdv (str): Date des rendez-vous (YYYY-MM-DD)
+        
+        Returns:
+            list: Liste de dictionnaires de rendez-vous
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT r.id, r.patient_nom, r.patient_prenom, r.patient_email,
+                   r.date_rdv, r.heure_debut, r.heure_fin, s.nom
+            FROM rendez_vous r
+            JOIN services s ON r.service_id = s.id
+            LEFT JOIN rappels_envoyes re ON re.rdv_id = r.id
+            WHERE r.date_rdv = ? AND r.statut = 'confirmé'
+              AND r.patient_email IS NOT NULL AND r.patient_email != ''
+              AND re.rdv_id IS NULL
+            ORDER BY r.heure_debut
+        """, (date_rdv,))
+        
+        rappels = []
+        for row in cursor.fetchall():
+            rappels.append({
+                'id': row[0],
+                'patient_nom': row[1],
+                'patient_prenom': row[2],
+                'patient_email': row[3],
+                'date_rdv': row[4],
+                'heure_debut': row[5],
+                'heure_fin': row[6],
+                'service_nom': row[7]
+            })
+        
+        conn.close()
+        return rappels
+    
+    @staticmethod
+    def generer_message_rappel(rdv):
+        """
+        Génère le sujet et le corps HTML du rappel personnalisé d'un rendez-vous
+        
+        Args:
+            rdv (dict): Rendez-vous (patient, date, heures, service)
+        
+        Returns:
+            tuple: (sujet: str, message_html: str)
+        """
+        date_affichee = datetime.strptime(rdv['date_rdv'], "%Y-%m-%d").strftime("%d/%m/%Y")
+        sujet = f"Rappel : rendez-vous {rdv['service_nom']} le {date_affichee} à {rdv['heure_debut']}"
+        message = f"""
+                <html>
+                    <body style="font-family: Arial, sans-serif; padding: 20px;">
+                        <h2 style="color: #f39c12;">Rappel - {rdv['patient_prenom']} {rdv['patient_nom']}</h2>
+                        <p>Nous vous rappelons votre rendez-vous en <strong>{rdv['service_nom']}</strong>
+                           le <strong>{date_affichee}</strong> de {rdv['heure_debut']} à {rdv['heure_fin']}.</p>
+                        <p>En cas d'empêchement, merci d'annuler votre rendez-vous depuis votre espace patient.</p>
+                        <br>
+                        <p>Cordialement,</p>
+                        <p><strong>La Polyclinique</strong></p>
+                    </body>
+                </html>
+            """
+        return (sujet, message)
+    
+    def mettre_en_file_rappels(self, date_rdv=None):
+        """
+        Met en file d'envoi les rappels des rendez-vous confirmés d'une date (par défaut demain).
+        Chaque rappel est enregistré dans la même transaction que sa notification :
+        un rendez-vous n'est jamais rappelé deux fois, même si plusieurs processus passent.
+        
+        Args:
+            date_rdv (str): Date des rendez-vous (YYYY-MM-DD), demain par défaut
+        
+        Returns:
+            int: Nombre de rappels mis en file
+        """
+        if date_rdv is None:
+            date_rdv = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        
+        rappels = self.obtenir_rappels_a_envoyer(date_rdv)
+        if not rappels:
+            return 0
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        nb_mis_en_file = 0
+        for rdv in rappels:
+            cursor.execute(
+                "INSERT OR IGNORE INTO rappels_envoyes (rdv_id, destinataire) VALUES (?, ?)",
+                (rdv['id'], rdv['patient_email'])
+            )
+            if cursor.rowcount:
+                sujet, message = self.generer_message_rappel(rdv)
+                FileNotifications.ajouter(cursor, rdv['patient_email'], sujet, message, html=True)
+                nb_mis_en_file += 1
+        conn.commit()
+        conn.close()
+        
+        if nb_mis_en_file:
+            self.distributeur.reveiller()
+        print(f"✓ Rappels du {date_rdv} : {nb_mis_en_file} mis en file d'envoi")
+        return nb_mis_en_file
+    
+    def demarrer(self, intervalle_secondes=3600):
+        """
+        Lance l'envoi périodique des rappels dans un thread d'arrière-plan
+        
+        Args:
+            intervalle_secondes (int): Délai entre deux passages
+        
+        Returns:
+            threading.Thread: Le thread démarré
+        """
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, args=(intervalle_secondes,),
+                                        name="rappels-rdv", daemon=True)
+        self._thread.start()
+        return self._thread
+    
+    def arreter(self):
+        """Arrête le thread d'arrière-plan"""
+        self._arret.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+    
+    def _boucle(self, intervalle_secondes):
+        """Boucle du thread : un passage, puis attente jusqu'au suivant ou à l'arrêt"""
+        while not self._arret.is_set():
+            try:
+                self.mettre_en_file_rappels()
+            except Exception as e:
+                print(f"✗ Erreur lors de l'envoi des rappels : {e}")
+            self._arret.wait(intervalle_secondes)
+
+
+def charger_communication(db_name, smtp_host=None, smtp_port=None, starttls=True):
+    """Crée le module de communication à partir de la configuration stockée en base"""
+    email, mot_de_passe, hote, port, tls, sessions, debit_max = \
+        ConfigurationPolyclinique(db_name).parametres_communication()
+    
+    return Communication(
+        email, mot_de_passe,
+        smtp_host or hote,
+        smtp_port or port,
+        starttls and tls,
+        sessions, debit_max
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Envoi des rappels de rendez-vous")
+    parser.add_argument('--db', default="polyclinique.db", help="Base de données")
+    parser.add_argument('--date', help="Date des rendez-vous à rappeler (YYYY-MM-DD), demain par défaut")
+    parser.add_argument('--smtp-host', help="Serveur SMTP (ex. localhost pour un serveur de test)")
+    parser.add_argument('--smtp-port', type=int, help="Port SMTP")
+    parser.add_argument('--sans-tls', action='store_true', help="Ne pas utiliser STARTTLS")
+    parser.add_argument('--expediteur', help="Adresse d'expédition (remplace celle de la configuration)")
+    parser.add_argument('--boucle', type=int, metavar='SECONDES',
+                        help="Tourner en continu avec cet intervalle au lieu d'un passage unique")
+    args = parser.parse_args()
+    
+    comm = charger_communication(args.db, args.smtp_host, args.smtp_port, not args.sans_tls)
+    if args.expediteur:
+        comm.email_expediteur = args.expediteur
+    
+    distributeur = DistributeurNotifications(comm, FileNotifications(args.db))
+    planificateur = PlanificateurRappels(distributeur, args.db)
+    
+    if args.boucle:
+        distributeur.demarrer()
+        planificateur.demarrer(args.boucle)
+        try:
+            planificateur._thread.join()
+        except KeyboardInterrupt:
+            planificateur.arreter()
+            distributeur.arreter()
+    else:
+        planificateur.mettre_en_file_rappels(args.date)
+        nb_envoyes, nb_replanifies, nb_echecs = distributeur.vider()
+        print(f"✓ {nb_envoyes} email(s) envoyé(s), {nb_replanifies} à réessayer, {nb_echecs} en échec définitif")
+        comm.fermer()
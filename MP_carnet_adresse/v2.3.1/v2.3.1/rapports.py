@@ -0,0 +1,191 @@
+import sqlite3
+from datetime import datetime, timedelta
+from migrations import assurer_schema
+
+class RapportsActivite:
+    """Classe gérant les agrégats journaliers d'activité par service et les rapports qui en découlent"""
+    
+    def __init__(self, rdv_manager, db_name="polyclinique.db"):
+        """
+        Initialise les rapports d'activité
+        
+        Args:
+            rdv_manager (RendezVous): Gestion des rendez-vous (places offertes par jour)
+            db_name (str): Nom de la base de données
+        """
+        self.rdv_manager = rdv_manager
+        self.db_name = db_name
+        assurer_schema(self.db_name)
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def mettre_a_jour(self):
+        """
+        Recalcule les agrégats des seuls (service, jour) modifiés depuis le dernier passage
+        
+        Returns:
+            int: Nombre de lignes d'agrégats recalculées
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT valeur FROM rapports_etat WHERE cle = 'watermark'")
+            watermark = cursor.fetchone()[0]
+            
+            cursor.execute("""
+                SELECT DISTINCT service_id, jour FROM journal_rendez_vous WHERE id > ?
+            """, (watermark,))
+            jours = cursor.fetchall()
+            
+            if not jours:
+                conn.rollback()
+                return 0
+            
+            cursor.execute("SELECT MAX(id) FROM journal_rendez_vous")
+            nouveau_watermark = cursor.fetchone()[0]
+            
+            # Comptes de tous les jours touchés en une requête agrégée
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS jours_a_calculer (service_id INTEGER, jour DATE)")
+            cursor.execute("DELETE FROM jours_a_calculer")
+            cursor.executemany("INSERT INTO jours_a_calculer VALUES (?, ?)", jours)
+            cursor.execute("""
+                SELECT j.service_id, j.jour,
+                       COUNT(r.id),
+                       COALESCE(SUM(r.statut = 'en_attente'), 0),
+                       -- Un rendez-vous 'passé' était confirmé : il a occupé sa place
+                       COALESCE(SUM(r.statut IN ('confirmé', 'passé')), 0),
+                       COALESCE(SUM(r.statut = 'annulé'), 0),
+                       COALESCE(SUM(r.statut = 'rejeté'), 0)
+                FROM jours_a_calculer j
+                LEFT JOIN rendez_vous r ON r.service_id = j.service_id AND r.date_rdv = j.jour
+                GROUP BY j.service_id, j.jour
+            """)
+            comptes = cursor.fetchall()
+            
+            # Les places offertes ne sont plus stockées : elles dépendent des horaires et fermetures
+            # du moment, et des jours sans rendez-vous (calculées par obtenir_rapport)
+            cursor.executemany("""
+                INSERT OR REPLACE INTO stats_journalieres
+                (service_id, jour, reserves, en_attente, confirmes, annules, rejetes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, comptes)
+            
+            cursor.execute("UPDATE rapports_etat SET valeur = ? WHERE cle = 'watermark'", (nouveau_watermark,))
+            cursor.execute("DELETE FROM journal_rendez_vous WHERE id <= ?", (nouveau_watermark,))
+            
+            conn.commit()
+            return len(comptes)
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ Erreur lors du calcul des agrégats : {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def _places_par_periode(self, cursor, services_ids, date_debut, date_fin, format_periode):
+        """
+        Places offertes par service et par période : somme des capacités des créneaux
+        de chaque jour ouvert de l'intervalle, d'après le calendrier compilé des horaires
+        et des fermetures (les jours ouverts sans aucun rendez-vous comptent aussi)
+        
+        Returns:
+            dict: {(service_id, periode): places offertes}
+        """
+        # Période de chaque jour calculée une seule fois pour tous les services
+        periodes = {}
+        jour = datetime.strptime(date_debut, "%Y-%m-%d").date()
+        fin = datetime.strptime(date_fin, "%Y-%m-%d").date()
+        while jour <= fin:
+            periodes[jour.strftime("%Y-%m-%d")] = jour.strftime(format_periode)
+            jour += timedelta(days=1)
+        
+        places = {}
+        for service_id in services_ids:
+            par_jour = self.rdv_manager.places_offertes_periode(service_id, date_debut, date_fin, cursor)
+            for jour_str, offertes in par_jour.items():
+                if offertes:
+                    cle = (service_id, periodes[jour_str])
+                    places[cle] = places.get(cle, 0) + offertes
+        return places
+    
+    def obtenir_rapport(self, date_debut, date_fin, service_id=None, granularite="semaine"):
+        """
+        Retourne les indicateurs par service et par période. Les rendez-vous sont lus dans
+        les agrégats ; les places offertes sont celles de tous les jours ouverts de la période,
+        calculées avec les horaires et fermetures en vigueur. Les « confirmés » comptent aussi
+        les rendez-vous au statut 'passé' (confirmés puis honorés) : taux_occupation mesure
+        les places effectivement occupées, pas seulement les confirmations encore à venir.
+        
+        Args:
+            date_debut (str): Premier jour inclus (YYYY-MM-DD)
+            date_fin (str): Dernier jour inclus (YYYY-MM-DD)
+            service_id (int, optional): Limiter à un service
+            granularite (str): 'jour', 'semaine' ou 'mois'
+        
+        Returns:
+            list: Liste de dictionnaires (un par service et par période)
+        """
+        formats = {'jour': '%Y-%m-%d', 'semaine': '%Y-S%W', 'mois': '%Y-%m'}
+        if granularite not in formats:
+            raise ValueError(f"Granularité inconnue : {granularite}")
+        
+        self.mettre_a_jour()
+        self.rdv_manager.horaires.rafraichir_si_modifie()
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        if service_id:
+            cursor.execute("SELECT id, nom, actif FROM services WHERE id = ?", (service_id,))
+        else:
+            cursor.execute("SELECT id, nom, actif FROM services")
+        services = cursor.fetchall()
+        noms = {sid: nom for sid, nom, _ in services}
+        
+        # Dénominateur : services actifs (ou le service demandé), chaque jour de l'intervalle
+        places = self._places_par_periode(
+            cursor, [sid for sid, _, actif in services if actif == 1 or service_id],
+            date_debut, date_fin, formats[granularite])
+        
+        conditions = ["jour BETWEEN ? AND ?"]
+        params = [formats[granularite], date_debut, date_fin]
+        if service_id:
+            conditions.append("service_id = ?")
+            params.append(service_id)
+        
+        cursor.execute(f"""
+            SELECT service_id, strftime(?, jour) AS periode,
+                   SUM(reserves), SUM(en_attente), SUM(confirmes), SUM(annules), SUM(rejetes)
+            FROM stats_journalieres
+            WHERE {' AND '.join(conditions)}
+            GROUP BY service_id, periode
+        """, params)
+        comptes = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+        conn.close()
+        
+        rapport = []
+        for cle in sorted(comptes.keys() | places.keys(), key=lambda c: (c[1], noms.get(c[0], ''))):
+            if cle[0] not in noms:
+                continue
+            reserves, en_attente, confirmes, annules, rejetes = comptes.get(cle, (0, 0, 0, 0, 0))
+            offertes = places.get(cle, 0)
+            rapport.append({
+                'service_id': cle[0],
+                'service_nom': noms[cle[0]],
+                'periode': cle[1],
+                'reserves': reserves,
+                'en_attente': en_attente,
+                'confirmes': confirmes,
+                'annules': annules,
+                'rejetes': rejetes,
+                'places_offertes': offertes,
+                'taux_occupation': round(confirmes / offertes, 4) if offertes else None,
+                'taux_annulation': round(annules / reserves, 4) if reserves else None,
+                'taux_rejet': round(rejetes / reserves, 4) if reserves else None
+            })
+        
+        return rapport
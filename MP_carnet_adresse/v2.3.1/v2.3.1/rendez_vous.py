@@ -1,151 +1,122 @@
 import sqlite3
 from datetime import datetime, timedelta
+from liste_attente import ListeAttente
+from horaires import HorairesServices
+from evenements import BusEvenements
+from normalisation import normaliser_email, normaliser_telephone
+from migrations import assurer_schema
 
 class RendezVous:
     """Classe gérant les rendez-vous de la polyclinique"""
     
-    def __init__(self, db_name="polyclinique.db"):
+    # Statuts qui occupent une place dans un créneau (les rendez-vous annulés ou rejetés la libèrent)
+    STATUTS_OCCUPANTS = ('en_attente', 'confirmé')
+    _PLACEHOLDERS_OCCUPANTS = ', '.join('?' * len(STATUTS_OCCUPANTS))
+    
+    # Raisons d'échec d'une prise de rendez-vous (seul un créneau complet ouvre la liste d'attente)
+    RAISON_FERME = "ferme"
+    RAISON_COMPLET = "complet"
+    RAISON_ERREUR = "erreur"
+    
+    # Colonnes lues explicitement : les colonnes ajoutées par migration ne décalent pas les index
+    _COLONNES_RDV = """r.id, r.service_id, r.patient_nom, r.patient_prenom, r.patient_telephone,
+                       r.patient_email, r.date_rdv, r.heure_debut, r.heure_fin, r.motif, r.statut,
+                       r.cree_par, r.valide_par, r.date_validation, r.commentaire_validation,
+                       r.date_creation, r.serie_id, r.patient_cle_email, r.patient_cle_telephone,
+                       r.contact_id"""
+    _CLES_RDV = ('id', 'service_id', 'patient_nom', 'patient_prenom', 'patient_telephone',
+                 'patient_email', 'date_rdv', 'heure_debut', 'heure_fin', 'motif', 'statut',
+                 'cree_par', 'valide_par', 'date_validation', 'commentaire_validation',
+                 'date_creation', 'serie_id', 'patient_cle_email', 'patient_cle_telephone',
+                 'contact_id')
+    
+    # Rendez-vous promu depuis la liste d'attente pour un patient sans email : aucune notification
+    # n'a pu partir, le personnel doit le prévenir par téléphone
+    _COLONNE_A_APPELER = """(COALESCE(TRIM(r.patient_email), '') = ''
+                            AND EXISTS (SELECT 1 FROM liste_attente l WHERE l.rdv_id = r.id)) as a_appeler"""
+    
+    def __init__(self, db_name="polyclinique.db", bus=None):
         """
         Initialise la gestion des rendez-vous
         
         Args:
             db_name (str): Nom de la base de données
+            bus (BusEvenements): Bus sur lequel publier les changements d'agenda (optionnel)
         """
         self.db_name = db_name
-        self.creer_table_rendez_vous()
+        self.bus = bus
+        assurer_schema(self.db_name)
+        self.horaires = HorairesServices(db_name)
+        self.liste_attente = ListeAttente(db_name, self.horaires)
     
     def creer_connexion(self):
         """Crée une connexion à la base de données"""
         return sqlite3.connect(self.db_name)
     
-    def creer_table_rendez_vous(self):
-        """Crée la table des rendez-vous"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rendez_vous (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                service_id INTEGER NOT NULL,
-                patient_nom TEXT NOT NULL,
-                patient_prenom TEXT NOT NULL,
-                patient_telephone TEXT NOT NULL,
-                patient_email TEXT,
-                date_rdv DATE NOT NULL,
-                heure_debut TIME NOT NULL,
-                heure_fin TIME NOT NULL,
-                motif TEXT,
-                statut TEXT DEFAULT 'en_attente',
-                cree_par INTEGER,
-                valide_par INTEGER,
-                date_validation TIMESTAMP,
-                commentaire_validation TEXT,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (service_id) REFERENCES services(id),
-                FOREIGN KEY (cree_par) REFERENCES admins(id),
-                FOREIGN KEY (valide_par) REFERENCES admins(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✓ Table rendez_vous initialisée")
-        
-        # Migrer les anciens rendez-vous si nécessaire
-        self._migrer_statuts_rendez_vous()
-        
-        # Supprimer la contrainte UNIQUE si elle existe
-        self._supprimer_contrainte_unique()
+    # ==================== ÉVÉNEMENTS EN DIRECT ====================
     
-    def _supprimer_contrainte_unique(self):
-        """Supprime la contrainte UNIQUE sur (service_id, date_rdv, heure_debut) si elle existe"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        try:
-            # Vérifier si la contrainte UNIQUE existe
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='rendez_vous'")
-            result = cursor.fetchone()
-            
-            if result and 'UNIQUE(service_id, date_rdv, heure_debut)' in result[0]:
-                print("🔄 Suppression de la contrainte UNIQUE sur rendez_vous...")
-                
-                # SQLite ne permet pas de supprimer une contrainte directement, il faut recréer la table
-                cursor.execute("ALTER TABLE rendez_vous RENAME TO rendez_vous_old")
-                
-                # Créer la nouvelle table sans la contrainte UNIQUE
-                cursor.execute('''
-                    CREATE TABLE rendez_vous (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        service_id INTEGER NOT NULL,
-                        patient_nom TEXT NOT NULL,
-                        patient_prenom TEXT NOT NULL,
-                        patient_telephone TEXT NOT NULL,
-                        patient_email TEXT,
-                        date_rdv DATE NOT NULL,
-                        heure_debut TIME NOT NULL,
-                        heure_fin TIME NOT NULL,
-                        motif TEXT,
-                        statut TEXT DEFAULT 'en_attente',
-                        cree_par INTEGER,
-                        valide_par INTEGER,
-                        date_validation TIMESTAMP,
-                        commentaire_validation TEXT,
-                        date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (service_id) REFERENCES services(id),
-                        FOREIGN KEY (cree_par) REFERENCES admins(id),
-                        FOREIGN KEY (valide_par) REFERENCES admins(id)
-                    )
-                ''')
-                
-                # Copier les données
-                cursor.execute('''
-                    INSERT INTO rendez_vous 
-                    (id, service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
-                     date_rdv, heure_debut, heure_fin, motif, statut, cree_par, 
-                     valide_par, date_validation, commentaire_validation, date_creation)
-                    SELECT id, service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
-                     date_rdv, heure_debut, heure_fin, motif, statut, cree_par, 
-                     valide_par, date_validation, commentaire_validation, date_creation
-                    FROM rendez_vous_old
-                ''')
-                
-                # Supprimer l'ancienne table
-                cursor.execute("DROP TABLE rendez_vous_old")
-                
-                conn.commit()
-                print("✓ Contrainte UNIQUE supprimée avec succès")
-            
-        except Exception as e:
-            print(f"⚠️ Note lors de la suppression de la contrainte: {e}")
-        finally:
-            conn.close()
+    def _noter_creneau(self, evenements, cursor, type_evenement, service_id, date_rdv, heure_debut):
+        """Note un changement de créneau, avec les places restantes vues par la transaction en cours"""
+        if self.bus is None:
+            return
+        evenements.append((type_evenement, {
+            'service_id': service_id,
+            'date_rdv': date_rdv,
+            'heure_debut': heure_debut,
+            'places_restantes': self._places_restantes(cursor, service_id, date_rdv, heure_debut)
+        }))
     
-    def _migrer_statuts_rendez_vous(self):
-        """Met à jour les statuts des anciens rendez-vous"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
+    def _noter_rdv(self, evenements, type_evenement, rdv_id, service_id, date_rdv, heure_debut):
+        """Note l'arrivée ou la sortie d'un rendez-vous de la file de validation"""
+        if self.bus is None:
+            return
+        evenements.append((type_evenement, {
+            'rdv_id': rdv_id,
+            'service_id': service_id,
+            'date_rdv': date_rdv,
+            'heure_debut': heure_debut
+        }))
+    
+    def _publier(self, evenements):
+        """Publie les événements notés, une fois la transaction validée"""
+        if self.bus is None:
+            return
+        for type_evenement, donnees in evenements:
+            self.bus.publier(type_evenement, donnees)
+    
+    @staticmethod
+    def _identite_patient(cursor, patient_email, patient_telephone):
+        """
+        Clés normalisées du patient et contact correspondant du carnet d'adresses
+        
+        Returns:
+            tuple: (cle_email: str, cle_telephone: str, contact_id: int or None)
+        """
+        cle_email = normaliser_email(patient_email)
+        cle_telephone = normaliser_telephone(patient_telephone)
         
+        contact_id = None
         try:
-            # Vérifier s'il y a des rendez-vous avec statut 'confirmé' à migrer
-            cursor.execute("SELECT COUNT(*) FROM rendez_vous WHERE statut = 'confirmé'")
-            count = cursor.fetchone()[0]
-            
-            if count > 0:
-                print(f"🔄 Migration des statuts de rendez-vous ({count} rendez-vous trouvés)")
-                # Les anciens rendez-vous confirmés restent confirmés
-                # Les nouveaux seront 'en_attente' par défaut
-                print("✓ Migration des statuts terminée")
-            
-            conn.commit()
-        except Exception as e:
-            print(f"⚠️ Note: {e}")
-        finally:
-            conn.close()
+            if cle_email:
+                # Recherche sur l'index UNIQUE de contacts.email (saisie d'origine ou minuscules)
+                cursor.execute("SELECT id FROM contacts WHERE email IN (?, ?) LIMIT 1",
+                               ((patient_email or '').strip(), cle_email))
+                row = cursor.fetchone()
+                contact_id = row[0] if row else None
+            if contact_id is None and cle_telephone:
+                # Sinon sur l'index UNIQUE du téléphone canonique (même format E.164)
+                cursor.execute("SELECT id FROM contacts WHERE telephone_canonique = ?", (cle_telephone,))
+                row = cursor.fetchone()
+                contact_id = row[0] if row else None
+        except sqlite3.OperationalError:
+            pass  # Pas de carnet d'adresses dans cette base
+        
+        return (cle_email, cle_telephone, contact_id)
     
     def generer_creneaux(self, date, horaire_debut="08:00", horaire_fin="18:00", duree_minutes=30):
         """
-        Génère tous les créneaux horaires pour une journée
+        Génère tous les créneaux horaires d'une plage d'ouverture
+        (les créneaux réellement ouverts d'un jour viennent de self.horaires.creneaux_du_jour)
         
         Args:
             date (str): Date au format YYYY-MM-DD
@@ -156,47 +127,179 @@ class RendezVous:
         Returns:
             list: Liste des créneaux [(heure_debut, heure_fin), ...]
         """
-        creneaux = []
+        return HorairesServices.decouper(horaire_debut, horaire_fin, duree_minutes)
+    
+    def _capacite_creneau(self, cursor, service_id, heure_debut):
+        """
+        Retourne la capacité d'un créneau : plage horaire spécifique si elle existe,
+        sinon capacité par défaut du service (1 si le service est inconnu)
+        """
+        cursor.execute("""
+            SELECT COALESCE(
+                (SELECT capacite FROM capacites_services
+                 WHERE service_id = ? AND heure_debut <= ? AND ? < heure_fin
+                 LIMIT 1),
+                (SELECT capacite FROM services WHERE id = ?),
+                1)
+        """, (service_id, heure_debut, heure_debut, service_id))
+        return cursor.fetchone()[0]
+    
+    def _charger_capacites(self, cursor, service_id):
+        """
+        Charge en une requête la capacité par défaut et les plages d'un service
+        
+        Returns:
+            tuple: (capacite_defaut: int, plages: [(heure_debut, heure_fin, capacite), ...])
+        """
+        cursor.execute("""
+            SELECT s.capacite, p.heure_debut, p.heure_fin, p.capacite
+            FROM services s
+            LEFT JOIN capacites_services p ON p.service_id = s.id
+            WHERE s.id = ?
+            ORDER BY p.heure_debut
+        """, (service_id,))
+        rows = cursor.fetchall()
         
-        # Convertir les heures en datetime
-        debut = datetime.strptime(horaire_debut, "%H:%M")
-        fin = datetime.strptime(horaire_fin, "%H:%M")
+        if not rows:
+            return (1, [])
+        
+        capacite_defaut = rows[0][0]
+        plages = [(row[1], row[2], row[3]) for row in rows if row[1] is not None]
+        return (capacite_defaut, plages)
+    
+    @staticmethod
+    def _capacite_pour_heure(capacite_defaut, plages, heure_debut):
+        """Capacité applicable à un créneau à partir des plages déjà chargées"""
+        for debut, fin, capacite in plages:
+            if debut <= heure_debut < fin:
+                return capacite
+        return capacite_defaut
+    
+    def places_offertes_periode(self, service_id, date_debut, date_fin, cursor=None):
+        """
+        Retourne les places offertes chaque jour d'un intervalle : somme des capacités des créneaux
+        ouverts du service d'après le calendrier compilé (zéro un jour de fermeture)
         
-        current = debut
-        while current < fin:
-            heure_debut = current.strftime("%H:%M")
-            current += timedelta(minutes=duree_minutes)
-            heure_fin = current.strftime("%H:%M")
+        Args:
+            service_id (int): ID du service
+            date_debut (str): Premier jour inclus (YYYY-MM-DD)
+            date_fin (str): Dernier jour inclus (YYYY-MM-DD)
+            cursor: Curseur d'une transaction en cours (optionnel, sinon connexion propre)
             
-            if current <= fin:
-                creneaux.append((heure_debut, heure_fin))
+        Returns:
+            dict: {date (YYYY-MM-DD): places offertes}
+        """
+        conn = None
+        if cursor is None:
+            conn = self.creer_connexion()
+            cursor = conn.cursor()
+        capacite_defaut, plages = self._charger_capacites(cursor, service_id)
+        if conn is not None:
+            conn.close()
         
-        return creneaux
+        # Les jours d'un même modèle (jour de la semaine, fermeture) ont les mêmes créneaux :
+        # leur somme n'est calculée qu'une fois
+        par_modele = {}
+        places = {}
+        jour = datetime.strptime(date_debut, "%Y-%m-%d").date()
+        fin = datetime.strptime(date_fin, "%Y-%m-%d").date()
+        while jour <= fin:
+            jour_str = jour.strftime("%Y-%m-%d")
+            creneaux = tuple(self.horaires.creneaux_du_jour(service_id, jour_str))
+            if creneaux not in par_modele:
+                par_modele[creneaux] = sum(self._capacite_pour_heure(capacite_defaut, plages, debut)
+                                           for debut, _ in creneaux)
+            places[jour_str] = par_modele[creneaux]
+            jour += timedelta(days=1)
+        return places
     
-    def verifier_disponibilite(self, service_id, date, heure_debut):
+    def places_offertes_jour(self, service_id, date, cursor=None):
         """
-        Vérifie si un créneau est disponible
+        Retourne les places offertes par un service sur une journée (zéro s'il est fermé)
         
         Args:
             service_id (int): ID du service
             date (str): Date (YYYY-MM-DD)
-            heure_debut (str): Heure de début (HH:MM)
+            cursor: Curseur d'une transaction en cours (optionnel, sinon connexion propre)
             
         Returns:
-            bool: True si disponible, False sinon
+            int: Somme des capacités des créneaux ouverts ce jour-là
+        """
+        return self.places_offertes_periode(service_id, date, date, cursor).get(date, 0)
+    
+    def _places_restantes(self, cursor, service_id, date, heure_debut):
+        """Places restantes sur un créneau, calculées en une seule requête agrégée"""
+        cursor.execute(f"""
+            SELECT COALESCE(
+                (SELECT capacite FROM capacites_services
+                 WHERE service_id = ? AND heure_debut <= ? AND ? < heure_fin
+                 LIMIT 1),
+                (SELECT capacite FROM services WHERE id = ?),
+                1)
+              - (SELECT COUNT(*) FROM rendez_vous
+                 WHERE service_id = ? AND date_rdv = ? AND heure_debut = ?
+                 AND statut IN ({self._PLACEHOLDERS_OCCUPANTS}))
+        """, (service_id, heure_debut, heure_debut, service_id,
+              service_id, date, heure_debut, *self.STATUTS_OCCUPANTS))
+        return max(cursor.fetchone()[0], 0)
+    
+    def obtenir_occupation_creneaux(self, service_id, date):
+        """
+        Retourne le nombre de rendez-vous occupant chaque créneau d'une journée
+        
+        Args:
+            service_id (int): ID du service
+            date (str): Date (YYYY-MM-DD)
+            
+        Returns:
+            dict: {heure_debut: nombre de rendez-vous en attente ou confirmés}
         """
         conn = self.creer_connexion()
         cursor = conn.cursor()
+        occupation = self._occupation_creneaux(cursor, service_id, date)
+        conn.close()
+        return occupation
+    
+    def _occupation_creneaux(self, cursor, service_id, date):
+        """Occupation par créneau avec une seule requête GROUP BY"""
+        cursor.execute(f"""
+            SELECT heure_debut, COUNT(*) FROM rendez_vous
+            WHERE service_id = ? AND date_rdv = ? AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+            GROUP BY heure_debut
+        """, (service_id, date, *self.STATUTS_OCCUPANTS))
+        return dict(cursor.fetchall())
+    
+    def places_restantes(self, service_id, date, heure_debut):
+        """
+        Retourne le nombre de places encore libres sur un créneau
         
-        cursor.execute(
-            "SELECT COUNT(*) FROM rendez_vous WHERE service_id = ? AND date_rdv = ? AND heure_debut = ? AND statut != 'annulé'",
-            (service_id, date, heure_debut)
-        )
-        
-        count = cursor.fetchone()[0]
+        Args:
+            service_id (int): ID du service
+            date (str): Date (YYYY-MM-DD)
+            heure_debut (str): Heure de début (HH:MM)
+            
+        Returns:
+            int: Places restantes (0 si le créneau est complet)
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        restantes = self._places_restantes(cursor, service_id, date, heure_debut)
         conn.close()
+        return restantes
+    
+    def verifier_disponibilite(self, service_id, date, heure_debut):
+        """
+        Vérifie si un créneau est disponible (au moins une place libre)
         
-        return count == 0
+        Args:
+            service_id (int): ID du service
+            date (str): Date (YYYY-MM-DD)
+            heure_debut (str): Heure de début (HH:MM)
+            
+        Returns:
+            bool: True si disponible, False sinon
+        """
+        return self.places_restantes(service_id, date, heure_debut) > 0
     
     def prendre_rendez_vous(self, service_id, patient_nom, patient_prenom, patient_telephone, 
                            date_rdv, heure_debut, heure_fin, motif="", patient_email="", cree_par=None):
@@ -216,141 +319,522 @@ class RendezVous:
             cree_par (int): ID de l'admin qui crée le RDV
             
         Returns:
-            tuple: (success: bool, message: str, rdv_id: int or None)
+            tuple: (success: bool, message: str, rdv_id: int or None, raison: str or None)
+                   raison : RAISON_FERME, RAISON_COMPLET ou RAISON_ERREUR en cas d'échec
         """
-        # Vérifier disponibilité
-        if not self.verifier_disponibilite(service_id, date_rdv, heure_debut):
-            return (False, "Ce créneau est déjà réservé !", None)
+        if not self.horaires.est_ouvert(service_id, date_rdv, heure_debut):
+            return (False, "Le service est fermé à cette date ou à cette heure.", None, self.RAISON_FERME)
         
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
         try:
+            # Vérification de la capacité et insertion dans la même transaction
+            cursor.execute("BEGIN IMMEDIATE")
+            if self._places_restantes(cursor, service_id, date_rdv, heure_debut) <= 0:
+                conn.rollback()
+                conn.close()
+                return (False, "Ce créneau est déjà réservé !", None, self.RAISON_COMPLET)
+            
             cursor.execute("""
                 INSERT INTO rendez_vous 
                 (service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
-                 date_rdv, heure_debut, heure_fin, motif, cree_par)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 date_rdv, heure_debut, heure_fin, motif, cree_par,
+                 patient_cle_email, patient_cle_telephone, contact_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (service_id, patient_nom.upper(), patient_prenom.upper(), patient_telephone, 
-                  patient_email, date_rdv, heure_debut, heure_fin, motif, cree_par))
+                  patient_email, date_rdv, heure_debut, heure_fin, motif, cree_par,
+                  *self._identite_patient(cursor, patient_email, patient_telephone)))
             
             rdv_id = cursor.lastrowid
+            evenements = []
+            self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_PRIS, service_id, date_rdv, heure_debut)
+            self._noter_rdv(evenements, BusEvenements.RDV_EN_ATTENTE, rdv_id, service_id, date_rdv, heure_debut)
             conn.commit()
             conn.close()
+            self._publier(evenements)
             
-            return (True, f"Rendez-vous confirmé pour le {date_rdv} à {heure_debut}", rdv_id)
+            return (True, f"Rendez-vous confirmé pour le {date_rdv} à {heure_debut}", rdv_id, None)
         except Exception as e:
+            conn.rollback()
             conn.close()
+            return (False, f"Erreur : {str(e)}", None, self.RAISON_ERREUR)
+    
+    # ==================== SÉRIES RÉCURRENTES ====================
+    
+    FREQUENCE_HEBDOMADAIRE = "hebdomadaire"
+    FREQUENCE_JOURS = "jours"
+    MAX_OCCURRENCES = 104  # Deux ans de suivi hebdomadaire
+    
+    @classmethod
+    def generer_occurrences(cls, date_debut, frequence=FREQUENCE_HEBDOMADAIRE, intervalle=1,
+                            jusqu_au=None, nombre=None):
+        """
+        Développe une règle de récurrence en liste de dates (en mémoire, sans accès à la base)
+        
+        Args:
+            date_debut (str): Date de la première occurrence (YYYY-MM-DD)
+            frequence (str): 'hebdomadaire' (toutes les N semaines) ou 'jours' (tous les N jours)
+            intervalle (int): N
+            jusqu_au (str): Date limite incluse (YYYY-MM-DD), optionnelle
+            nombre (int): Nombre d'occurrences, optionnel
+            
+        Returns:
+            list: Dates des occurrences (YYYY-MM-DD)
+        """
+        if frequence not in (cls.FREQUENCE_HEBDOMADAIRE, cls.FREQUENCE_JOURS):
+            raise ValueError(f"Fréquence inconnue : {frequence}")
+        if int(intervalle) < 1:
+            raise ValueError("L'intervalle doit être d'au moins 1")
+        if not jusqu_au and not nombre:
+            raise ValueError("Indiquez une date de fin ou un nombre d'occurrences")
+        
+        pas = timedelta(days=int(intervalle) * (7 if frequence == cls.FREQUENCE_HEBDOMADAIRE else 1))
+        courante = datetime.strptime(date_debut, "%Y-%m-%d").date()
+        fin = datetime.strptime(jusqu_au, "%Y-%m-%d").date() if jusqu_au else None
+        limite = min(int(nombre), cls.MAX_OCCURRENCES) if nombre else cls.MAX_OCCURRENCES
+        
+        dates = []
+        while len(dates) < limite and (fin is None or courante <= fin):
+            dates.append(courante.strftime("%Y-%m-%d"))
+            courante += pas
+        
+        return dates
+    
+    def _dates_completes(self, cursor, service_id, dates, heure_debut, exclure_serie_id=None):
+        """
+        Retourne les dates où le créneau est complet, pour toutes les occurrences en une requête
+        
+        Args:
+            exclure_serie_id (int): Ne pas compter les rendez-vous de cette série (déplacement d'une série)
+        """
+        capacite = self._capacite_creneau(cursor, service_id, heure_debut)
+        placeholders_dates = ', '.join('?' * len(dates))
+        
+        cursor.execute(f"""
+            SELECT date_rdv, COUNT(*) FROM rendez_vous
+            WHERE service_id = ? AND heure_debut = ? AND date_rdv IN ({placeholders_dates})
+              AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+              AND (? IS NULL OR serie_id IS NULL OR serie_id != ?)
+            GROUP BY date_rdv
+        """, (service_id, heure_debut, *dates, *self.STATUTS_OCCUPANTS, exclure_serie_id, exclure_serie_id))
+        
+        return sorted(d for d, occupes in cursor.fetchall() if occupes >= capacite)
+    
+    def prendre_serie_rendez_vous(self, service_id, patient_nom, patient_prenom, patient_telephone,
+                                  date_debut, heure_debut, heure_fin, frequence=FREQUENCE_HEBDOMADAIRE,
+                                  intervalle=1, jusqu_au=None, nombre=None, motif="", patient_email="",
+                                  cree_par=None, ignorer_conflits=False):
+        """
+        Réserve une série de rendez-vous récurrents de façon atomique
+        
+        Args:
+            service_id (int): ID du service
+            patient_nom, patient_prenom, patient_telephone (str): Identité du patient
+            date_debut (str): Première date (YYYY-MM-DD)
+            heure_debut, heure_fin (str): Créneau de chaque occurrence (HH:MM)
+            frequence (str): 'hebdomadaire' ou 'jours'
+            intervalle (int): Toutes les N semaines / N jours
+            jusqu_au (str): Date de fin incluse (optionnelle)
+            nombre (int): Nombre d'occurrences (optionnel)
+            motif (str): Motif de consultation
+            patient_email (str): Email (optionnel)
+            cree_par (int): ID de l'utilisateur qui crée la série
+            ignorer_conflits (bool): Si True, réserve seulement les dates disponibles
+                                     au lieu de refuser toute la série
+            
+        Returns:
+            tuple: (success: bool, message: str, serie_id: int or None)
+        """
+        try:
+            dates = self.generer_occurrences(date_debut, frequence, intervalle, jusqu_au, nombre)
+        except ValueError as e:
+            return (False, f"Récurrence invalide : {e}", None)
+        
+        if not dates:
+            return (False, "La récurrence ne produit aucune date.", None)
+        
+        # Jours de fermeture (jours fériés, jours sans consultation) : lus dans le calendrier compilé
+        fermees = [d for d in dates if not self.horaires.est_ouvert(service_id, d, heure_debut)]
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            completes = self._dates_completes(cursor, service_id, dates, heure_debut)
+            if (completes or fermees) and not ignorer_conflits:
+                conn.rollback()
+                conflits = [f"créneau complet le(s) {', '.join(completes)}"] if completes else []
+                if fermees:
+                    conflits.append(f"service fermé le(s) {', '.join(fermees)}")
+                return (False, f"Série impossible : {' ; '.join(conflits)}. Aucun rendez-vous n'a été créé.", None)
+            completes = sorted(set(completes) | set(fermees))
+            
+            dates_libres = [d for d in dates if d not in set(completes)]
+            if not dates_libres:
+                conn.rollback()
+                return (False, "Aucune date de la série n'est disponible.", None)
+            
+            cursor.execute("""
+                INSERT INTO series_rendez_vous
+                (service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
+                 heure_debut, heure_fin, motif, frequence, intervalle, date_debut, date_fin,
+                 nombre_occurrences, cree_par)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (service_id, patient_nom.upper(), patient_prenom.upper(), patient_telephone, patient_email,
+                  heure_debut, heure_fin, motif, frequence, int(intervalle), date_debut, jusqu_au,
+                  int(nombre) if nombre else None, cree_par))
+            serie_id = cursor.lastrowid
+            
+            identite = self._identite_patient(cursor, patient_email, patient_telephone)
+            cursor.executemany("""
+                INSERT INTO rendez_vous 
+                (service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
+                 date_rdv, heure_debut, heure_fin, motif, cree_par, serie_id,
+                 patient_cle_email, patient_cle_telephone, contact_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(service_id, patient_nom.upper(), patient_prenom.upper(), patient_telephone,
+                   patient_email, d, heure_debut, heure_fin, motif, cree_par, serie_id, *identite)
+                  for d in dates_libres])
+            
+            evenements = []
+            if self.bus is not None:
+                cursor.execute("SELECT id, date_rdv FROM rendez_vous WHERE serie_id = ?", (serie_id,))
+                for rdv_id, d in cursor.fetchall():
+                    self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_PRIS, service_id, d, heure_debut)
+                    self._noter_rdv(evenements, BusEvenements.RDV_EN_ATTENTE, rdv_id, service_id, d, heure_debut)
+            
+            conn.commit()
+            self._publier(evenements)
+            
+            message = f"Série de {len(dates_libres)} rendez-vous créée ({dates_libres[0]} → {dates_libres[-1]} à {heure_debut})"
+            if completes:
+                message += f". Dates ignorées (complètes ou fermées) : {', '.join(completes)}"
+            return (True, message, serie_id)
+        except Exception as e:
+            conn.rollback()
             return (False, f"Erreur : {str(e)}", None)
+        finally:
+            conn.close()
     
-    def obtenir_creneaux_disponibles(self, service_id, date, horaire_debut="08:00", horaire_fin="18:00"):
+    def obtenir_serie(self, serie_id):
+        """Retourne la règle d'une série et ses rendez-vous"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, service_id, patient_nom, patient_prenom, patient_telephone, patient_email,
+                   heure_debut, heure_fin, motif, frequence, intervalle, date_debut, date_fin,
+                   nombre_occurrences, cree_par
+            FROM series_rendez_vous WHERE id = ?
+        """, (serie_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            conn.close()
+            return None
+        
+        serie = dict(zip(('id', 'service_id', 'patient_nom', 'patient_prenom', 'patient_telephone',
+                          'patient_email', 'heure_debut', 'heure_fin', 'motif', 'frequence',
+                          'intervalle', 'date_debut', 'date_fin', 'nombre_occurrences', 'cree_par'), row))
+        
+        cursor.execute(f"""
+            SELECT {self._COLONNES_RDV} FROM rendez_vous r
+            WHERE r.serie_id = ?
+            ORDER BY r.date_rdv
+        """, (serie_id,))
+        serie['rendez_vous'] = self._lignes_vers_dicts(cursor.fetchall())
+        
+        conn.close()
+        return serie
+    
+    def annuler_serie(self, serie_id, a_partir_de=None):
+        """
+        Annule les rendez-vous restants d'une série (par défaut ceux à partir d'aujourd'hui).
+        Chaque place libérée est proposée à la liste d'attente dans la même transaction.
+        
+        Args:
+            serie_id (int): ID de la série
+            a_partir_de (str): Date (YYYY-MM-DD) à partir de laquelle annuler
+            
+        Returns:
+            int: Nombre de rendez-vous annulés
+        """
+        a_partir_de = a_partir_de or datetime.now().strftime("%Y-%m-%d")
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT id, service_id, date_rdv, heure_debut, heure_fin, statut FROM rendez_vous
+                WHERE serie_id = ? AND date_rdv >= ? AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+            """, (serie_id, a_partir_de, *self.STATUTS_OCCUPANTS))
+            liberes = cursor.fetchall()
+            
+            cursor.execute(f"""
+                UPDATE rendez_vous SET statut = 'annulé'
+                WHERE serie_id = ? AND date_rdv >= ? AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+            """, (serie_id, a_partir_de, *self.STATUTS_OCCUPANTS))
+            nb_annules = cursor.rowcount
+            
+            evenements = []
+            for rdv_id, service_id, date_rdv, heure_debut, heure_fin, ancien_statut in liberes:
+                if ancien_statut == 'en_attente':
+                    self._noter_rdv(evenements, BusEvenements.RDV_TRAITE, rdv_id, service_id, date_rdv, heure_debut)
+                self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_LIBERE, service_id, date_rdv, heure_debut)
+                self._promouvoir_liste_attente(cursor, service_id, date_rdv, heure_debut, heure_fin, evenements)
+            
+            conn.commit()
+            self._publier(evenements)
+            return nb_annules
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ Erreur lors de l'annulation de la série : {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def modifier_serie(self, serie_id, heure_debut=None, heure_fin=None, motif=None, a_partir_de=None):
         """
-        Retourne tous les créneaux disponibles pour un service et une date
+        Modifie les rendez-vous restants d'une série (nouvel horaire et/ou motif).
+        La disponibilité de toutes les occurrences déplacées est vérifiée en une requête
+        et la modification est atomique : soit toutes les occurrences bougent, soit aucune.
         
+        Args:
+            serie_id (int): ID de la série
+            heure_debut (str): Nouvelle heure de début (HH:MM), optionnelle
+            heure_fin (str): Nouvelle heure de fin (HH:MM), optionnelle
+            motif (str): Nouveau motif, optionnel
+            a_partir_de (str): Date (YYYY-MM-DD) à partir de laquelle modifier
+            
         Returns:
-            list: Liste de tuples (heure_debut, heure_fin, disponible)
+            tuple: (success: bool, message: str)
         """
-        tous_creneaux = self.generer_creneaux(date, horaire_debut, horaire_fin)
+        a_partir_de = a_partir_de or datetime.now().strftime("%Y-%m-%d")
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT service_id, date_rdv, heure_debut, heure_fin FROM rendez_vous
+                WHERE serie_id = ? AND date_rdv >= ? AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+                ORDER BY date_rdv
+            """, (serie_id, a_partir_de, *self.STATUTS_OCCUPANTS))
+            occurrences = cursor.fetchall()
+            
+            if not occurrences:
+                conn.rollback()
+                return (False, "Aucun rendez-vous à modifier dans cette série.")
+            
+            service_id, _, ancienne_heure, ancienne_fin = occurrences[0]
+            deplacement = heure_debut is not None and heure_debut != ancienne_heure
+            
+            if deplacement:
+                if heure_fin is None:
+                    duree = (datetime.strptime(ancienne_fin, "%H:%M") - datetime.strptime(ancienne_heure, "%H:%M"))
+                    heure_fin = (datetime.strptime(heure_debut, "%H:%M") + duree).strftime("%H:%M")
+                
+                dates = [occ[1] for occ in occurrences]
+                fermees = [d for d in dates if not self.horaires.est_ouvert(service_id, d, heure_debut)]
+                if fermees:
+                    conn.rollback()
+                    return (False, f"Le service est fermé à {heure_debut} le(s) : {', '.join(fermees)}. Série inchangée.")
+                completes = self._dates_completes(cursor, service_id, dates, heure_debut, exclure_serie_id=serie_id)
+                if completes:
+                    conn.rollback()
+                    return (False, f"Nouveau créneau complet le(s) : {', '.join(completes)}. Série inchangée.")
+            
+            updates = []
+            params = []
+            if heure_debut is not None:
+                updates.append("heure_debut = ?")
+                params.append(heure_debut)
+            if heure_fin is not None:
+                updates.append("heure_fin = ?")
+                params.append(heure_fin)
+            if motif is not None:
+                updates.append("motif = ?")
+                params.append(motif)
+            
+            if not updates:
+                conn.rollback()
+                return (True, "Aucune modification à effectuer.")
+            
+            cursor.execute(f"""
+                UPDATE rendez_vous SET {', '.join(updates)}
+                WHERE serie_id = ? AND date_rdv >= ? AND statut IN ({self._PLACEHOLDERS_OCCUPANTS})
+            """, (*params, serie_id, a_partir_de, *self.STATUTS_OCCUPANTS))
+            nb_modifies = cursor.rowcount
+            
+            cursor.execute(f"UPDATE series_rendez_vous SET {', '.join(updates)} WHERE id = ?", (*params, serie_id))
+            
+            # Les anciens créneaux libérés profitent à la liste d'attente
+            evenements = []
+            if deplacement:
+                for occ_service_id, date_rdv, occ_heure, occ_fin in occurrences:
+                    self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_PRIS, occ_service_id, date_rdv, heure_debut)
+                    self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_LIBERE, occ_service_id, date_rdv, occ_heure)
+                    self._promouvoir_liste_attente(cursor, occ_service_id, date_rdv, occ_heure, occ_fin, evenements)
+            
+            conn.commit()
+            self._publier(evenements)
+            return (True, f"{nb_modifies} rendez-vous de la série modifié(s).")
+        except Exception as e:
+            conn.rollback()
+            return (False, f"Erreur : {str(e)}")
+        finally:
+            conn.close()
+    
+    def obtenir_creneaux_disponibles(self, service_id, date):
+        """
+        Retourne les créneaux ouverts avec leur disponibilité pour un service et une date.
+        Les créneaux viennent du calendrier compilé des horaires (vide un jour de fermeture) ;
+        l'occupation de toute la journée est lue en une seule requête agrégée.
+        
+        Returns:
+            list: Liste de tuples (heure_debut, heure_fin, disponible, places_restantes)
+        """
+        tous_creneaux = self.horaires.creneaux_du_jour(service_id, date)
+        if not tous_creneaux:
+            return []
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        capacite_defaut, plages = self._charger_capacites(cursor, service_id)
+        occupation = self._occupation_creneaux(cursor, service_id, date)
+        conn.close()
         
         creneaux_avec_dispo = []
         for heure_debut, heure_fin in tous_creneaux:
-            disponible = self.verifier_disponibilite(service_id, date, heure_debut)
-            creneaux_avec_dispo.append((heure_debut, heure_fin, disponible))
+            capacite = self._capacite_pour_heure(capacite_defaut, plages, heure_debut)
+            restantes = max(capacite - occupation.get(heure_debut, 0), 0)
+            creneaux_avec_dispo.append((heure_debut, heure_fin, restantes > 0, restantes))
         
         return creneaux_avec_dispo
     
+    def _lignes_vers_dicts(self, rows, cles_supplementaires=()):
+        """Convertit des lignes lues avec _COLONNES_RDV (+ colonnes supplémentaires) en dictionnaires"""
+        cles = self._CLES_RDV + tuple(cles_supplementaires)
+        return [dict(zip(cles, row)) for row in rows]
+    
     def obtenir_rendez_vous_par_service(self, service_id, date_debut=None, date_fin=None):
         """Retourne tous les RDV d'un service"""
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
         if date_debut and date_fin:
-            cursor.execute("""
-                SELECT * FROM rendez_vous 
-                WHERE service_id = ? AND date_rdv BETWEEN ? AND ?
-                ORDER BY date_rdv, heure_debut
+            cursor.execute(f"""
+                SELECT {self._COLONNES_RDV}, s.nom as service_nom
+                FROM rendez_vous r
+                JOIN services s ON r.service_id = s.id
+                WHERE r.service_id = ? AND r.date_rdv BETWEEN ? AND ?
+                ORDER BY r.date_rdv, r.heure_debut
             """, (service_id, date_debut, date_fin))
         else:
-            cursor.execute("""
-                SELECT * FROM rendez_vous 
-                WHERE service_id = ?
-                ORDER BY date_rdv DESC, heure_debut
+            cursor.execute(f"""
+                SELECT {self._COLONNES_RDV}, s.nom as service_nom
+                FROM rendez_vous r
+                JOIN services s ON r.service_id = s.id
+                WHERE r.service_id = ?
+                ORDER BY r.date_rdv DESC, r.heure_debut
             """, (service_id,))
         
-        rdv_list = []
-        for row in cursor.fetchall():
-            rdv_list.append({
-                'id': row[0],
-                'service_id': row[1],
-                'patient_nom': row[2],
-                'patient_prenom': row[3],
-                'patient_telephone': row[4],
-                'patient_email': row[5],
-                'date_rdv': row[6],
-                'heure_debut': row[7],
-                'heure_fin': row[8],
-                'motif': row[9],
-                'statut': row[10]
-            })
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall(), ('service_nom',))
         
         conn.close()
         return rdv_list
     
-    def obtenir_rendez_vous_par_date(self, date):
-        """Retourne tous les RDV d'une date"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
+    def obtenir_rendez_vous_par_date(self, date, cursor=None):
+        """
+        Retourne tous les RDV d'une date
         
-        cursor.execute("""
-            SELECT r.*, s.nom as service_nom
+        Args:
+            date (str): Date (YYYY-MM-DD)
+            cursor: Curseur d'une transaction en cours (optionnel, sinon connexion propre)
+        """
+        conn = None
+        if cursor is None:
+            conn = self.creer_connexion()
+            cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT {self._COLONNES_RDV}, s.nom as service_nom
             FROM rendez_vous r
             JOIN services s ON r.service_id = s.id
             WHERE r.date_rdv = ?
             ORDER BY s.nom, r.heure_debut
         """, (date,))
         
-        rdv_list = []
-        for row in cursor.fetchall():
-            rdv_list.append({
-                'id': row[0],
-                'service_id': row[1],
-                'patient_nom': row[2],
-                'patient_prenom': row[3],
-                'patient_telephone': row[4],
-                'patient_email': row[5],
-                'date_rdv': row[6],
-                'heure_debut': row[7],
-                'heure_fin': row[8],
-                'motif': row[9],
-                'statut': row[10],
-                'service_nom': row[13]
-            })
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall(), ('service_nom',))
         
-        conn.close()
+        if conn is not None:
+            conn.close()
         return rdv_list
     
     def annuler_rendez_vous(self, rdv_id):
-        """Annule un rendez-vous"""
+        """
+        Annule un rendez-vous.
+        Si une place se libère, le premier patient éligible de la liste d'attente
+        est promu dans la même transaction.
+        """
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        cursor.execute(
-            "UPDATE rendez_vous SET statut = 'annulé' WHERE id = ?",
-            (rdv_id,)
-        )
-        
-        if cursor.rowcount > 0:
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "SELECT service_id, date_rdv, heure_debut, heure_fin, statut FROM rendez_vous WHERE id = ?",
+                (rdv_id,)
+            )
+            rdv = cursor.fetchone()
+            
+            cursor.execute(
+                "UPDATE rendez_vous SET statut = 'annulé' WHERE id = ?",
+                (rdv_id,)
+            )
+            
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            
+            evenements = []
+            service_id, date_rdv, heure_debut, heure_fin, ancien_statut = rdv
+            if ancien_statut == 'en_attente':
+                self._noter_rdv(evenements, BusEvenements.RDV_TRAITE, rdv_id, service_id, date_rdv, heure_debut)
+            if ancien_statut in self.STATUTS_OCCUPANTS:
+                self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_LIBERE, service_id, date_rdv, heure_debut)
+                self._promouvoir_liste_attente(cursor, service_id, date_rdv, heure_debut, heure_fin, evenements)
+            
             conn.commit()
-            conn.close()
+            self._publier(evenements)
             return True
-        
-        conn.close()
-        return False
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ Erreur lors de l'annulation : {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def _promouvoir_liste_attente(self, cursor, service_id, date_rdv, heure_debut, heure_fin, evenements=None):
+        """Promeut les patients en attente tant que le créneau libéré a des places"""
+        while self._places_restantes(cursor, service_id, date_rdv, heure_debut) > 0:
+            rdv_id = self.liste_attente.promouvoir_suivant(cursor, service_id, date_rdv, heure_debut, heure_fin)
+            if rdv_id is None:
+                break
+            if evenements is not None:
+                self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_PRIS, service_id, date_rdv, heure_debut)
+                self._noter_rdv(evenements, BusEvenements.RDV_EN_ATTENTE, rdv_id, service_id, date_rdv, heure_debut)
     
     def valider_rendez_vous(self, rdv_id, admin_id, commentaire=None):
         """
         Valide un rendez-vous (passage de 'en_attente' à 'confirmé')
-        Vérifie d'abord qu'il n'y a pas déjà un rendez-vous confirmé à ce créneau
+        Vérifie d'abord que le créneau n'a pas atteint sa capacité en rendez-vous confirmés
         
         Args:
             rdv_id (int): ID du rendez-vous
@@ -363,54 +847,68 @@ class RendezVous:
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        # Vérifier les détails du rendez-vous à valider
-        cursor.execute("""
-            SELECT service_id, date_rdv, heure_debut FROM rendez_vous 
-            WHERE id = ? AND statut = 'en_attente'
-        """, (rdv_id,))
-        rdv = cursor.fetchone()
-        
-        if not rdv:
-            conn.close()
-            return (False, "Rendez-vous introuvable ou déjà traité.")
-        
-        service_id, date_rdv, heure_debut = rdv
-        
-        # Vérifier s'il y a déjà un rendez-vous confirmé à ce créneau
-        cursor.execute("""
-            SELECT COUNT(*) FROM rendez_vous 
-            WHERE service_id = ? AND date_rdv = ? AND heure_debut = ? 
-            AND statut = 'confirmé' AND id != ?
-        """, (service_id, date_rdv, heure_debut, rdv_id))
-        
-        count = cursor.fetchone()[0]
-        
-        if count > 0:
-            conn.close()
-            return (False, "Ce créneau est déjà occupé par un rendez-vous confirmé.")
-        
-        # Valider le rendez-vous
-        cursor.execute("""
-            UPDATE rendez_vous 
-            SET statut = 'confirmé', 
-                valide_par = ?, 
-                date_validation = CURRENT_TIMESTAMP,
-                commentaire_validation = ?
-            WHERE id = ?
-        """, (admin_id, commentaire, rdv_id))
-        
-        success = cursor.rowcount > 0
-        if success:
+        try:
+            # Vérification de la capacité et validation dans la même transaction : une annulation
+            # ou un rejet concurrent ne peut pas se glisser entre les deux
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT service_id, date_rdv, heure_debut FROM rendez_vous 
+                WHERE id = ? AND statut = 'en_attente'
+            """, (rdv_id,))
+            rdv = cursor.fetchone()
+            
+            if not rdv:
+                conn.rollback()
+                return (False, "Rendez-vous introuvable ou déjà traité.")
+            
+            service_id, date_rdv, heure_debut = rdv
+            
+            # Vérifier que le créneau n'est pas déjà complet en rendez-vous confirmés
+            cursor.execute("""
+                SELECT COUNT(*) FROM rendez_vous 
+                WHERE service_id = ? AND date_rdv = ? AND heure_debut = ? 
+                AND statut = 'confirmé' AND id != ?
+            """, (service_id, date_rdv, heure_debut, rdv_id))
+            
+            count = cursor.fetchone()[0]
+            capacite = self._capacite_creneau(cursor, service_id, heure_debut)
+            
+            if count >= capacite:
+                conn.rollback()
+                if capacite == 1:
+                    return (False, "Ce créneau est déjà occupé par un rendez-vous confirmé.")
+                return (False, f"Ce créneau est complet ({count}/{capacite} rendez-vous confirmés).")
+            
+            # Valider le rendez-vous, seulement s'il est toujours en attente
+            cursor.execute("""
+                UPDATE rendez_vous 
+                SET statut = 'confirmé', 
+                    valide_par = ?, 
+                    date_validation = CURRENT_TIMESTAMP,
+                    commentaire_validation = ?
+                WHERE id = ? AND statut = 'en_attente'
+            """, (admin_id, commentaire, rdv_id))
+            
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return (False, "Rendez-vous introuvable ou déjà traité.")
+            
             conn.commit()
-            conn.close()
+            evenements = []
+            self._noter_rdv(evenements, BusEvenements.RDV_TRAITE, rdv_id, service_id, date_rdv, heure_debut)
+            self._publier(evenements)
             return (True, "Rendez-vous validé avec succès !")
-        
-        conn.close()
-        return (False, "Erreur lors de la validation.")
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ Erreur lors de la validation : {e}")
+            return (False, "Erreur lors de la validation.")
+        finally:
+            conn.close()
     
     def rejeter_rendez_vous(self, rdv_id, admin_id, commentaire=None):
         """
-        Rejette un rendez-vous (passage de 'en_attente' à 'rejeté')
+        Rejette un rendez-vous (passage de 'en_attente' à 'rejeté').
+        La place libérée est proposée au premier patient éligible de la liste d'attente.
         
         Args:
             rdv_id (int): ID du rendez-vous
@@ -423,39 +921,62 @@ class RendezVous:
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            UPDATE rendez_vous 
-            SET statut = 'rejeté', 
-                valide_par = ?, 
-                date_validation = CURRENT_TIMESTAMP,
-                commentaire_validation = ?
-            WHERE id = ? AND statut = 'en_attente'
-        """, (admin_id, commentaire, rdv_id))
-        
-        success = cursor.rowcount > 0
-        if success:
-            conn.commit()
-        
-        conn.close()
-        return success
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                UPDATE rendez_vous 
+                SET statut = 'rejeté', 
+                    valide_par = ?, 
+                    date_validation = CURRENT_TIMESTAMP,
+                    commentaire_validation = ?
+                WHERE id = ? AND statut = 'en_attente'
+            """, (admin_id, commentaire, rdv_id))
+            
+            success = cursor.rowcount > 0
+            if success:
+                cursor.execute(
+                    "SELECT service_id, date_rdv, heure_debut, heure_fin FROM rendez_vous WHERE id = ?",
+                    (rdv_id,)
+                )
+                service_id, date_rdv, heure_debut, heure_fin = cursor.fetchone()
+                evenements = []
+                self._noter_rdv(evenements, BusEvenements.RDV_TRAITE, rdv_id, service_id, date_rdv, heure_debut)
+                self._noter_creneau(evenements, cursor, BusEvenements.CRENEAU_LIBERE, service_id, date_rdv, heure_debut)
+                self._promouvoir_liste_attente(cursor, service_id, date_rdv, heure_debut, heure_fin, evenements)
+                conn.commit()
+                self._publier(evenements)
+            else:
+                conn.rollback()
+            
+            return success
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ Erreur lors du rejet : {e}")
+            return False
+        finally:
+            conn.close()
     
-    def obtenir_rendez_vous_en_attente(self, service_id=None):
+    def obtenir_rendez_vous_en_attente(self, service_id=None, cursor=None):
         """
         Retourne les rendez-vous en attente de validation
         
         Args:
             service_id (int, optional): Filtrer par service spécifique
+            cursor: Curseur d'une transaction en cours (optionnel, sinon connexion propre)
             
         Returns:
-            list: Liste des rendez-vous en attente
+            list: Liste des rendez-vous en attente ; a_appeler signale un patient promu
+                  depuis la liste d'attente sans email, à prévenir par téléphone
         """
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
+        conn = None
+        if cursor is None:
+            conn = self.creer_connexion()
+            cursor = conn.cursor()
         
         if service_id:
-            cursor.execute("""
-                SELECT r.*, s.nom as service_nom, 
-                       a.nom_utilisateur as cree_par_nom
+            cursor.execute(f"""
+                SELECT {self._COLONNES_RDV}, s.nom as service_nom,
+                       a.nom_utilisateur as cree_par_nom, {self._COLONNE_A_APPELER}
                 FROM rendez_vous r
                 JOIN services s ON r.service_id = s.id
                 LEFT JOIN admins a ON r.cree_par = a.id
@@ -463,9 +984,9 @@ class RendezVous:
                 ORDER BY r.date_rdv ASC, r.heure_debut ASC
             """, (service_id,))
         else:
-            cursor.execute("""
-                SELECT r.*, s.nom as service_nom,
-                       a.nom_utilisateur as cree_par_nom
+            cursor.execute(f"""
+                SELECT {self._COLONNES_RDV}, s.nom as service_nom,
+                       a.nom_utilisateur as cree_par_nom, {self._COLONNE_A_APPELER}
                 FROM rendez_vous r
                 JOIN services s ON r.service_id = s.id
                 LEFT JOIN admins a ON r.cree_par = a.id
@@ -473,30 +994,10 @@ class RendezVous:
                 ORDER BY r.date_rdv ASC, r.heure_debut ASC
             """)
         
-        rdv_list = []
-        for row in cursor.fetchall():
-            rdv_list.append({
-                'id': row[0],
-                'service_id': row[1],
-                'patient_nom': row[2],
-                'patient_prenom': row[3],
-                'patient_telephone': row[4],
-                'patient_email': row[5],
-                'date_rdv': row[6],
-                'heure_debut': row[7],
-                'heure_fin': row[8],
-                'motif': row[9],
-                'statut': row[10],
-                'cree_par': row[11],
-                'valide_par': row[12],
-                'date_validation': row[13],
-                'commentaire_validation': row[14],
-                'date_creation': row[15],
-                'service_nom': row[16],
-                'cree_par_nom': row[17]
-            })
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall(), ('service_nom', 'cree_par_nom', 'a_appeler'))
         
-        conn.close()
+        if conn is not None:
+            conn.close()
         return rdv_list
     
     def obtenir_statistiques_service(self, service_id):
@@ -533,6 +1034,23 @@ class RendezVous:
             'annules': annules
         }
     
+    def obtenir_rendez_vous_par_id(self, rdv_id):
+        """Retourne un rendez-vous par son ID, None s'il n'existe pas"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT {self._COLONNES_RDV} FROM rendez_vous r WHERE r.id = ?", (rdv_id,))
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall())
+        
+        conn.close()
+        return rdv_list[0] if rdv_list else None
+    
+    @staticmethod
+    def appartient_au_patient(rdv, patient_email):
+        """Vérifie qu'un rendez-vous (ou une série) est celui du patient, sans tenir compte de la casse"""
+        cle_email = normaliser_email(patient_email)
+        return bool(cle_email) and normaliser_email(rdv.get('patient_email')) == cle_email
+    
     def obtenir_rendez_vous_par_patient(self, patient_email):
         """
         Retourne tous les rendez-vous d'un patient (par email)
@@ -546,79 +1064,53 @@ class RendezVous:
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT r.*, s.nom as service_nom
+        cursor.execute(f"""
+            SELECT {self._COLONNES_RDV}, s.nom as service_nom
             FROM rendez_vous r
             JOIN services s ON r.service_id = s.id
-            WHERE r.patient_email = ?
+            WHERE r.patient_cle_email = ?
             ORDER BY r.date_rdv DESC, r.heure_debut
-        """, (patient_email,))
-        
-        rdv_list = []
-        for row in cursor.fetchall():
-            rdv_list.append({
-                'id': row[0],
-                'service_id': row[1],
-                'patient_nom': row[2],
-                'patient_prenom': row[3],
-                'patient_telephone': row[4],
-                'patient_email': row[5],
-                'date_rdv': row[6],
-                'heure_debut': row[7],
-                'heure_fin': row[8],
-                'motif': row[9],
-                'statut': row[10],
-                'service_nom': row[13]
-            })
+        """, (normaliser_email(patient_email),))
+        
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall(), ('service_nom',))
         
         conn.close()
         return rdv_list
     
-    def obtenir_prochains_rendez_vous(self, patient_email, limite=5):
+    def obtenir_prochains_rendez_vous(self, patient_email, limite=5, cursor=None):
         """
         Retourne les prochains rendez-vous d'un patient
         
         Args:
             patient_email (str): Email du patient
             limite (int): Nombre maximum de rendez-vous à retourner
+            cursor: Curseur d'une transaction en cours (optionnel, sinon connexion propre)
             
         Returns:
             list: Liste des prochains rendez-vous
         """
         from datetime import date
         
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
+        conn = None
+        if cursor is None:
+            conn = self.creer_connexion()
+            cursor = conn.cursor()
         
         today = date.today().strftime('%Y-%m-%d')
         
-        cursor.execute("""
-            SELECT r.*, s.nom as service_nom
+        cursor.execute(f"""
+            SELECT {self._COLONNES_RDV}, s.nom as service_nom
             FROM rendez_vous r
             JOIN services s ON r.service_id = s.id
-            WHERE r.patient_email = ? 
+            WHERE r.patient_cle_email = ? 
               AND r.date_rdv >= ? 
               AND r.statut = 'confirmé'
             ORDER BY r.date_rdv ASC, r.heure_debut ASC
             LIMIT ?
-        """, (patient_email, today, limite))
-        
-        rdv_list = []
-        for row in cursor.fetchall():
-            rdv_list.append({
-                'id': row[0],
-                'service_id': row[1],
-                'patient_nom': row[2],
-                'patient_prenom': row[3],
-                'patient_telephone': row[4],
-                'patient_email': row[5],
-                'date_rdv': row[6],
-                'heure_debut': row[7],
-                'heure_fin': row[8],
-                'motif': row[9],
-                'statut': row[10],
-                'service_nom': row[13]
-            })
+        """, (normaliser_email(patient_email), today, limite))
         
-        conn.close()
+        rdv_list = self._lignes_vers_dicts(cursor.fetchall(), ('service_nom',))
+        
+        if conn is not None:
+            conn.close()
         return rdv_list
\ No newline at end of file
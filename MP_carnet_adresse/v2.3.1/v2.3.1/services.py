@@ -1,4 +1,30 @@
 import sqlite3
+from typing import List, Optional, TypedDict
+from migrations import assurer_schema
+from versions import CompteursModifications
+
+
+class PlageCapacite(TypedDict):
+    """Capacité spécifique à une plage horaire d'un service"""
+    id: int
+    heure_debut: str
+    heure_fin: str
+    capacite: int
+
+
+class Service(TypedDict):
+    """Service de la polyclinique tel que gardé en mémoire (un dictionnaire à l'exécution)"""
+    id: int
+    nom: str
+    description: Optional[str]
+    responsable_id: Optional[int]
+    horaire_debut: str
+    horaire_fin: str
+    actif: int
+    date_creation: str
+    capacite: int
+    plages_capacite: List[PlageCapacite]
+
 
 class ServicesPolyclinique:
     """Classe gérant les services de la polyclinique"""
@@ -12,66 +38,17 @@ class ServicesPolyclinique:
         """
         self.db_name = db_name
         self.services = []
-        self.creer_table_services()
-        self.initialiser_services_par_defaut()
+        self.services_par_id = {}
+        self.services_par_nom = {}
+        self.version_chargee = None
+        assurer_schema(self.db_name)
         self.charger_services()
     
     def creer_connexion(self):
         """Crée une connexion à la base de données"""
         return sqlite3.connect(self.db_name)
     
-    def creer_table_services(self):
-        """Crée la table des services"""
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS services (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT UNIQUE NOT NULL,
-                description TEXT,
-                responsable_id INTEGER,
-                horaire_debut TEXT DEFAULT '08:00',
-                horaire_fin TEXT DEFAULT '18:00',
-                actif INTEGER DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (responsable_id) REFERENCES admins(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✓ Table services initialisée")
-    
-    def initialiser_services_par_defaut(self):
-        """Initialise les services médicaux de base"""
-        services_defaut = [
-            ("Médecine Générale", "Consultations générales et suivi médical", "08:00", "18:00"),
-            ("Pédiatrie", "Soins et consultations pour enfants", "08:00", "17:00"),
-            ("Cardiologie", "Examens et consultations cardiaques", "09:00", "16:00"),
-            ("Dermatologie", "Soins de la peau", "08:30", "17:30"),
-            ("Ophtalmologie", "Examens de la vue", "08:00", "16:00"),
-            ("Dentaire", "Soins dentaires", "08:00", "18:00"),
-            ("Radiologie", "Examens radiologiques", "08:00", "17:00"),
-            ("Laboratoire", "Analyses médicales", "07:00", "19:00"),
-        ]
-        
-        conn = self.creer_connexion()
-        cursor = conn.cursor()
-        
-        for nom, description, debut, fin in services_defaut:
-            try:
-                cursor.execute(
-                    "INSERT INTO services (nom, description, horaire_debut, horaire_fin) VALUES (?, ?, ?, ?)",
-                    (nom, description, debut, fin)
-                )
-            except sqlite3.IntegrityError:
-                pass  # Service déjà existant
-        
-        conn.commit()
-        conn.close()
-    
-    def ajouter_service(self, nom, description, horaire_debut="08:00", horaire_fin="18:00"):
+    def ajouter_service(self, nom, description, horaire_debut="08:00", horaire_fin="18:00", capacite=1):
         """
         Ajoute un nouveau service
         
@@ -80,17 +57,22 @@ class ServicesPolyclinique:
             description (str): Description
             horaire_debut (str): Heure d'ouverture
             horaire_fin (str): Heure de fermeture
+            capacite (int): Nombre de rendez-vous simultanés par créneau (postes, praticiens)
             
         Returns:
             bool: True si ajouté, False sinon
         """
+        if int(capacite) < 1:
+            print("✗ La capacité doit être d'au moins 1 !")
+            return False
+        
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
         try:
             cursor.execute(
-                "INSERT INTO services (nom, description, horaire_debut, horaire_fin) VALUES (?, ?, ?, ?)",
-                (nom, description, horaire_debut, horaire_fin)
+                "INSERT INTO services (nom, description, horaire_debut, horaire_fin, capacite) VALUES (?, ?, ?, ?, ?)",
+                (nom, description, horaire_debut, horaire_fin, int(capacite))
             )
             conn.commit()
             conn.close()
@@ -102,6 +84,50 @@ class ServicesPolyclinique:
             print(f"✗ Le service '{nom}' existe déjà !")
             return False
     
+    def modifier_service(self, service_id, nom, description, horaire_debut, horaire_fin,
+                         responsable_id=None, capacite=None):
+        """
+        Modifie les informations d'un service
+        
+        Args:
+            service_id (int): ID du service
+            nom (str): Nom du service
+            description (str): Description
+            horaire_debut (str): Heure d'ouverture
+            horaire_fin (str): Heure de fermeture
+            responsable_id (int): ID de l'admin responsable (optionnel)
+            capacite (int): Nouvelle capacité par créneau (optionnel)
+            
+        Returns:
+            bool: True si modifié, False sinon
+        """
+        if capacite is not None and int(capacite) < 1:
+            print("✗ La capacité doit être d'au moins 1 !")
+            return False
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("""
+                UPDATE services 
+                SET nom = ?, description = ?, horaire_debut = ?, horaire_fin = ?, responsable_id = ?,
+                    capacite = COALESCE(?, capacite)
+                WHERE id = ?
+            """, (nom, description, horaire_debut, horaire_fin, responsable_id,
+                  int(capacite) if capacite is not None else None, service_id))
+            success = cursor.rowcount > 0
+            conn.commit()
+        except sqlite3.IntegrityError:
+            print(f"✗ Le service '{nom}' existe déjà !")
+            success = False
+        finally:
+            conn.close()
+        
+        if success:
+            self.charger_services()
+        return success
+    
     def attribuer_responsable(self, service_id, responsable_id):
         """
         Attribue un responsable à un service
@@ -151,28 +177,130 @@ class ServicesPolyclinique:
         conn.close()
         self.charger_services()
     
-    def obtenir_service_par_id(self, service_id):
-        """Retourne un service par son ID"""
+    def definir_capacite(self, service_id, capacite):
+        """
+        Définit la capacité par défaut d'un service (rendez-vous simultanés par créneau)
+        
+        Args:
+            service_id (int): ID du service
+            capacite (int): Nombre de postes / praticiens en parallèle
+            
+        Returns:
+            bool: True si modifié, False sinon
+        """
+        if int(capacite) < 1:
+            print("✗ La capacité doit être d'au moins 1 !")
+            return False
+        
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT * FROM services WHERE id = ?", (service_id,))
-        row = cursor.fetchone()
+        cursor.execute("UPDATE services SET capacite = ? WHERE id = ?", (int(capacite), service_id))
+        success = cursor.rowcount > 0
+        conn.commit()
         conn.close()
         
-        if row:
-            return {
-                'id': row[0],
-                'nom': row[1],
-                'description': row[2],
-                'responsable_id': row[3],
-                'horaire_debut': row[4],
-                'horaire_fin': row[5],
-                'actif': row[6]
-            }
-        return None
+        if success:
+            self.charger_services()
+        return success
+    
+    def ajouter_plage_capacite(self, service_id, heure_debut, heure_fin, capacite):
+        """
+        Ajoute une capacité spécifique sur une plage horaire d'un service.
+        Elle remplace la capacité par défaut du service pour les créneaux qui
+        commencent dans [heure_debut, heure_fin[.
+        
+        Args:
+            service_id (int): ID du service
+            heure_debut (str): Début de la plage (HH:MM)
+            heure_fin (str): Fin de la plage (HH:MM)
+            capacite (int): Capacité sur la plage
+            
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if int(capacite) < 0:
+            return (False, "La capacité ne peut pas être négative.")
+        if heure_debut >= heure_fin:
+            return (False, "L'heure de début doit précéder l'heure de fin.")
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        # Refuser les plages qui se chevauchent pour garder une capacité non ambiguë
+        cursor.execute("""
+            SELECT COUNT(*) FROM capacites_services
+            WHERE service_id = ? AND heure_debut < ? AND ? < heure_fin
+        """, (service_id, heure_fin, heure_debut))
+        if cursor.fetchone()[0] > 0:
+            conn.close()
+            return (False, "Cette plage chevauche une plage de capacité existante.")
+        
+        cursor.execute(
+            "INSERT INTO capacites_services (service_id, heure_debut, heure_fin, capacite) VALUES (?, ?, ?, ?)",
+            (service_id, heure_debut, heure_fin, int(capacite))
+        )
+        conn.commit()
+        conn.close()
+        self.charger_services()
+        return (True, f"Capacité de {capacite} définie de {heure_debut} à {heure_fin}.")
+    
+    def supprimer_plage_capacite(self, plage_id):
+        """Supprime une plage de capacité"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM capacites_services WHERE id = ?", (plage_id,))
+        success = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        if success:
+            self.charger_services()
+        return success
     
-    def obtenir_services_actifs(self):
+    def obtenir_plages_capacite(self, service_id):
+        """Retourne les plages de capacité d'un service, triées par heure de début"""
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, heure_debut, heure_fin, capacite FROM capacites_services
+            WHERE service_id = ?
+            ORDER BY heure_debut
+        """, (service_id,))
+        
+        plages = [
+            {'id': row[0], 'heure_debut': row[1], 'heure_fin': row[2], 'capacite': row[3]}
+            for row in cursor.fetchall()
+        ]
+        
+        conn.close()
+        return plages
+    
+    def obtenir_service_par_id(self, service_id) -> Optional[Service]:
+        """
+        Retourne un service par son ID, lu dans l'index en mémoire
+        (la base n'est consultée que pour un ID inconnu, créé par un autre processus)
+        """
+        try:
+            service_id = int(service_id)
+        except (TypeError, ValueError):
+            return None
+        
+        service = self.services_par_id.get(service_id)
+        if service is None and self.rafraichir_si_modifie():
+            service = self.services_par_id.get(service_id)
+        return service
+    
+    def obtenir_service_par_nom(self, nom) -> Optional[Service]:
+        """Retourne un service par son nom, lu dans l'index en mémoire"""
+        service = self.services_par_nom.get(nom)
+        if service is None and self.rafraichir_si_modifie():
+            service = self.services_par_nom.get(nom)
+        return service
+    
+    def obtenir_services_actifs(self) -> List[Service]:
         """Retourne tous les services actifs"""
         return [s for s in self.services if s['actif'] == 1]
     
@@ -181,20 +309,68 @@ class ServicesPolyclinique:
         conn = self.creer_connexion()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT * FROM services ORDER BY nom")
+        # Version lue avant les lignes : une écriture concurrente provoquera un nouveau chargement
+        version = CompteursModifications.lire_version(cursor, CompteursModifications.CLE_SERVICES)
+        cursor.execute("""
+            SELECT id, nom, description, responsable_id, horaire_debut, horaire_fin, actif,
+                   date_creation, capacite
+            FROM services ORDER BY nom
+        """)
         rows = cursor.fetchall()
         
+        # Toutes les plages de capacité en une seule requête
+        cursor.execute("""
+            SELECT id, service_id, heure_debut, heure_fin, capacite
+            FROM capacites_services ORDER BY service_id, heure_debut
+        """)
+        plages_par_service = {}
+        for plage in cursor.fetchall():
+            plages_par_service.setdefault(plage[1], []).append(PlageCapacite(
+                id=plage[0],
+                heure_debut=plage[2],
+                heure_fin=plage[3],
+                capacite=plage[4]
+            ))
+        
         self.services = []
         for row in rows:
-            self.services.append({
+            self.services.append(Service({
                 'id': row[0],
                 'nom': row[1],
                 'description': row[2],
                 'responsable_id': row[3],
                 'horaire_debut': row[4],
                 'horaire_fin': row[5],
-                'actif': row[6]
-            })
+                'actif': row[6],
+                'date_creation': row[7],
+                'capacite': row[8],
+                'plages_capacite': plages_par_service.get(row[0], [])
+            }))
         
+        # Index reconstruits à chaque chargement, donc après chaque modification
+        self.services_par_id = {service['id']: service for service in self.services}
+        self.services_par_nom = {service['nom']: service for service in self.services}
+        self.version_chargee = version
         conn.close()
-        print(f"✓ {len(self.services)} service(s) chargé(s)")
\ No newline at end of file
+        print(f"✓ {len(self.services)} service(s) chargé(s)")
+    
+    def rafraichir_si_modifie(self, version=None):
+        """
+        Recharge les services si la base a été modifiée depuis le dernier chargement
+        (par ce processus, un autre worker ou l'agenda Tkinter)
+        
+        Args:
+            version (int, optional): Version courante déjà lue ; lue en base sinon
+        
+        Returns:
+            bool: True si les services ont été rechargés
+        """
+        if version is None:
+            conn = self.creer_connexion()
+            version = CompteursModifications.lire_version(conn.cursor(), CompteursModifications.CLE_SERVICES)
+            conn.close()
+        
+        if version == self.version_chargee:
+            return False
+        self.charger_services()
+        return True
\ No newline at end of file
@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from normalisation import normaliser_email
+from versions import CompteursModifications
+
+class TableauDeBord:
+    """
+    Classe regroupant les données du tableau de bord (totaux, rendez-vous en attente, du jour,
+    historique du patient) : tous les widgets d'un rôle sont lus sur une seule connexion,
+    dans une même transaction de lecture, puis gardés en cache quelques secondes.
+    Une entrée n'est servie que si les compteurs de modifications des rendez-vous
+    n'ont pas bougé : toute écriture d'un rendez-vous (quel que soit le processus) l'invalide.
+    """
+    
+    DUREE_CACHE = 30  # secondes
+    TAILLE_MAX = 256
+    
+    def __init__(self, rdv_manager, compteurs, db_name="polyclinique.db",
+                 duree_cache=DUREE_CACHE, taille_max=TAILLE_MAX):
+        """
+        Initialise le service du tableau de bord
+        
+        Args:
+            rdv_manager (RendezVous): Gestion des rendez-vous (lectures faites dans la transaction)
+            compteurs (CompteursModifications): Compteurs de modifications (invalidation du cache)
+            db_name (str): Nom de la base de données
+            duree_cache (int): Durée de vie maximale d'une entrée, en secondes
+            taille_max (int): Nombre maximal d'entrées (rôle, service ou patient) conservées
+        """
+        self.rdv_manager = rdv_manager
+        self.compteurs = compteurs
+        self.db_name = db_name
+        self.duree_cache = duree_cache
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()  # cle -> (expiration, versions, donnees)
+        self._verrou = threading.Lock()
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    def _lire(self, cle, cles_compteurs, charger):
+        """
+        Retourne les données d'une entrée du cache, relues par charger(cursor) si elles ont expiré
+        ou si l'un des compteurs a changé depuis leur lecture
+        
+        Args:
+            cle (tuple): Clé de l'entrée (rôle, service ou patient, jour)
+            cles_compteurs (list): Compteurs dont dépendent les données
+            charger (callable): Lecture des widgets avec un curseur, dans la transaction
+        """
+        maintenant = time.monotonic()
+        with self._verrou:
+            entree = self._entrees.get(cle)
+        
+        if entree and entree[0] > maintenant:
+            versions = self.compteurs.obtenir_versions(cles_compteurs)
+            if versions == entree[1]:
+                with self._verrou:
+                    if cle in self._entrees:
+                        self._entrees.move_to_end(cle)
+                return entree[2]
+        
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        try:
+            # Transaction de lecture : versions et widgets forment un même instantané
+            cursor.execute("BEGIN")
+            versions = {c: CompteursModifications.lire_version(cursor, c) for c in cles_compteurs}
+            donnees = charger(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        with self._verrou:
+            self._entrees[cle] = (maintenant + self.duree_cache, versions, donnees)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+        return donnees
+    
+    def vider(self):
+        """Supprime toutes les entrées du cache"""
+        with self._verrou:
+            self._entrees.clear()
+    
+    def donnees_super_admin(self):
+        """
+        Widgets du super-admin : total des rendez-vous des services actifs,
+        rendez-vous en attente et rendez-vous du jour de tous les services
+        
+        Returns:
+            dict: total_rdv, rdv_en_attente, rdv_aujourd_hui
+        """
+        jour = date.today().strftime('%Y-%m-%d')
+        
+        def charger(cursor):
+            cursor.execute("""
+                SELECT COUNT(*) FROM rendez_vous r
+                JOIN services s ON r.service_id = s.id
+                WHERE s.actif = 1
+            """)
+            return {
+                'total_rdv': cursor.fetchone()[0],
+                'rdv_en_attente': self.rdv_manager.obtenir_rendez_vous_en_attente(cursor=cursor),
+                'rdv_aujourd_hui': self.rdv_manager.obtenir_rendez_vous_par_date(jour, cursor=cursor),
+            }
+        
+        return self._lire(('super_admin', None, jour),
+                          [CompteursModifications.CLE_RENDEZ_VOUS, CompteursModifications.CLE_SERVICES],
+                          charger)
+    
+    def donnees_admin(self, service_id):
+        """
+        Widgets de l'admin d'un service : total et rendez-vous en attente du service,
+        rendez-vous du jour (tous services, comme l'agenda du jour de l'accueil)
+        
+        Args:
+            service_id (int): Service de l'admin (None : aucun service rattaché)
+        
+        Returns:
+            dict: total_rdv, rdv_en_attente, rdv_aujourd_hui
+        """
+        jour = date.today().strftime('%Y-%m-%d')
+        
+        def charger(cursor):
+            if service_id:
+                cursor.execute("SELECT COUNT(*) FROM rendez_vous WHERE service_id = ?", (service_id,))
+                total_rdv = cursor.fetchone()[0]
+                rdv_en_attente = self.rdv_manager.obtenir_rendez_vous_en_attente(service_id, cursor=cursor)
+            else:
+                total_rdv = 0
+                rdv_en_attente = []
+            return {
+                'total_rdv': total_rdv,
+                'rdv_en_attente': rdv_en_attente,
+                'rdv_aujourd_hui': self.rdv_manager.obtenir_rendez_vous_par_date(jour, cursor=cursor),
+            }
+        
+        # Les rendez-vous du jour couvrent tous les services : compteur global
+        return self._lire(('admin', service_id, jour),
+                          [CompteursModifications.CLE_RENDEZ_VOUS],
+                          charger)
+    
+    def donnees_patient(self, patient_email, contact_id=None, limite=5):
+        """
+        Widgets du patient : statistiques de son historique, prochains rendez-vous confirmés
+        et fiche contact
+        
+        Args:
+            patient_email (str): Email du patient (vide : aucun rendez-vous)
+            contact_id (int): Fiche contact liée au compte (optionnel)
+            limite (int): Nombre maximal de prochains rendez-vous
+        
+        Returns:
+            dict: stats (total, en_attente, confirmes, rejetes), rdv_prochains, contact_info
+        """
+        jour = date.today().strftime('%Y-%m-%d')
+        cle_email = normaliser_email(patient_email)
+        
+        def charger(cursor):
+            stats = {'total': 0, 'en_attente': 0, 'confirmes': 0, 'rejetes': 0}
+            rdv_prochains = []
+            if cle_email:
+                # Statistiques agrégées par la base plutôt que sur tout l'historique chargé
+                cursor.execute("""
+                    SELECT COUNT(*),
+                           COALESCE(SUM(statut = 'en_attente'), 0),
+                           COALESCE(SUM(statut = 'confirmé'), 0),
+                           COALESCE(SUM(statut = 'rejeté'), 0)
+                    FROM rendez_vous WHERE patient_cle_email = ?
+                """, (cle_email,))
+                stats = dict(zip(('total', 'en_attente', 'confirmes', 'rejetes'), cursor.fetchone()))
+                
+                rdv_prochains = self.rdv_manager.obtenir_prochains_rendez_vous(patient_email, limite,
+                                                                               cursor=cursor)
+            
+            contact_info = None
+            if contact_id:
+                cursor.execute("""
+                    SELECT nom, prenom, email, telephone, adresse, fonction, entreprise
+                    FROM contacts WHERE id = ?
+                """, (contact_id,))
+                row = cursor.fetchone()
+                if row:
+                    contact_info = dict(zip(('nom', 'prenom', 'email', 'telephone', 'adresse',
+                                             'fonction', 'entreprise'), row))
+            return {'stats': stats, 'rdv_prochains': rdv_prochains, 'contact_info': contact_info}
+        
+        return self._lire(('patient', cle_email, contact_id, limite, jour),
+                          [CompteursModifications.cle_patient(patient_email),
+                           CompteursModifications.CLE_CONTACTS,
+                           CompteursModifications.CLE_SERVICES],
+                          charger)
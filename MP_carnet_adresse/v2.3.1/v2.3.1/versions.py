@@ -0,0 +1,86 @@
+import sqlite3
+from normalisation import normaliser_email
+from migrations import assurer_schema
+
+class CompteursModifications:
+    """Classe gérant les compteurs de modifications, incrémentés par triggers à chaque écriture"""
+    
+    CLE_CONTACTS = "contacts"
+    CLE_SERVICES = "services"
+    CLE_HORAIRES = "horaires"
+    CLE_CONFIG = "config"
+    CLE_RENDEZ_VOUS = "rendez_vous"
+    CLE_LISTE_ATTENTE = "liste_attente"
+    
+    def __init__(self, db_name="polyclinique.db"):
+        """
+        Initialise les compteurs de modifications
+        
+        Args:
+            db_name (str): Nom de la base de données
+        """
+        self.db_name = db_name
+        assurer_schema(self.db_name)
+    
+    def creer_connexion(self):
+        """Crée une connexion à la base de données"""
+        return sqlite3.connect(self.db_name)
+    
+    @staticmethod
+    def cle_service(service_id):
+        """Clé du compteur des rendez-vous d'un service"""
+        return f"rendez_vous:service:{service_id}"
+    
+    @staticmethod
+    def cle_patient(patient_email):
+        """Clé du compteur des rendez-vous d'un patient"""
+        return f"rendez_vous:patient:{normaliser_email(patient_email)}"
+    
+    @staticmethod
+    def lire_version(cursor, cle):
+        """Version courante d'une clé lue avec un curseur existant (0 si jamais modifiée)"""
+        cursor.execute("SELECT version FROM compteurs_modifications WHERE cle = ?", (cle,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    def obtenir_versions(self, cles):
+        """
+        Retourne les versions de plusieurs clés en une requête
+        
+        Args:
+            cles (list): Clés des compteurs
+        
+        Returns:
+            dict: {cle: version} ; 0 pour une clé jamais modifiée
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT cle, version FROM compteurs_modifications
+            WHERE cle IN ({', '.join('?' * len(cles))})
+        """, list(cles))
+        versions = dict.fromkeys(cles, 0)
+        versions.update(cursor.fetchall())
+        
+        conn.close()
+        return versions
+    
+    def obtenir_version(self, cle):
+        """
+        Retourne la version courante d'une clé
+        
+        Args:
+            cle (str): Clé du compteur
+        
+        Returns:
+            tuple: (version: int, date_modification: str or None) ; (0, None) si jamais modifiée
+        """
+        conn = self.creer_connexion()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT version, date_modification FROM compteurs_modifications WHERE cle = ?", (cle,))
+        row = cursor.fetchone()
+        
+        conn.close()
+        return (row[0], row[1]) if row else (0, None)